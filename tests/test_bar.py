@@ -18,11 +18,14 @@ from timemachine.fe.bar import (
     bootstrap_bar,
     compute_fwd_and_reverse_df_over_time,
     df_and_err_from_u_kln,
+    df_err_and_overlap_from_u_kln_batch,
     df_from_u_kln,
+    df_from_ukln_by_lambda,
     pair_overlap_from_ukln,
     ukln_to_ukn,
     works_from_ukln,
 )
+from timemachine.parallel.client import SerialClient
 
 pytestmark = [pytest.mark.nocuda]
 
@@ -108,6 +111,28 @@ def test_bootstrap_bar(sigma):
     assert df_1 == pytest.approx(dlogZ, abs=2.0 * bootstrap_sigma)
 
 
+@pytest.mark.parametrize("sigma", [0.1, 1.0, 10.0])
+def test_bootstrap_bar_methods(sigma):
+    u_kln, _ = make_gaussian_ukln_example((0.0, 1.0), (1.0, sigma), n_samples=500)
+
+    df_ref, ddf_ref, bootstrap_samples_ref = bootstrap_bar(u_kln, n_bootstrap=20, method="sequential")
+
+    # batched bootstrap uses the same resamples as sequential, and agrees to within solver tolerance
+    df, ddf, bootstrap_samples = bootstrap_bar(u_kln, n_bootstrap=20, method="batched")
+    assert df == df_ref
+    assert ddf == ddf_ref
+    np.testing.assert_allclose(bootstrap_samples, bootstrap_samples_ref, atol=1e-5)
+
+    # poisson bootstrap is reproducible, and gives a comparable uncertainty estimate
+    _, _, bootstrap_samples_poisson = bootstrap_bar(u_kln, n_bootstrap=100, method="poisson")
+    _, _, bootstrap_samples_poisson_2 = bootstrap_bar(u_kln, n_bootstrap=100, method="poisson")
+    np.testing.assert_array_equal(bootstrap_samples_poisson, bootstrap_samples_poisson_2)
+    np.testing.assert_allclose(np.std(bootstrap_samples_poisson), ddf_ref, rtol=0.3)
+
+    with pytest.raises(ValueError, match="unknown bootstrap method"):
+        bootstrap_bar(u_kln, method="parametric")
+
+
 @pytest.mark.parametrize("sigma", [0.1, 1.0, 10.0])
 def test_df_from_u_kln_consistent_with_df_and_err_from_u_kln(sigma):
     u_kln, _ = make_gaussian_ukln_example((0.0, 1.0), (1.0, sigma))
@@ -218,6 +243,81 @@ def test_pair_overlap_from_ukln():
     )
 
 
+@pytest.mark.parametrize("params", [((0, 1), (0, 1)), ((0, 0.1), (0.5, 0.2)), ((0, 0.5), (1, 0.5))])
+def test_pair_overlap_from_ukln_closed_form(params):
+    u_kln, _ = make_gaussian_ukln_example(*params)
+    u_kn, N_k = ukln_to_ukn(u_kln)
+    mbar = pymbar.MBAR(u_kn, N_k, relative_tolerance=1e-12)
+    overlap_ref = np.clip(2 * mbar.compute_overlap()["matrix"][0, 1], 0.0, 1.0)
+    df = mbar.compute_free_energy_differences(compute_uncertainty=False)[DG_KEY][0, 1]
+
+    np.testing.assert_allclose(pair_overlap_from_ukln(u_kln, df=df), overlap_ref, rtol=1e-10)
+    np.testing.assert_allclose(pair_overlap_from_ukln(u_kln), overlap_ref, rtol=1e-8)
+
+    # falls back to pymbar if df is not finite
+    with patch("timemachine.fe.bar.pymbar.MBAR", wraps=pymbar.MBAR) as mock_mbar:
+        np.testing.assert_allclose(pair_overlap_from_ukln(u_kln, df=np.nan), overlap_ref, rtol=1e-5)
+        mock_mbar.assert_called_once()
+
+
+def test_df_err_and_overlap_from_u_kln_batch():
+    """Assert that the vectorized solver agrees with pymbar on a batch of 2-state u_kln matrices, and on prefixes"""
+    u_klns = np.array(
+        [
+            [make_gaussian_ukln_example((0.0, 1.0), (mu, sigma), seed=seed, n_samples=200)[0] for mu, sigma in params]
+            for seed, params in enumerate(
+                [[(0.0, 1.0), (0.5, 1.0)], [(1.0, 0.3), (1.0, 10.0)], [(2.0, 2.0), (5.0, 1.0)]]
+            )
+        ]
+    )
+    u_klns[0, 0, 1, 0, 10] = np.inf  # infinite energies have zero weight
+    assert u_klns.shape == (3, 2, 2, 2, 200)
+
+    def reference(u_kln):
+        df, df_err = df_and_err_from_u_kln(u_kln)
+        return df, df_err, pair_overlap_from_ukln(u_kln)
+
+    df, df_err, overlap = df_err_and_overlap_from_u_kln_batch(u_klns)
+    assert df.shape == df_err.shape == overlap.shape == (3, 2)
+    for idx in np.ndindex(3, 2):
+        df_ref, df_err_ref, overlap_ref = reference(u_klns[idx])
+        np.testing.assert_allclose(df[idx], df_ref, atol=1e-5)
+        np.testing.assert_allclose(df_err[idx], df_err_ref, rtol=1e-5)
+        np.testing.assert_allclose(overlap[idx], overlap_ref, rtol=1e-5, atol=1e-12)
+
+    n_samples = [2, 50, 200]
+    dfs, df_errs, overlaps = df_err_and_overlap_from_u_kln_batch(u_klns, n_samples)
+    assert dfs.shape == df_errs.shape == overlaps.shape == (3, 3, 2)
+    np.testing.assert_allclose(dfs[-1], df, atol=1e-9)  # prefixes are warm-started from the previous solution
+    for p, n in enumerate(n_samples[1:], 1):
+        for idx in np.ndindex(3, 2):
+            df_ref, df_err_ref, overlap_ref = reference(u_klns[idx][..., :n])
+            np.testing.assert_allclose(dfs[p][idx], df_ref, atol=1e-5)
+            np.testing.assert_allclose(df_errs[p][idx], df_err_ref, rtol=1e-5)
+            np.testing.assert_allclose(overlaps[p][idx], overlap_ref, rtol=1e-5, atol=1e-12)
+
+    with pytest.raises(AssertionError, match="n_samples"):
+        df_err_and_overlap_from_u_kln_batch(u_klns, [0])
+
+
+def test_df_err_and_overlap_from_u_kln_batch_identical_states():
+    """Assert that the uncertainty is zero, not nan, when all works are zero, consistent with pymbar"""
+    u_kln = np.zeros((2, 2, 50))
+    df_ref, df_err_ref = df_and_err_from_u_kln(u_kln)
+    assert df_err_ref == 0.0
+
+    df, df_err, overlap = df_err_and_overlap_from_u_kln_batch(u_kln)
+    np.testing.assert_allclose(df, df_ref, atol=1e-12)
+    assert df_err == 0.0
+    assert overlap == 1.0
+
+    # a single window of identical states should not make the total uncertainty nan
+    rng = np.random.default_rng(2024)
+    u_kln_by_lambda = np.stack([u_kln, rng.normal(size=(2, 2, 50))])
+    _, total_df_err = df_from_ukln_by_lambda(u_kln_by_lambda)
+    assert np.isfinite(total_df_err)
+
+
 @pytest.mark.parametrize("frames_per_step", [1, 5, 10])
 def test_compute_fwd_and_reverse_df_over_time(frames_per_step):
     seed = 2023
@@ -250,6 +350,21 @@ def test_compute_fwd_and_reverse_df_over_time(frames_per_step):
     assert np.allclose(fwd[-1], rev[-1])
     assert np.allclose(fwd_err[-1], rev_err[-1])
 
+    # consistent with pymbar on each prefix
+    for step, num_frames in enumerate(range(frames_per_step, u_kln.shape[-1] + 1, frames_per_step)):
+        dfs, df_errs = zip(*[df_and_err_from_u_kln(u_kln[..., :num_frames]) for u_kln in u_kln_by_lambda])
+        np.testing.assert_allclose(fwd[step], np.sum(dfs), atol=1e-4)
+        np.testing.assert_allclose(fwd_err[step], np.linalg.norm(df_errs), rtol=1e-4)
+
+    # windows split into batches across workers
+    client = SerialClient()
+    client.max_workers = 4
+    fwd_and_rev_parallel = compute_fwd_and_reverse_df_over_time(
+        u_kln_by_lambda, frames_per_step=frames_per_step, client=client
+    )
+    for x, x_parallel in zip((fwd, fwd_err, rev, rev_err), fwd_and_rev_parallel):
+        np.testing.assert_allclose(x_parallel, x, rtol=1e-8)
+
 
 def test_bootstrap_bar_and_regular_bar_match():
     """In cases where the u_kln has effectively no overlap, bootstrapping returns 0.0
@@ -276,4 +391,5 @@ def test_nan_bar_error(mock_energy_diff):
     mock_energy_diff.return_value = {DG_KEY: df, DG_ERR_KEY: df_err}
     dummy_ukln = np.ones(shape=(2, 2, 100))
     _, boot_df_err = bar_with_pessimistic_uncertainty(dummy_ukln)
-    assert boot_df_err == 0.0
+    # bootstrap replicates are solved independently of the mocked pymbar call, and agree up to roundoff
+    assert boot_df_err == pytest.approx(0.0, abs=1e-12)
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+from hypothesis import assume, given, seed
+from hypothesis.extra.numpy import array_shapes, arrays, floating_dtypes, from_dtype, integer_dtypes
+from hypothesis.strategies import one_of
+
+from timemachine.fe.chunk_codecs import QuantizeCodec, ShuffleCompressCodec, deserialize_chunk, serialize_chunk
+
+pytestmark = [pytest.mark.nogpu]
+
+numeric_arrays = one_of(
+    arrays(floating_dtypes(), array_shapes(min_dims=0), elements=from_dtype(np.dtype(np.float16))),
+    arrays(integer_dtypes(), array_shapes(min_dims=0)),
+)
+
+
+@pytest.mark.parametrize("compression", ["zlib", "lzma"])
+@given(numeric_arrays)
+@seed(2024)
+def test_shuffle_compress_codec_lossless(compression, array):
+    codec = ShuffleCompressCodec(compression)
+    decoded = deserialize_chunk(serialize_chunk(array, codec))
+    assert decoded.dtype == array.dtype
+    assert decoded.shape == array.shape
+    np.testing.assert_array_equal(decoded, array)
+
+
+@given(numeric_arrays)
+@seed(2024)
+def test_quantize_codec_non_coordinates_lossless(array):
+    """Arrays that are not floating point coordinates (frames, atoms, ...) are stored losslessly"""
+    assume(not (np.issubdtype(array.dtype, np.floating) and array.ndim >= 2))
+    decoded = deserialize_chunk(serialize_chunk(array, QuantizeCodec()))
+    assert decoded.dtype == array.dtype
+    np.testing.assert_array_equal(decoded, array)
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_quantize_codec(dtype):
+    rng = np.random.default_rng(2024)
+    n_frames, n_atoms = 5, 100
+    frames = (10.0 * rng.uniform(size=(n_frames, n_atoms, 3))).astype(dtype)
+
+    ligand_idxs = [3, 50, 97]
+    protein_idxs = list(range(10, 20))
+    codec = QuantizeCodec(precision=100.0, atom_group_precisions=[(ligand_idxs, None), (protein_idxs, 1e4)])
+
+    encoded = serialize_chunk(frames, codec)
+    decoded = deserialize_chunk(encoded)
+    assert decoded.dtype == frames.dtype
+    assert decoded.shape == frames.shape
+
+    # ligand atoms are exact
+    np.testing.assert_array_equal(decoded[:, ligand_idxs], frames[:, ligand_idxs])
+
+    # other atoms are within half of the quantization step
+    eps = np.finfo(dtype).eps * 10.0
+    np.testing.assert_array_less(np.abs(decoded[:, protein_idxs] - frames[:, protein_idxs]), 0.5e-4 + eps)
+    other_idxs = np.setdiff1d(np.arange(n_atoms), ligand_idxs + protein_idxs)
+    np.testing.assert_array_less(np.abs(decoded[:, other_idxs] - frames[:, other_idxs]), 0.5e-2 + eps)
+    assert not np.array_equal(decoded, frames)
+
+    # quantized data compresses much better than the lossless codec
+    assert len(encoded) < 0.6 * len(serialize_chunk(frames, ShuffleCompressCodec()))
+
+    # decoding and re-encoding is idempotent
+    np.testing.assert_array_equal(deserialize_chunk(serialize_chunk(decoded, codec)), decoded)
+
+
+def test_quantize_codec_invalid():
+    with pytest.raises(AssertionError, match="overlap"):
+        QuantizeCodec(atom_group_precisions=[([0, 1], None), ([1, 2], 10.0)])
+    with pytest.raises(AssertionError):
+        QuantizeCodec(precision=0.0)
+    with pytest.raises(ValueError, match="out of range"):
+        serialize_chunk(np.full((1, 1, 3), 1e7), QuantizeCodec(precision=1e3))
+    with pytest.raises(ValueError, match="unsupported dtype"):
+        serialize_chunk(np.array([None]), ShuffleCompressCodec())
+    with pytest.raises(ValueError, match="not a serialized chunk"):
+        deserialize_chunk(b"")
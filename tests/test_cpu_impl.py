@@ -0,0 +1,181 @@
+import jax
+import numpy as np
+import pytest
+
+from timemachine.potentials import (
+    HarmonicBond,
+    Nonbonded,
+    NonbondedPairListPrecomputed,
+    PeriodicTorsion,
+    SummedPotential,
+)
+from timemachine.potentials.cpu_impl import CpuImpl
+
+pytestmark = [pytest.mark.nocuda]
+
+
+def make_random_system(n_atoms=20, n_bonds=10, n_torsions=5, seed=2024):
+    rng = np.random.default_rng(seed)
+
+    bond_idxs = np.array([rng.choice(n_atoms, 2, replace=False) for _ in range(n_bonds)], dtype=np.int32)
+    bond_params = rng.uniform(0.5, 1.5, (n_bonds, 2))
+
+    torsion_idxs = np.array([rng.choice(n_atoms, 4, replace=False) for _ in range(n_torsions)], dtype=np.int32)
+    torsion_params = np.stack([rng.uniform(1, 2, n_torsions), rng.uniform(0, np.pi, n_torsions), np.ones(n_torsions)]).T
+
+    exclusion_idxs = bond_idxs
+    scale_factors = np.ones((n_bonds, 2))
+    nb_params = np.stack(
+        [rng.normal(0, 0.5, n_atoms), rng.uniform(0.1, 0.2, n_atoms), rng.uniform(0.1, 1.0, n_atoms), np.zeros(n_atoms)]
+    ).T
+
+    potentials = [
+        HarmonicBond(bond_idxs),
+        PeriodicTorsion(torsion_idxs),
+        Nonbonded(n_atoms, exclusion_idxs, scale_factors, beta=2.0, cutoff=1.2),
+    ]
+    params = [bond_params, torsion_params, nb_params]
+    return potentials, params
+
+
+def sample_frames(n_frames, n_atoms, box_size=3.0, seed=2025):
+    rng = np.random.default_rng(seed)
+    coords = rng.uniform(0, box_size, (n_frames, n_atoms, 3))
+    boxes = np.array([np.eye(3) * box_size] * n_frames)
+    return coords, boxes
+
+
+def test_cpu_impl_execute_matches_reference():
+    potentials, params = make_random_system()
+    coords, boxes = sample_frames(1, 20)
+
+    for pot, ps in zip(potentials, params):
+        impl = pot.to_cpu().unbound_impl
+        assert isinstance(impl, CpuImpl)
+        du_dx, du_dp, u = impl.execute(coords[0], ps, boxes[0])
+
+        ref_u, (ref_du_dx, ref_du_dp) = jax.value_and_grad(pot, argnums=(0, 1))(coords[0], ps, boxes[0])
+        np.testing.assert_allclose(u, ref_u, rtol=1e-10)
+        np.testing.assert_allclose(du_dx, ref_du_dx, rtol=1e-10)
+        np.testing.assert_allclose(du_dp, ref_du_dp, rtol=1e-10)
+
+        du_dx, du_dp, u = impl.execute(coords[0], ps, boxes[0], False, False, True)
+        assert du_dx is None and du_dp is None
+        np.testing.assert_allclose(u, ref_u, rtol=1e-10)
+
+        np.testing.assert_allclose(impl.execute_du_dx(coords[0], ps, boxes[0]), ref_du_dx, rtol=1e-10)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 200])
+def test_cpu_impl_execute_batch(chunk_size):
+    potentials, params = make_random_system()
+    n_frames, n_params = 7, 3
+    coords, boxes = sample_frames(n_frames, 20)
+    rng = np.random.default_rng(2026)
+
+    for pot, ps in zip(potentials, params):
+        params_batch = np.array([ps * rng.uniform(0.9, 1.1, ps.shape) for _ in range(n_params)])
+        impl = CpuImpl(pot, chunk_size=chunk_size)
+        du_dx, du_dp, u = impl.execute_batch(coords, params_batch, boxes, True, True, True)
+
+        assert du_dx.shape == (n_frames, n_params, 20, 3)
+        assert du_dp.shape == (n_frames, n_params, *ps.shape)
+        assert u.shape == (n_frames, n_params)
+
+        for i in range(n_frames):
+            for j in range(n_params):
+                ref_du_dx, ref_du_dp, ref_u = impl.execute(coords[i], params_batch[j], boxes[i])
+                np.testing.assert_allclose(u[i, j], ref_u, rtol=1e-10)
+                np.testing.assert_allclose(du_dx[i, j], ref_du_dx, rtol=1e-10)
+                np.testing.assert_allclose(du_dp[i, j], ref_du_dp, rtol=1e-10)
+
+        # sparse evaluation of a subset of the dense matrix
+        coords_batch_idxs = np.array([0, 0, 3, 6, 2], dtype=np.uint32)
+        params_batch_idxs = np.array([2, 1, 0, 2, 2], dtype=np.uint32)
+        sparse_du_dx, sparse_du_dp, sparse_u = impl.execute_batch_sparse(
+            coords, params_batch, boxes, coords_batch_idxs, params_batch_idxs, True, True, True
+        )
+        np.testing.assert_allclose(sparse_u, u[coords_batch_idxs, params_batch_idxs], rtol=1e-12)
+        np.testing.assert_allclose(sparse_du_dx, du_dx[coords_batch_idxs, params_batch_idxs], rtol=1e-12)
+        np.testing.assert_allclose(sparse_du_dp, du_dp[coords_batch_idxs, params_batch_idxs], rtol=1e-12)
+
+        _, _, u_only = impl.execute_batch(coords, params_batch, boxes, False, False, True)
+        np.testing.assert_allclose(u_only, u, rtol=1e-12)
+
+
+def test_cpu_impl_summed_potential():
+    potentials, params = make_random_system()
+    coords, boxes = sample_frames(4, 20)
+
+    summed = SummedPotential(potentials, params)
+    flat_params = np.concatenate([ps.reshape(-1) for ps in params])
+    _, _, U_summed = summed.to_cpu().unbound_impl.execute_batch(coords, flat_params[None], boxes, False, False, True)
+
+    U_components = sum(
+        pot.to_cpu().unbound_impl.execute_batch(coords, ps[None], boxes, False, False, True)[2]
+        for pot, ps in zip(potentials, params)
+    )
+    np.testing.assert_allclose(U_summed, U_components, rtol=1e-10)
+
+
+def test_bound_cpu_impl():
+    potentials, params = make_random_system()
+    coords, boxes = sample_frames(3, 20)
+
+    for pot, ps in zip(potentials, params):
+        bp = pot.bind(ps)
+        bound_impl = bp.to_cpu().bound_impl
+        assert bound_impl.size() == ps.size
+
+        du_dx, u = bound_impl.execute(coords[0], boxes[0])
+        np.testing.assert_allclose(u, bp(coords[0], boxes[0]), rtol=1e-10)
+        np.testing.assert_allclose(u, bp.to_cpu()(coords[0], boxes[0]), rtol=1e-10)
+        np.testing.assert_allclose(du_dx, jax.grad(bp)(coords[0], boxes[0]), rtol=1e-10)
+
+        du_dxs, us = bound_impl.execute_batch(coords, boxes, True, True)
+        assert du_dxs.shape == coords.shape
+        assert us.shape == (len(coords),)
+        np.testing.assert_allclose(us[0], u, rtol=1e-10)
+
+        bound_impl.set_params(2 * ps.reshape(-1))
+        np.testing.assert_allclose(bound_impl.params, 2 * ps)
+
+        with pytest.raises(RuntimeError, match="parameter size is not equal"):
+            bound_impl.set_params(np.zeros(ps.size + 1))
+
+
+def test_cpu_impl_precision():
+    pot = NonbondedPairListPrecomputed(np.array([[0, 1]], dtype=np.int32), beta=2.0, cutoff=1.2)
+    params = np.array([[1.0, 0.1, 1.0, 0.0]])
+    coords = np.array([[0.0, 0.0, 0.0], [0.5, 0.0, 0.0]])
+    box = np.eye(3) * 3.0
+
+    _, _, u_f32 = pot.to_cpu(np.float32).unbound_impl.execute(coords, params, box)
+    _, _, u_f64 = pot.to_cpu(np.float64).unbound_impl.execute(coords, params, box)
+    np.testing.assert_allclose(u_f32, u_f64, rtol=1e-5)
+
+
+def test_cpu_impl_batch_validation():
+    pot = HarmonicBond(np.array([[0, 1]], dtype=np.int32))
+    impl = pot.to_cpu().unbound_impl
+    coords, boxes = sample_frames(2, 2)
+    params = np.ones((1, 1, 2))
+
+    with pytest.raises(RuntimeError, match="coords and boxes must have 3 dimensions"):
+        impl.execute_batch(coords[0], params, boxes, False, False, True)
+
+    with pytest.raises(RuntimeError, match="number of batches of coords and boxes don't match"):
+        impl.execute_batch(coords, params, boxes[:1], False, False, True)
+
+    with pytest.raises(RuntimeError, match="parameters must have at least 2 dimensions"):
+        impl.execute_batch(coords, np.ones(2), boxes, False, False, True)
+
+    idxs = np.zeros(2, dtype=np.uint32)
+    with pytest.raises(RuntimeError, match="must have the same length"):
+        impl.execute_batch_sparse(coords, params, boxes, idxs, idxs[:1], False, False, True)
+
+    with pytest.raises(RuntimeError, match="coords_batch_idxs contains an index that is out of bounds"):
+        impl.execute_batch_sparse(coords, params, boxes, idxs + 2, idxs, False, False, True)
+
+    with pytest.raises(RuntimeError, match="params_batch_idxs contains an index that is out of bounds"):
+        impl.execute_batch_sparse(coords, params, boxes, idxs, idxs + 1, False, False, True)
@@ -19,6 +19,7 @@ from timemachine.fe.bar import DEFAULT_SOLVER_PROTOCOL, ukln_to_ukn
 from timemachine.fe.free_energy import (
     BarResult,
     HostConfig,
+    HREXParams,
     HREXSimulationResult,
     IndeterminateEnergyWarning,
     InitialState,
@@ -35,10 +36,12 @@ from timemachine.fe.free_energy import (
     get_water_sampler_params,
     make_pair_bar_plots,
     run_sims_bisection,
+    run_sims_hrex,
     sample,
     trajectories_by_replica_to_by_state,
     verify_and_sanitize_potential_matrix,
 )
+from timemachine.fe.mbar import BandedUkn
 from timemachine.fe.rbfe import Host, setup_initial_state, setup_initial_states, setup_optimized_host
 from timemachine.fe.rest.single_topology import SingleTopologyREST
 from timemachine.fe.single_topology import AtomMapFlags, SingleTopology
@@ -48,6 +51,7 @@ from timemachine.lib import LangevinIntegrator
 from timemachine.md import builders
 from timemachine.md.hrex import HREX, HREXDiagnostics, ReplicaIdx
 from timemachine.md.states import CoordsVelBox
+from timemachine.parallel.client import SerialClient
 from timemachine.potentials import (
     HarmonicBond,
     Nonbonded,
@@ -389,7 +393,7 @@ def test_initial_state_interacting_ligand_atoms(host_name, seed):
 
 
 @pytest.mark.nocuda
-@patch("timemachine.fe.free_energy.plot_overlap_detail_figure")
+@patch("timemachine.fe.plots.plot_overlap_detail_figure")
 def test_plot_pair_bar_plots(mock_fig, hif2a_ligand_pair_single_topology_lam0_state):
     pair_result = PairBarResult(
         [hif2a_ligand_pair_single_topology_lam0_state] * 2,
@@ -559,6 +563,40 @@ def test_run_sims_bisection_early_stopping(hif2a_ligand_pair_single_topology_lam
         assert len(results) == 1 + 2
 
 
+@pytest.mark.parametrize("n_speculative", [None, 1, 3])
+def test_run_sims_bisection_speculative(hif2a_ligand_pair_single_topology_lam0_state, n_speculative):
+    """Speculative sampling with a client should give the same results as the serial bisection"""
+    initial_state = hif2a_ligand_pair_single_topology_lam0_state
+
+    def make_initial_state(lamb: float):
+        return replace(initial_state, lamb=lamb)
+
+    md_params = MDParams(2, 1, 1, 2023)
+
+    run = partial(
+        run_sims_bisection, [0.0, 1.0], make_initial_state, md_params, n_bisections=3, temperature=DEFAULT_TEMP
+    )
+
+    results_ref, trajs_ref = run(verbose=False)
+
+    client = SerialClient()
+    with patch.object(client, "submit", wraps=client.submit) as mock_submit:
+        results, trajs = run(client=client, n_speculative=n_speculative)
+
+    # initial states and at least one state per bisection iteration are sampled by the client
+    assert mock_submit.call_count >= 2 + 3
+    submitted_lambdas = {call.args[1].lamb for call in mock_submit.call_args_list}
+    assert len(submitted_lambdas) == mock_submit.call_count
+
+    assert len(results) == len(results_ref)
+    for result, result_ref in zip(results, results_ref):
+        assert [s.lamb for s in result.initial_states] == [s.lamb for s in result_ref.initial_states]
+        np.testing.assert_array_equal(result.overlaps, result_ref.overlaps)
+        np.testing.assert_array_equal(result.dGs, result_ref.dGs)
+    for traj, traj_ref in zip(trajs, trajs_ref):
+        assert traj.frames == traj_ref.frames
+
+
 @pytest.mark.nocuda
 def test_estimate_free_energy_bar_with_energy_overflow():
     """Ensure that we handle NaNs in u_kln inputs (e.g. due to overflow in potential evaluation)."""
@@ -637,6 +675,57 @@ def test_compute_potential_matrix(hif2a_ligand_pair_single_topology, n_states: i
     assert np.all(np.isinf(U_test[~is_computed]))
 
 
+@pytest.mark.nocuda
+@pytest.mark.parametrize("batch_size", [1, 3, 100])
+def test_compute_u_kn_batched(hif2a_ligand_pair_single_topology, batch_size, tmp_path):
+    st, _ = hif2a_ligand_pair_single_topology
+    n_states = 3
+    conf = st.combine_confs(utils.get_romol_conf(st.mol_a), utils.get_romol_conf(st.mol_b))
+    box = 100.0 * np.eye(3)
+    integrator = LangevinIntegrator(DEFAULT_TEMP, 1.5e-3, 1.0, np.ones(len(conf)), 2024)
+    initial_states = [
+        InitialState(
+            st.setup_intermediate_state(lam).get_U_fns(),
+            integrator,
+            None,
+            conf,
+            np.zeros_like(conf),
+            box,
+            lam,
+            np.arange(len(conf)),
+            np.array([], dtype=np.int32),
+        )
+        for lam in np.linspace(0.0, 1.0, n_states)
+    ]
+
+    rng = np.random.default_rng(2024)
+    trajs = [Trajectory.empty() for _ in range(n_states)]
+    for k, traj in enumerate(trajs):
+        for _ in range(4 + k):
+            traj.frames.extend([conf + rng.normal(0.0, 0.01, conf.shape)])
+            traj.boxes.append(box)
+
+    unbound_impl = make_summed_potential(initial_states[0].potentials).potential.to_cpu().unbound_impl
+    u_kl = free_energy.make_u_kl_fxn(trajs, initial_states, unbound_impl)
+    u_kn, N_k = free_energy.compute_u_kn(trajs, initial_states, unbound_impl, batch_size=batch_size)
+    u_kln = free_energy.compute_u_kln(trajs, initial_states, unbound_impl, batch_size=batch_size)
+    np.testing.assert_array_equal(N_k, [4, 5, 6])
+
+    offsets = np.concatenate([[0], np.cumsum(N_k)])
+    for k in range(n_states):
+        for l in range(n_states):
+            np.testing.assert_allclose(u_kn[l, offsets[k] : offsets[k + 1]], u_kl(k, l))
+            np.testing.assert_allclose(u_kln[k, l, : N_k[k]], u_kl(k, l))
+        assert np.all(np.isnan(u_kln[k, :, N_k[k] :]))
+
+    # write into a memory-mapped array
+    path = tmp_path / "u_kn.npy"
+    out = np.lib.format.open_memmap(path, mode="w+", shape=u_kn.shape)
+    free_energy.compute_u_kn(trajs, initial_states, unbound_impl, batch_size=batch_size, out=out)
+    out.flush()
+    np.testing.assert_array_equal(np.load(path), u_kn)
+
+
 @pytest.mark.nogpu
 @pytest.mark.parametrize("seed", [2024])
 @pytest.mark.parametrize("n_states, n_iters", [(2, 2), (5, 10), (24, 100)])
@@ -765,3 +854,56 @@ def test_initial_state_to_bound_impl():
     du_dx, u = bound_impl.execute(x, box, compute_du_dx=True, compute_u=True)
     assert np.isfinite(u)
     assert np.isfinite(du_dx).all()
+
+
+@pytest.mark.nocuda
+@pytest.mark.parametrize(
+    "n_states, hrex_max_delta_states, banded_max_delta_states, should_raise",
+    [(8, 4, 4, False), (8, 4, None, False), (8, 4, 2, True), (8, None, 4, True), (3, 4, None, False)],
+)
+def test_run_sims_hrex_banded_u_kn_max_delta_states(
+    n_states, hrex_max_delta_states, banded_max_delta_states, should_raise
+):
+    """run_sims_hrex should refuse a BandedUkn that would drop energies computed by HREX"""
+    md_params = MDParams(
+        n_frames=1,
+        n_eq_steps=0,
+        steps_per_frame=1,
+        seed=2024,
+        hrex_params=HREXParams(max_delta_states=hrex_max_delta_states),
+    )
+    banded_u_kn = BandedUkn(n_states, banded_max_delta_states)
+    initial_states = [Mock(InitialState)] * n_states
+
+    # checks are done before sampling, so stop at the first use of the initial states
+    with patch.object(free_energy, "assert_ensembles_compatible", side_effect=StopIteration):
+        if should_raise:
+            with pytest.raises(AssertionError, match="banded_u_kn.max_delta_states"):
+                run_sims_hrex(initial_states, md_params, banded_u_kn=banded_u_kn)
+        else:
+            with pytest.raises(StopIteration):
+                run_sims_hrex(initial_states, md_params, banded_u_kn=banded_u_kn)
+
+
+@pytest.mark.parametrize("pipelined", [False, True])
+def test_host_work_queue_shutdown_after_error(pipelined):
+    """Work submitted before an error in the sampling loop should still be completed when the queue is shut down"""
+    host_work = free_energy._HostWorkQueue(pipelined)
+    completed = []
+
+    with pytest.raises(RuntimeError, match="sampling failed"):
+        try:
+            host_work.submit(completed.append, 0)
+            raise RuntimeError("sampling failed")
+        finally:
+            host_work.shutdown()
+
+    assert completed == [0]
+
+    def fail():
+        raise ValueError("record failed")
+
+    host_work = free_energy._HostWorkQueue(pipelined)
+    with pytest.raises(ValueError, match="record failed"):
+        host_work.submit(fail)
+        host_work.shutdown()
@@ -13,6 +13,7 @@ from scipy import stats
 
 from timemachine.fe.energy_decomposition import EnergyDecomposedState, compute_energy_decomposed_u_kln, get_batch_u_fns
 from timemachine.fe.free_energy import (
+    EarlyStoppingParams,
     HostConfig,
     HREXParams,
     HREXSimulationResult,
@@ -313,3 +314,87 @@ def test_hrex_rbfe_reproducibility(hif2a_single_topology_leg, local_md: bool, se
     if host_config:
         # for vacuum leg, boxes are trivially identical
         assert not np.all(np.array(res1.boxes) == np.array(res3.boxes))
+
+
+@pytest.mark.parametrize("seed", [2024])
+def test_hrex_rbfe_early_stopping(hif2a_single_topology_leg, seed):
+    host_name, (mol_a, mol_b, core, forcefield, host_config) = hif2a_single_topology_leg
+
+    n_frames = 10
+    md_params = MDParams(
+        n_frames=n_frames,
+        n_eq_steps=10,
+        steps_per_frame=400,
+        seed=seed,
+        hrex_params=HREXParams(n_frames_bisection=1),
+    )
+
+    def run(early_stopping_params):
+        return estimate_relative_free_energy_bisection_hrex(
+            mol_a,
+            mol_b,
+            core,
+            forcefield,
+            host_config,
+            replace(md_params, hrex_params=replace(md_params.hrex_params, early_stopping_params=early_stopping_params)),
+            lambda_interval=(0.0, 0.1),
+            n_windows=3,
+        )
+
+    # unreachable target runs to completion
+    res = run(EarlyStoppingParams(target_dG_err=1e-9, min_frames=2, check_interval=2))
+    assert res.md_params.n_frames == n_frames
+    assert all(len(traj.frames) == n_frames for traj in res.trajectories)
+
+    # trivially satisfied target stops at the first check after min_frames
+    res_early = run(EarlyStoppingParams(target_dG_err=1e9, min_frames=3, check_interval=2))
+    assert res_early.md_params.n_frames == 4
+    assert all(len(traj.frames) == 4 for traj in res_early.trajectories)
+    assert len(res_early.hrex_diagnostics.replica_idx_by_state_by_iter) == 4
+
+    # samples up to the stopping point are unchanged by early stopping
+    for frames, frames_early in zip(res.frames, res_early.frames):
+        np.testing.assert_array_equal(np.array(list(frames))[:4], np.array(list(frames_early)))
+
+
+@pytest.mark.parametrize("seed", [2024])
+def test_hrex_rbfe_pipelined(hif2a_single_topology_leg, seed):
+    """Pipelined HREX, which stores frames and updates diagnostics on a worker thread, should be bitwise identical to
+    the serial loop"""
+    host_name, (mol_a, mol_b, core, forcefield, host_config) = hif2a_single_topology_leg
+
+    md_params = MDParams(
+        n_frames=6,
+        n_eq_steps=10,
+        steps_per_frame=400,
+        seed=seed,
+        hrex_params=HREXParams(n_frames_bisection=1),
+    )
+
+    def run(pipelined):
+        return estimate_relative_free_energy_bisection_hrex(
+            mol_a,
+            mol_b,
+            core,
+            forcefield,
+            host_config,
+            replace(md_params, hrex_params=replace(md_params.hrex_params, pipelined=pipelined)),
+            lambda_interval=(0.0, 0.1),
+            n_windows=3,
+        )
+
+    res = run(False)
+    res_pipelined = run(True)
+
+    for frames, frames_pipelined in zip(res.frames, res_pipelined.frames):
+        np.testing.assert_array_equal(np.array(list(frames)), np.array(list(frames_pipelined)))
+    for boxes, boxes_pipelined in zip(res.boxes, res_pipelined.boxes):
+        np.testing.assert_array_equal(np.array(boxes), np.array(boxes_pipelined))
+    assert (
+        res.hrex_diagnostics.replica_idx_by_state_by_iter == res_pipelined.hrex_diagnostics.replica_idx_by_state_by_iter
+    )
+    np.testing.assert_array_equal(
+        res.hrex_diagnostics.fraction_accepted_by_pair_by_iter,
+        res_pipelined.hrex_diagnostics.fraction_accepted_by_pair_by_iter,
+    )
+    assert [r.dG for r in res.final_result.bar_results] == [r.dG for r in res_pipelined.final_result.bar_results]
@@ -0,0 +1,102 @@
+import json
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from timemachine.utils import lazy_import
+
+pytestmark = [pytest.mark.nocuda]
+
+# heavy dependencies that modules imported by process pool workers should not import eagerly
+DEFERRED_MODULES = [
+    "pymbar",
+    "matplotlib",
+    "openmm",
+    "openmm.app",
+    "rdkit",
+    "scipy.stats",
+    "scipy.special",
+    "torch",
+    "pyscf",
+    "timemachine.fe.plots",
+    "timemachine.md.builders",
+]
+
+# modules to check, with the heavy dependencies they are still expected to import eagerly
+EXPECTED_DEPENDENCIES = {
+    "timemachine.fe.bar": [],
+    "timemachine.fe.stored_arrays": [],
+    "timemachine.md.hrex": [],
+    "timemachine.maps.estimators": [],
+    "timemachine.parallel.client": [],
+    "timemachine.potentials": [],
+    # rdkit and openff (through timemachine.ff), and scipy.special (through scipy.spatial)
+    "timemachine.fe.free_energy": [
+        "rdkit.Chem",
+        "openff.toolkit",
+        "openff.recharge.aromaticity",
+        "scipy.spatial",
+    ],
+    "timemachine.fe.rbfe": [
+        "rdkit.Chem",
+        "openff.toolkit",
+        "openff.recharge.aromaticity",
+        "scipy.spatial",
+    ],
+}
+
+# maximum import time in excess of the time to import timemachine and the expected dependencies
+IMPORT_TIME_BUDGET = 1.0  # seconds
+
+
+def time_import(modules: list[str]) -> tuple[float, list[str]]:
+    """Returns the time to import modules in a fresh interpreter, and the deferred modules that were imported"""
+    script = textwrap.dedent(
+        f"""
+        import json
+        import sys
+        import time
+
+        start = time.perf_counter()
+        for module in {modules!r}:
+            __import__(module)
+        elapsed = time.perf_counter() - start
+        print(json.dumps([elapsed, [m for m in {DEFERRED_MODULES!r} if m in sys.modules]]))
+        """
+    )
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+    elapsed, imported = json.loads(result.stdout.strip().splitlines()[-1])
+    return elapsed, imported
+
+
+def test_lazy_import():
+    mod = lazy_import("json")
+    assert mod is sys.modules["json"]  # already imported modules are returned directly
+
+    name = "colorsys"
+    if name in sys.modules:
+        pytest.skip(f"{name} already imported")
+    mod = lazy_import(name)
+    assert name not in sys.modules
+    assert mod.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)  # first attribute access imports the module
+    assert name in sys.modules
+
+    with pytest.raises(ModuleNotFoundError):
+        lazy_import("timemachine.no_such_module").foo
+
+
+@pytest.mark.parametrize("module", sorted(EXPECTED_DEPENDENCIES))
+def test_heavy_dependencies_not_imported(module):
+    """Importing modules (e.g. in process pool workers) should not import heavy dependencies other than those expected,
+    and should take little time beyond importing timemachine and the expected dependencies"""
+    baseline_modules = ["timemachine", *EXPECTED_DEPENDENCIES[module]]
+    baseline_elapsed, baseline_imported = time_import(baseline_modules)
+    elapsed, imported = time_import([module])
+
+    unexpected = sorted(set(imported) - set(baseline_imported))
+    assert unexpected == [], f"importing {module} imported {unexpected}"
+    assert elapsed < baseline_elapsed + IMPORT_TIME_BUDGET, (
+        f"importing {module} took {elapsed:.2f} s, vs. {baseline_elapsed:.2f} s to import {baseline_modules}"
+    )
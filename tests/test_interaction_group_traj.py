@@ -5,6 +5,7 @@ from jax import numpy as jnp
 from jax.scipy.special import logsumexp
 
 from timemachine.fe.interaction_group_traj import InteractionGroupTraj, nb_pair_fxn
+from timemachine.potentials.jax_utils import get_interacting_pair_indices_csr, pairs_from_interaction_groups
 from timemachine.potentials.nonbonded import nonbonded_interaction_groups
 
 pytestmark = [pytest.mark.nocuda]
@@ -87,3 +88,18 @@ def test_interaction_group_traj_correctness(config):
 
     U_0_ref = np.array([U_ref(x, box_diag) for (x, box_diag) in zip(xs, box_diags)])
     np.testing.assert_allclose(U_0, U_0_ref)
+
+
+def test_interaction_group_traj_from_pair_list():
+    """assert energies are identical when the neighborlist is derived from a precomputed CSR pair list"""
+    n_frames, n_env, n_lig = 50, 1000, 20
+    box_size = np.cbrt((n_env + n_lig) / 10.0)
+    xs, box_diags, env_idxs, lig_idxs, nb_params = sample_random_instance(n_frames, n_env, n_lig, box_size=box_size)
+    boxes = np.array([np.diag(box_diag) for box_diag in box_diags])
+
+    traj = InteractionGroupTraj(xs, box_diags, lig_idxs, env_idxs)
+    pair_list = get_interacting_pair_indices_csr(xs, boxes, pairs_from_interaction_groups(lig_idxs, env_idxs), 1.2)
+    traj_2 = InteractionGroupTraj(xs, box_diags, lig_idxs, env_idxs, pair_list=pair_list)
+
+    assert traj_2.xs_env.shape == traj.xs_env.shape
+    np.testing.assert_allclose(traj_2.make_U_fxn(nb_pair_fxn)(nb_params), traj.make_U_fxn(nb_pair_fxn)(nb_params))
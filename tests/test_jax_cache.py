@@ -0,0 +1,93 @@
+import json
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+import pytest
+
+from timemachine import jax_cache
+from timemachine.md.hrex import _run_neighbor_swaps
+
+pytestmark = [pytest.mark.nocuda]
+
+
+@pytest.fixture
+def manifest_path(tmp_path):
+    path = tmp_path / "manifest.jsonl"
+    jax_cache.record_warmup_manifest(path)
+    yield path
+    jax_cache.record_warmup_manifest(None)
+
+
+def run_neighbor_swaps(n_states, n_swap_attempts, seed=2024):
+    rng = np.random.default_rng(seed)
+    neighbor_pairs = np.array([(s, s + 1) for s in range(n_states - 1)], dtype=np.int32)
+    return _run_neighbor_swaps(
+        jnp.arange(n_states),
+        jnp.asarray(neighbor_pairs),
+        jnp.asarray(rng.normal(size=(n_states, n_states))),
+        jnp.asarray(rng.choice(len(neighbor_pairs), n_swap_attempts)),
+        jnp.asarray(rng.uniform(size=n_swap_attempts)),
+    )
+
+
+def test_warmup_manifest_records_unique_signatures(manifest_path):
+    run_neighbor_swaps(4, 10)
+    run_neighbor_swaps(4, 10, seed=2025)  # same shapes, not recorded again
+    run_neighbor_swaps(6, 10)
+
+    entries = jax_cache.load_manifest(manifest_path)
+    assert [entry.name for entry in entries] == ["timemachine.md.hrex:_run_neighbor_swaps"] * 2
+    assert entries[0].args[0] == {"shape": [4], "dtype": np.dtype(jnp.arange(1).dtype).name}
+    assert entries[1].args[2]["shape"] == [6, 6]
+
+    # signatures already in the manifest are not recorded again by a new process
+    jax_cache.record_warmup_manifest(manifest_path)
+    run_neighbor_swaps(4, 10)
+    assert len(manifest_path.read_text().splitlines()) == 2
+
+    # stale and partially-written entries are skipped
+    with open(manifest_path, "a") as fp:
+        fp.write(json.dumps({"name": "timemachine.md.hrex:no_such_function", "args": []}) + "\n")
+        fp.write('{"name": "timemachine.md')
+    assert len(jax_cache.load_manifest(manifest_path)) == 3
+    assert jax_cache.warm_up(manifest_path) == 2
+
+
+def test_warmup_entry_point_python_scalars(manifest_path):
+    @jax.jit
+    def f(x, scale, offset):
+        return x * scale + (offset if offset is not None else 0.0)
+
+    g = jax_cache.warmup_entry_point(f, "test_module:g")
+    np.testing.assert_array_equal(g(jnp.ones(3), 2.0, None), 2 * np.ones(3))
+    g(jnp.ones(3), 3.0, None)  # values of scalar arguments don't affect the signature
+
+    (entry,) = jax_cache.load_manifest(manifest_path)
+    assert entry.name == "test_module:g"
+    assert entry.args[1:] == [{"scalar": "float"}, None]
+    assert g.lower(*[jax_cache._decode_arg(arg) for arg in entry.args]).compile() is not None
+
+
+def test_warm_up_without_manifest(monkeypatch, tmp_path):
+    monkeypatch.delenv(jax_cache.WARMUP_MANIFEST_ENV_VAR, raising=False)
+    assert jax_cache.warm_up() == 0
+    assert jax_cache.warm_up(tmp_path / "missing.jsonl") == 0
+
+
+def test_persistent_cache(tmp_path):
+    from jax.experimental.compilation_cache import compilation_cache
+
+    cache_dir = tmp_path / "cache"
+    try:
+        jax_cache.enable_persistent_cache(cache_dir)
+
+        @jax.jit
+        def f(x):
+            return jnp.sin(x) ** 2 + 0.123456789
+
+        f(jnp.ones(7)).block_until_ready()
+        assert len(list(cache_dir.iterdir())) > 0
+    finally:
+        jax.config.update("jax_compilation_cache_dir", None)
+        compilation_cache.reset_cache()
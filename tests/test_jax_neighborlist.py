@@ -0,0 +1,168 @@
+import jax
+import numpy as np
+import pytest
+
+from timemachine.potentials.jax_utils import delta_r
+from timemachine.potentials.neighborlist import (
+    build_neighbor_list,
+    needs_rebuild,
+    pairs_from_neighbor_list,
+    update_neighbor_list,
+)
+from timemachine.potentials.nonbonded import nonbonded, nonbonded_block
+
+pytestmark = [pytest.mark.nocuda]
+
+
+def sample_instance(n_atoms, box_size, n_exclusions=0, seed=2024):
+    rng = np.random.default_rng(seed)
+    conf = rng.uniform(0, box_size, (n_atoms, 3))
+    box = np.eye(3) * box_size
+
+    params = np.stack(
+        [
+            rng.normal(0, 0.5, n_atoms),
+            rng.uniform(0.05, 0.1, n_atoms),
+            rng.uniform(0.0, 1.0, n_atoms),
+            rng.uniform(0.0, 0.5, n_atoms) * (rng.uniform(size=n_atoms) < 0.2),
+        ]
+    ).T
+
+    exclusion_idxs = np.array(
+        [rng.choice(n_atoms, 2, replace=False) for _ in range(n_exclusions)], dtype=np.int32
+    ).reshape(-1, 2)
+    exclusion_idxs = np.unique(np.sort(exclusion_idxs, axis=1), axis=0)
+    scale_factors = rng.uniform(0, 1, (len(exclusion_idxs), 2))
+    return conf, params, box, exclusion_idxs, scale_factors
+
+
+def brute_force_pairs(x, box, radius, y=None):
+    y_ = x if y is None else y
+    d = np.linalg.norm(delta_r(x[:, None], y_[None, :], box), axis=-1)
+    i, j = np.nonzero(d < radius)
+    if y is None:
+        keep = j > i
+        i, j = i[keep], j[keep]
+    return set(zip(i.tolist(), j.tolist()))
+
+
+def neighbor_list_pairs(nl):
+    pairs, mask = pairs_from_neighbor_list(nl)
+    return set(map(tuple, np.asarray(pairs)[np.asarray(mask)].tolist()))
+
+
+@pytest.mark.parametrize("periodic", [True, False])
+@pytest.mark.parametrize("box_size", [1.5, 2.5, 4.0])
+def test_neighbor_list_matches_brute_force(periodic, box_size):
+    n_atoms = int(50 * box_size**3)
+    conf, _, box, _, _ = sample_instance(n_atoms, box_size)
+    box = box if periodic else None
+    cutoff, skin = 1.2, 0.1
+
+    nl = build_neighbor_list(conf, box, cutoff, skin)
+    assert nl.idxs.shape[1] >= int(np.max(nl.n_neighbors))
+    pairs = neighbor_list_pairs(nl)
+    assert len(pairs) == int(np.sum(nl.n_neighbors))
+    assert pairs == brute_force_pairs(conf, box, cutoff + skin)
+
+    # block neighbor list between two sets of particles
+    x, y = conf[: n_atoms // 3], conf[n_atoms // 3 :]
+    nl_block = build_neighbor_list(x, box, cutoff, skin, y=y)
+    assert neighbor_list_pairs(nl_block) == brute_force_pairs(x, box, cutoff + skin, y=y)
+
+
+def test_neighbor_list_capacity_growth():
+    conf, _, box, _, _ = sample_instance(500, 2.5)
+    nl_ref = build_neighbor_list(conf, box, 1.2)
+
+    with pytest.warns(UserWarning, match="Increasing neighbor list capacity"):
+        nl = build_neighbor_list(conf, box, 1.2, max_neighbors=4)
+    assert neighbor_list_pairs(nl) == neighbor_list_pairs(nl_ref)
+
+    # capacity is preserved when larger than necessary
+    nl = build_neighbor_list(conf, box, 1.2, max_neighbors=nl_ref.max_neighbors + 64)
+    assert nl.max_neighbors == nl_ref.max_neighbors + 64
+    assert neighbor_list_pairs(nl) == neighbor_list_pairs(nl_ref)
+
+
+@pytest.mark.parametrize("periodic", [True, False])
+@pytest.mark.parametrize("box_size", [2.0, 3.0])
+def test_nonbonded_neighbor_list_matches_dense(periodic, box_size):
+    n_atoms = int(50 * box_size**3)
+    conf, params, box, exclusion_idxs, scale_factors = sample_instance(n_atoms, box_size, n_exclusions=n_atoms)
+    box = box if periodic else None
+    beta, cutoff = 2.0, 1.2
+
+    def U_dense(conf, params):
+        return nonbonded(conf, params, box, exclusion_idxs, scale_factors, beta, cutoff, runtime_validate=False)
+
+    nl = build_neighbor_list(conf, box, cutoff)
+
+    @jax.jit
+    def U_nblist(conf, params, nl):
+        return nonbonded(
+            conf, params, box, exclusion_idxs, scale_factors, beta, cutoff, runtime_validate=False, neighbor_list=nl
+        )
+
+    U_ref, (du_dx_ref, du_dp_ref) = jax.value_and_grad(U_dense, argnums=(0, 1))(conf, params)
+    U, (du_dx, du_dp) = jax.value_and_grad(U_nblist, argnums=(0, 1))(conf, params, nl)
+
+    np.testing.assert_allclose(U, U_ref, rtol=1e-10)
+    np.testing.assert_allclose(du_dx, du_dx_ref, rtol=1e-8, atol=1e-8)
+    np.testing.assert_allclose(du_dp, du_dp_ref, rtol=1e-8, atol=1e-8)
+
+    # list remains valid for displacements smaller than skin / 2
+    rng = np.random.default_rng(2025)
+    perturbation = rng.normal(0, 1, conf.shape)
+    perturbation *= 0.049 / np.max(np.linalg.norm(perturbation, axis=1))
+    conf_perturbed = conf + perturbation
+    assert not needs_rebuild(nl, conf_perturbed, box)
+    np.testing.assert_allclose(U_nblist(conf_perturbed, params, nl), U_dense(conf_perturbed, params), rtol=1e-10)
+
+    conf_moved = conf + 2 * perturbation
+    assert needs_rebuild(nl, conf_moved, box)
+    nl_updated = update_neighbor_list(nl, conf_moved, box, cutoff)
+    assert nl_updated is not nl
+    assert nl_updated.max_neighbors >= nl.max_neighbors
+    np.testing.assert_allclose(U_nblist(conf_moved, params, nl_updated), U_dense(conf_moved, params), rtol=1e-10)
+
+
+def test_nonbonded_neighbor_list_atom_idxs():
+    conf, params, box, exclusion_idxs, scale_factors = sample_instance(400, 2.0, n_exclusions=200)
+    atom_idxs = np.arange(0, 400, 3, dtype=np.int32)
+    kwargs = dict(beta=2.0, cutoff=1.2, atom_idxs=atom_idxs)
+
+    U_ref = nonbonded(conf, params, box, exclusion_idxs, scale_factors, **kwargs)
+    nl = build_neighbor_list(conf[atom_idxs], box, 1.2)
+    U = nonbonded(conf, params, box, exclusion_idxs, scale_factors, neighbor_list=nl, **kwargs)
+    np.testing.assert_allclose(U, U_ref, rtol=1e-10)
+
+
+@pytest.mark.parametrize("periodic", [True, False])
+def test_nonbonded_block_neighbor_list(periodic):
+    conf, params, box, _, _ = sample_instance(600, 2.5)
+    box = box if periodic else None
+    xi, xj = conf[:100], conf[100:]
+    params_i, params_j = params[:100], params[100:]
+    beta, cutoff = 2.0, 1.2
+
+    nl = build_neighbor_list(xi, box, cutoff, y=xj)
+    U_ref, (du_dxi_ref, du_dxj_ref) = jax.value_and_grad(nonbonded_block, argnums=(0, 1))(
+        xi, xj, box, params_i, params_j, beta, cutoff
+    )
+    U, (du_dxi, du_dxj) = jax.value_and_grad(nonbonded_block, argnums=(0, 1))(
+        xi, xj, box, params_i, params_j, beta, cutoff, nl
+    )
+    np.testing.assert_allclose(U, U_ref, rtol=1e-10)
+    np.testing.assert_allclose(du_dxi, du_dxi_ref, rtol=1e-8, atol=1e-8)
+    np.testing.assert_allclose(du_dxj, du_dxj_ref, rtol=1e-8, atol=1e-8)
+
+
+def test_neighbor_list_scales_linearly():
+    """neighbor list capacity depends on density and cutoff, not system size"""
+    capacities = []
+    for box_size in [3.0, 5.0]:
+        conf, _, box, _, _ = sample_instance(int(50 * box_size**3), box_size)
+        nl = build_neighbor_list(conf, box, 1.2)
+        capacities.append(nl.max_neighbors)
+    assert capacities[1] <= 1.5 * capacities[0]
@@ -289,6 +289,33 @@ def test_jax_nonbonded(n_instances=10):
     run_randomized_tests_of_jax_nonbonded(instance_generator, n_instances)
 
 
+@pytest.mark.parametrize("memory_budget", [1, 2**14, 2**30])
+def test_jax_nonbonded_blocked(memory_budget, n_instances=5):
+    """Assert that `nonbonded` evaluated in blocks of rows agrees with the dense reference"""
+    instance_generator = partial(generate_random_inputs, instance_flags=difficult_instance_flags)
+
+    for n_atoms in np.random.randint(10, 50, n_instances):
+        conf, params, box, exclusion_idxs, scale_factors, beta, cutoff = instance_generator(n_atoms, 3)
+
+        def u_dense(conf, params, box):
+            return nonbonded(conf, params, box, exclusion_idxs, scale_factors, beta, cutoff, runtime_validate=False)
+
+        def u_blocked(conf, params, box):
+            return nonbonded(
+                conf,
+                params,
+                box,
+                exclusion_idxs,
+                scale_factors,
+                beta,
+                cutoff,
+                runtime_validate=False,
+                memory_budget=memory_budget,
+            )
+
+        compare_two_potentials(jit(u_dense), jit(u_blocked), (conf, params, box))
+
+
 def test_vmap():
     """Can call jit(vmap(nonbonded_on_specific_pairs))"""
 
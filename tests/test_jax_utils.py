@@ -3,9 +3,9 @@ from functools import partial
 import hypothesis.strategies as st
 import numpy as np
 import pytest
-from hypothesis import example, given, seed
+from hypothesis import example, given, seed, settings
 from hypothesis.extra.numpy import array_shapes, arrays
-from jax import jit, vmap
+from jax import jit, value_and_grad, vmap
 from jax import numpy as jnp
 
 np.random.seed(2021)
@@ -14,11 +14,17 @@ from timemachine.potentials.jax_utils import (
     DEFAULT_CHUNK_SIZE,
     delta_r,
     distance_on_pairs,
+    estimate_nbytes_per_frame,
     get_all_pairs_indices,
     get_interacting_pair_indices_batch,
+    get_interacting_pair_indices_csr,
     pairs_from_interaction_groups,
+    pairwise_block_size,
     pairwise_distances,
+    pairwise_distances_blocked,
+    pairwise_sum_blocked,
     process_traj_in_chunks,
+    process_traj_streaming,
 )
 
 pytestmark = [pytest.mark.nocuda]
@@ -122,6 +128,88 @@ def test_batched_neighbor_inds():
     assert np.sum(neighbor_distances < cutoff) == np.sum(full_distances < cutoff)
 
 
+@pytest.mark.parametrize("chunk_size", [7, DEFAULT_CHUNK_SIZE])
+@pytest.mark.parametrize("pad_to_power_of_two", [False, True])
+def test_batched_neighbor_inds_csr(chunk_size, pad_to_power_of_two):
+    """assert that the CSR pair list contains exactly the pairs within cutoff in each frame, and that
+    nonbonded_on_precomputed_pairs on the CSR pair list agrees with per-frame evaluation on all candidate pairs"""
+    from timemachine.potentials.nonbonded import nonbonded_on_precomputed_pairs
+
+    rng = np.random.default_rng(2024)
+    n_confs, n_particles = 30, 500
+    confs = rng.uniform(0, 1, (n_confs, n_particles, 3))
+    # vary density across frames, so that frames have very different numbers of neighbors
+    confs[: n_confs // 2] *= 0.5
+    boxes = np.array([np.eye(3)] * n_confs)
+    cutoff = 0.3
+
+    n_alchemical = 20
+    pairs = pairs_from_interaction_groups(np.arange(n_alchemical), np.arange(n_alchemical, n_particles))
+    full_distances = vmap(distance_on_pairs)(confs[:, pairs[:, 0]], confs[:, pairs[:, 1]], boxes)
+
+    pair_list = get_interacting_pair_indices_csr(confs, boxes, pairs, cutoff, chunk_size, pad_to_power_of_two)
+    assert pair_list.n_frames == n_confs
+    assert pair_list.n_pairs == np.sum(full_distances < cutoff)
+    if pad_to_power_of_two:
+        n_entries = len(pair_list.pairs)
+        assert n_entries >= pair_list.n_pairs and n_entries & (n_entries - 1) == 0
+    else:
+        assert len(pair_list.pairs) == pair_list.n_pairs
+
+    for k in range(n_confs):
+        start, stop = pair_list.offsets[k], pair_list.offsets[k + 1]
+        np.testing.assert_array_equal(pair_list.pair_idxs[start:stop], np.nonzero(full_distances[k] < cutoff)[0])
+        np.testing.assert_array_equal(pair_list.pairs[start:stop], pairs[pair_list.pair_idxs[start:stop]])
+
+    params = rng.uniform(0.1, 1.0, (len(pairs), 4))
+    vdW, electrostatics = nonbonded_on_precomputed_pairs(confs, params, boxes, pair_list, beta=2.0, cutoff=cutoff)
+    assert vdW.shape == electrostatics.shape == (len(pair_list.pairs),)
+    U = pair_list.sum_by_frame(vdW + electrostatics)
+
+    def U_ref(conf, box):
+        vdW, electrostatics = nonbonded_on_precomputed_pairs(conf, params, box, pairs, beta=2.0, cutoff=cutoff)
+        return jnp.sum(vdW) + jnp.sum(electrostatics)
+
+    np.testing.assert_allclose(U, [U_ref(conf, box) for conf, box in zip(confs, boxes)], rtol=1e-10)
+
+
+def test_csr_pair_list_jit_compiles_once():
+    """assert that a jitted function consuming padded pair lists of the same padded size is compiled once"""
+    from timemachine.potentials.nonbonded import nonbonded_on_precomputed_pairs
+
+    rng = np.random.default_rng(2024)
+    n_confs, n_particles = 10, 200
+    confs = rng.uniform(0, 1, (n_confs, n_particles, 3))
+    confs[: n_confs // 2] *= 0.5
+    boxes = np.array([np.eye(3)] * n_confs)
+    cutoff = 0.3
+    pairs = pairs_from_interaction_groups(np.arange(10), np.arange(10, n_particles))
+    params = rng.uniform(0.1, 1.0, (len(pairs), 4))
+
+    # same number of entries, but different distribution of pairs across frames
+    pair_list_1 = get_interacting_pair_indices_csr(confs, boxes, pairs, cutoff, pad_to_power_of_two=True)
+    pair_list_2 = get_interacting_pair_indices_csr(confs[::-1], boxes, pairs, cutoff, pad_to_power_of_two=True)
+    assert len(pair_list_1.pairs) == len(pair_list_2.pairs)
+    assert not np.array_equal(pair_list_1.offsets, pair_list_2.offsets)
+
+    n_traces = 0
+
+    @jit
+    def U_by_frame(confs, params, boxes, pair_list):
+        nonlocal n_traces
+        n_traces += 1
+        vdW, electrostatics = nonbonded_on_precomputed_pairs(confs, params, boxes, pair_list, 2.0, cutoff)
+        return pair_list.sum_by_frame(vdW + electrostatics)
+
+    U_1 = U_by_frame(confs, params, boxes, pair_list_1)
+    U_2 = U_by_frame(confs[::-1], params, boxes, pair_list_2)
+    assert n_traces == 1
+
+    np.testing.assert_allclose(U_2, U_1[::-1], rtol=1e-10)
+    vdW, electrostatics = nonbonded_on_precomputed_pairs(confs, params, boxes, pair_list_1, 2.0, cutoff)
+    np.testing.assert_allclose(U_1, pair_list_1.sum_by_frame(vdW + electrostatics), rtol=1e-10)
+
+
 def test_pairwise_distances_assertions():
     with pytest.raises(AssertionError):
         pairwise_distances(np.empty((4, 3)), np.empty((1, 1)))  # inconsistent box shape
@@ -184,6 +272,49 @@ def test_pairwise_distances_periodic_lifting(coords_box_w):
         assert dij.sum() > dij0.sum()
 
 
+@given(coords_box_w_triples(), st.integers(1, 8))
+@settings(max_examples=25)
+@seed(2022)
+def test_pairwise_distances_blocked(coords_box_w, block_size):
+    x, box_diag, w = coords_box_w
+    # allow for roundoff in periodic wrapping of large coordinates
+    atol = 1e-14 * (1.0 + np.abs(x).max() + np.abs(w).max())
+    for box in [None, np.diagflat(box_diag)]:
+        for w_ in [None, w]:
+            ref = pairwise_distances(x, box, w_)
+            dij = pairwise_distances_blocked(x, box, w_, block_size=block_size)
+            np.testing.assert_allclose(dij, ref, rtol=1e-12, atol=atol)
+
+
+def test_pairwise_sum_blocked():
+    rng = np.random.default_rng(2024)
+    n = 53
+    x = rng.uniform(0.0, 3.0, (n, 3))
+    box = 3.0 * np.eye(3)
+    w = rng.uniform(-0.5, 0.5, n)
+
+    def U_ref(x):
+        dij = pairwise_distances(x, box, w)
+        return jnp.sum(jnp.where(jnp.eye(n), 0.0, jnp.exp(-dij)))
+
+    def U_blocked(x, memory_budget):
+        def f_rows(row_idxs, dij):
+            return jnp.where(row_idxs[:, None] == jnp.arange(n)[None, :], 0.0, jnp.exp(-dij))
+
+        return pairwise_sum_blocked(f_rows, x, box, w, memory_budget=memory_budget)
+
+    # memory budget determines the number of rows per block, including blocks that require padding
+    assert pairwise_block_size(n, 3, x.dtype, memory_budget=1) == 1
+    assert pairwise_block_size(n, 3, x.dtype, memory_budget=10 * n * 7 * 8) == 10
+    assert pairwise_block_size(n, 3, x.dtype, memory_budget=2**40) == n
+
+    u_ref, du_dx_ref = value_and_grad(U_ref)(x)
+    for memory_budget in [1, 10 * n * 7 * 8, 2**40]:
+        u, du_dx = jit(value_and_grad(U_blocked), static_argnums=1)(x, memory_budget)
+        np.testing.assert_allclose(u, u_ref, rtol=1e-12)
+        np.testing.assert_allclose(du_dx, du_dx_ref, rtol=1e-10, atol=1e-12)
+
+
 def test_process_traj_in_chunks():
     """process_traj_in_chunks should be a drop-in replacement for vmap"""
 
@@ -205,3 +336,71 @@ def test_process_traj_in_chunks():
         actual = process_traj_in_chunks(f_snapshot, traj, boxes, chunk_size)
 
         np.testing.assert_array_equal(actual, reference)
+
+    # device arrays are processed without a host roundtrip, and can be traced
+    traj_device, boxes_device = jnp.asarray(traj), jnp.asarray(boxes)
+    for chunk_size in [(T // 7) + 1, T]:
+        actual = process_traj_in_chunks(f_snapshot, traj_device, boxes_device, chunk_size)
+        np.testing.assert_array_equal(actual, reference)
+
+        actual = jit(process_traj_in_chunks, static_argnums=(0, 3))(f_snapshot, traj, boxes, chunk_size)
+        np.testing.assert_allclose(actual, reference, rtol=1e-12)
+
+
+def test_process_traj_streaming(tmp_path):
+    """process_traj_streaming should agree with vmap for in-memory arrays, StoredArrays, and unsized iterables"""
+    from timemachine.fe.stored_arrays import StoredArrays
+
+    rng = np.random.default_rng(2023)
+    T, N = 1000, 50
+    traj = rng.normal(size=(T, N, 3))
+    boxes = rng.normal(size=(T, 3, 3))
+
+    def f_snapshot(x, box):
+        return jnp.array([jnp.sum(x**2), jnp.sum(box**3)])
+
+    reference = vmap(f_snapshot)(traj, boxes)
+
+    for chunk_size in [1, (T // 7) + 1, T]:
+        np.testing.assert_allclose(process_traj_streaming(f_snapshot, traj, boxes, chunk_size=chunk_size), reference)
+
+    stored_traj = StoredArrays.from_chunks([traj[i : i + 300] for i in range(0, T, 300)])
+    np.testing.assert_allclose(process_traj_streaming(f_snapshot, stored_traj, boxes, chunk_size=64), reference)
+
+    # unsized iterables: output is assembled from chunk results
+    frames = (x for x in traj)
+    np.testing.assert_allclose(process_traj_streaming(f_snapshot, frames, iter(boxes), chunk_size=64), reference)
+
+    # preallocated (memory-mapped) output
+    out = np.lib.format.open_memmap(tmp_path / "out.npy", mode="w+", dtype=np.float64, shape=(T, 2))
+    result = process_traj_streaming(f_snapshot, traj, boxes, chunk_size=64, out=out)
+    assert result is out
+    np.testing.assert_allclose(np.load(tmp_path / "out.npy"), reference)
+
+    # without boxes
+    np.testing.assert_allclose(
+        process_traj_streaming(lambda x, _: jnp.sum(x**2), traj, None, chunk_size=64), np.sum(traj**2, axis=(1, 2))
+    )
+
+    with pytest.raises(ValueError, match="empty trajectory"):
+        process_traj_streaming(f_snapshot, [], [])
+
+
+def test_process_traj_streaming_memory_budget():
+    """chunk size should be selected from the memory budget and the estimated per-frame footprint"""
+    rng = np.random.default_rng(2023)
+    T, N = 200, 100
+    traj = rng.normal(size=(T, N, 3))
+    boxes = np.array([np.eye(3) * 3.0] * T)
+
+    def f_snapshot(x, box):
+        return jnp.sum(pairwise_distances(x, box))
+
+    nbytes_per_frame = estimate_nbytes_per_frame(f_snapshot, traj[0], boxes[0])
+    # dominated by several (N, N) and (N, N, 3) intermediates
+    assert nbytes_per_frame >= N * N * 3 * traj.dtype.itemsize
+
+    reference = vmap(f_snapshot)(traj, boxes)
+    for memory_budget in [0, 10 * nbytes_per_frame, T * nbytes_per_frame]:
+        result = process_traj_streaming(f_snapshot, traj, boxes, memory_budget=memory_budget)
+        np.testing.assert_allclose(result, reference)
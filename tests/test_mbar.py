@@ -0,0 +1,89 @@
+import warnings
+
+import numpy as np
+import pymbar
+import pytest
+
+from timemachine.fe.mbar import BandedUkn, MBARConvergenceWarning, mbar_banded
+
+pytestmark = [pytest.mark.nocuda]
+
+
+def sample_u_kl_by_iter(n_states, n_iters, seed=2024):
+    """Reduced energies of harmonic oscillators with shifted centers and offsets, u_l(x) = (x - l)^2 / 2 / sigma^2 + l"""
+    rng = np.random.default_rng(seed)
+    sigma = 0.6
+    x_by_iter = np.arange(n_states)[None, :] + sigma * rng.normal(size=(n_iters, n_states))
+    states = np.arange(n_states)
+    return (x_by_iter[:, :, None] - states[None, None, :]) ** 2 / (2 * sigma**2) + states
+
+
+@pytest.mark.parametrize("max_delta_states", [None, 1, 3])
+def test_mbar_banded(max_delta_states):
+    n_states, n_iters = 8, 100
+    u_kl_by_iter = sample_u_kl_by_iter(n_states, n_iters)
+    if max_delta_states is not None:
+        # energies outside of the band are not computed, as in HREX with max_delta_states
+        states = np.arange(n_states)
+        u_kl_by_iter[:, np.abs(states[:, None] - states[None, :]) > max_delta_states] = np.inf
+
+    banded_u_kn = BandedUkn(n_states, max_delta_states)
+    for u_kl in u_kl_by_iter:
+        banded_u_kn.append(u_kl)
+
+    band_width = 2 * banded_u_kn.max_delta_states + 1
+    assert banded_u_kn.u_band.shape == (n_states * n_iters, band_width)
+    np.testing.assert_array_equal(banded_u_kn.N_k, n_iters)
+
+    f_k, df_ij = mbar_banded(banded_u_kn)
+    assert df_ij is not None
+
+    # equivalent to pymbar with the dense u_kn, with infinite energies outside of the band
+    u_kn = banded_u_kn.to_u_kn()
+    np.testing.assert_array_equal(u_kn, np.concatenate(u_kl_by_iter).T)
+    mbar = pymbar.MBAR(u_kn, banded_u_kn.N_k, relative_tolerance=1e-12)
+    results = mbar.compute_free_energy_differences()
+    np.testing.assert_allclose(f_k, results["Delta_f"][0], atol=1e-8)
+    np.testing.assert_allclose(df_ij, results["dDelta_f"], atol=1e-8)
+
+    # warm start from the solution
+    f_k_warm, df_ij_warm = mbar_banded(banded_u_kn, initial_f_k=f_k + 1.0, compute_uncertainty=False)
+    np.testing.assert_allclose(f_k_warm, f_k, atol=1e-8)
+    assert df_ij_warm is None
+
+
+def test_mbar_banded_state_idxs():
+    n_states = 4
+    u_kl_by_iter = sample_u_kl_by_iter(n_states, 20)
+
+    banded_u_kn = BandedUkn(n_states)
+    for u_kl in u_kl_by_iter:
+        # samples in arbitrary order
+        perm = np.random.default_rng(2024).permutation(n_states)
+        banded_u_kn.append(u_kl[perm], perm)
+
+    ref = BandedUkn(n_states)
+    for u_kl in u_kl_by_iter:
+        ref.append(u_kl)
+
+    np.testing.assert_allclose(mbar_banded(banded_u_kn)[0], mbar_banded(ref)[0], atol=1e-10)
+
+    empty = BandedUkn(n_states)
+    empty.append(u_kl_by_iter[0][:2], np.array([0, 1]))
+    with pytest.raises(AssertionError, match="at least one sample"):
+        mbar_banded(empty)
+
+
+def test_mbar_banded_warns_if_not_converged():
+    n_states = 4
+    banded_u_kn = BandedUkn(n_states)
+    for u_kl in sample_u_kl_by_iter(n_states, 20):
+        banded_u_kn.append(u_kl)
+
+    with pytest.warns(MBARConvergenceWarning, match="did not converge in 1 iterations"):
+        f_k, _ = mbar_banded(banded_u_kn, maximum_iterations=1, compute_uncertainty=False)
+    assert np.all(np.isfinite(f_k))
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", MBARConvergenceWarning)
+        mbar_banded(banded_u_kn, compute_uncertainty=False)
@@ -40,3 +40,217 @@ def test_get_bound_potential_by_type():
     bonded = get_bound_potential_by_type(bps, HarmonicBond)
     assert isinstance(bonded, BoundPotential)
     assert isinstance(bonded.potential, HarmonicBond)
+
+
+def make_shared_geometry_potentials(n_atoms, rng):
+    """random instances of each SharedGeometryPotential, with a batch of 3 parameter sets for each"""
+    from timemachine.potentials import ChiralAtomRestraint, NonbondedPairListPrecomputed, PeriodicTorsion
+
+    def random_idxs(n, k):
+        return np.array([rng.choice(n_atoms, k, replace=False) for _ in range(n)], dtype=np.int32)
+
+    n_params = 3
+    pots_and_params = [
+        (HarmonicBond(random_idxs(10, 2)), rng.uniform(0.5, 1.5, (n_params, 10, 2))),
+        (HarmonicAngle(random_idxs(8, 3)), rng.uniform(0.0, 1.5, (n_params, 8, 3))),
+        (PeriodicTorsion(random_idxs(6, 4)), rng.uniform(0.5, 2.0, (n_params, 6, 3))),
+        (ChiralAtomRestraint(random_idxs(4, 4)), rng.uniform(100.0, 1000.0, (n_params, 4))),
+        (
+            NonbondedPairListPrecomputed(random_idxs(12, 2), beta=2.0, cutoff=1.2),
+            rng.uniform(0.1, 0.5, (n_params, 12, 4)),
+        ),
+    ]
+    return pots_and_params
+
+
+def test_call_batch_shared_geometry():
+    """call_batch and call_batch_sparse should agree with evaluating __call__ on each (frame, params) combination"""
+    import jax
+
+    from timemachine.potentials import SharedGeometryPotential
+
+    rng = np.random.default_rng(2024)
+    n_frames, n_atoms = 5, 20
+    confs = rng.uniform(0, 2.0, (n_frames, n_atoms, 3))
+    boxes = np.array([np.eye(3) * 2.0] * n_frames)
+
+    for pot, params in make_shared_geometry_potentials(n_atoms, rng):
+        assert isinstance(pot, SharedGeometryPotential)
+        U_ref = np.array([[pot(conf, ps, box) for ps in params] for conf, box in zip(confs, boxes)])
+
+        U = jax.jit(pot.call_batch)(confs, params, boxes)
+        assert U.shape == (n_frames, len(params))
+        np.testing.assert_allclose(U, U_ref, rtol=1e-12)
+
+        # generic implementation without shared geometry
+        np.testing.assert_allclose(Potential.call_batch(pot, confs, params, boxes), U_ref, rtol=1e-12)
+
+        coords_batch_idxs = np.array([0, 4, 4, 2, 1, 0])
+        params_batch_idxs = np.array([2, 0, 1, 1, 0, 2])
+        U_sparse = jax.jit(pot.call_batch_sparse)(confs, params, boxes, coords_batch_idxs, params_batch_idxs)
+        np.testing.assert_allclose(U_sparse, U_ref[coords_batch_idxs, params_batch_idxs], rtol=1e-12)
+
+        # energies only path of the CPU implementation
+        _, _, U_cpu = pot.to_cpu().unbound_impl.execute_batch(confs, params, boxes, False, False, True)
+        np.testing.assert_allclose(U_cpu, U_ref, rtol=1e-12)
+
+        # shared geometry is parameter-independent and computed per frame
+        geometries = jax.vmap(pot.geometry)(confs, boxes)
+        for leaf in jax.tree_util.tree_leaves(geometries):
+            assert leaf.shape[0] == n_frames
+
+
+def test_call_batch_generic():
+    """potentials without shared geometry fall back to vmap over __call__"""
+    from timemachine.potentials import FlatBottomBond
+
+    rng = np.random.default_rng(2025)
+    confs = rng.uniform(0, 2.0, (4, 10, 3))
+    boxes = np.array([np.eye(3) * 2.0] * 4)
+    pot = FlatBottomBond(np.array([[0, 1], [2, 3], [4, 5]], dtype=np.int32))
+    params = rng.uniform(0.1, 1.0, (2, 3, 3))
+
+    U_ref = np.array([[pot(conf, ps, box) for ps in params] for conf, box in zip(confs, boxes)])
+    np.testing.assert_allclose(pot.call_batch(confs, params, boxes), U_ref, rtol=1e-12)
+    np.testing.assert_allclose(
+        pot.call_batch_sparse(confs, params, boxes, np.array([3, 0]), np.array([1, 1])),
+        U_ref[[3, 0], [1, 1]],
+        rtol=1e-12,
+    )
+
+
+def make_nonbonded_summed_potential(n_atoms, rng, dense):
+    """SummedPotential over a mix of bonded and nonbonded terms, with random parameters"""
+    from timemachine.potentials import (
+        Nonbonded,
+        NonbondedInteractionGroup,
+        NonbondedPairList,
+        NonbondedPairListPrecomputed,
+        SummedPotential,
+    )
+
+    def random_pairs(n):
+        return np.unique(np.sort(rng.choice(n_atoms, (n, 2), replace=True), axis=1), axis=0).astype(np.int32)
+
+    def nonbonded_params():
+        return np.stack(
+            [
+                rng.normal(0, 0.3, n_atoms),
+                rng.uniform(0.05, 0.1, n_atoms),
+                rng.uniform(0.1, 1.0, n_atoms),
+                rng.uniform(0.0, 0.3, n_atoms),
+            ]
+        ).T
+
+    pairs = random_pairs(30)
+    pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+    ligand_idxs = np.arange(n_atoms - 6, n_atoms, dtype=np.int32)
+    pots_and_params = [
+        (HarmonicBond(pairs[:10]), rng.uniform(0.5, 1.5, (10, 2))),
+        (HarmonicAngle(np.array([[0, 1, 2], [3, 4, 5]], dtype=np.int32)), rng.uniform(0.0, 1.5, (2, 3))),
+        (NonbondedPairList(pairs, rng.uniform(0, 1, (len(pairs), 2)), 2.0, 1.2), nonbonded_params()),
+        (NonbondedPairListPrecomputed(pairs[5:], 2.0, 1.2), rng.uniform(0.1, 0.5, (len(pairs) - 5, 4))),
+        (NonbondedInteractionGroup(n_atoms, ligand_idxs, 2.0, 1.2), nonbonded_params()),
+    ]
+    if dense:
+        atom_idxs = np.arange(n_atoms - 6, dtype=np.int32)
+        nonbonded = Nonbonded(n_atoms, pairs, rng.uniform(0, 1, (len(pairs), 2)), 2.0, 1.2, atom_idxs=atom_idxs)
+        pots_and_params.append((nonbonded, nonbonded_params()))
+
+    potentials, params = zip(*pots_and_params)
+    return SummedPotential(list(potentials), list(params))
+
+
+@pytest.mark.parametrize("dense", [True, False])
+@pytest.mark.parametrize("periodic", [True, False])
+def test_fused_summed_potential(dense, periodic):
+    """fused evaluation shares pairwise distances between terms, and should agree with the term-by-term sum"""
+    import jax
+
+    from timemachine.potentials import SummedPotential
+
+    rng = np.random.default_rng(2024)
+    n_atoms = 40
+    summed_pot = make_nonbonded_summed_potential(n_atoms, rng, dense)
+    conf = rng.uniform(0, 2.0, (n_atoms, 3))
+    box = np.eye(3) * 2.0 if periodic else None
+    params = summed_pot.bind_params_list(summed_pot.params_init).params
+
+    U_ref, (du_dx_ref, du_dp_ref) = jax.value_and_grad(summed_pot, (0, 1))(conf, params, box)
+
+    fused_fxn = summed_pot.get_fused_fxn(argnums=(0, 1))
+    U, (du_dx, du_dp) = fused_fxn(conf, params, box)
+    np.testing.assert_allclose(U, U_ref, rtol=1e-10)
+    np.testing.assert_allclose(du_dx, du_dx_ref, rtol=1e-8, atol=1e-8)
+    np.testing.assert_allclose(du_dp, du_dp_ref, rtol=1e-8, atol=1e-8)
+
+    fused_pot = SummedPotential(summed_pot.potentials, summed_pot.params_init, fused=True)
+    np.testing.assert_allclose(fused_pot(conf, params, box), U_ref, rtol=1e-10)
+    if periodic:
+        _, _, U_cpu = fused_pot.to_cpu().unbound_impl.execute(conf, params, box, False, False, True)
+        np.testing.assert_allclose(U_cpu, U_ref, rtol=1e-10)
+
+    # compiled functions are shared between potentials with the same structure, independent of parameters
+    params_init = [ps + 1.0 for ps in summed_pot.params_init]
+    assert SummedPotential(summed_pot.potentials, params_init).get_fused_fxn((0, 1)) is fused_fxn
+    assert summed_pot.get_fused_fxn() is not fused_fxn
+    assert make_nonbonded_summed_potential(n_atoms, rng, dense).get_fused_fxn((0, 1)) is not fused_fxn
+
+
+def test_fused_fanout_summed_potential():
+    """Nonbonded decomposed into all pairs and exclusions, sharing the dense distance table"""
+    import jax
+
+    from timemachine.potentials import FanoutSummedPotential, Nonbonded, NonbondedAllPairs, NonbondedExclusions
+
+    rng = np.random.default_rng(2025)
+    n_atoms = 30
+    conf = rng.uniform(0, 2.0, (n_atoms, 3))
+    box = np.eye(3) * 2.0
+    params = np.stack(
+        [
+            rng.normal(0, 0.3, n_atoms),
+            rng.uniform(0.05, 0.1, n_atoms),
+            rng.uniform(0.1, 1.0, n_atoms),
+            np.zeros(n_atoms),
+        ]
+    ).T
+    exclusion_idxs = np.array([[i, i + 1] for i in range(0, n_atoms - 1, 2)], dtype=np.int32)
+    scale_factors = rng.uniform(0, 1, (len(exclusion_idxs), 2))
+
+    nonbonded = Nonbonded(n_atoms, exclusion_idxs, scale_factors, 2.0, 1.2)
+    fanout = FanoutSummedPotential(
+        [NonbondedAllPairs(n_atoms, 2.0, 1.2), NonbondedExclusions(exclusion_idxs, scale_factors, 2.0, 1.2)]
+    )
+
+    U_ref, du_dx_ref = jax.value_and_grad(nonbonded)(conf, params, box)
+    U, (du_dx,) = fanout.get_fused_fxn(argnums=(0,))(conf, params, box)
+    np.testing.assert_allclose(U, U_ref, rtol=1e-10)
+    np.testing.assert_allclose(du_dx, du_dx_ref, rtol=1e-8, atol=1e-8)
+    np.testing.assert_allclose(
+        FanoutSummedPotential(fanout.potentials, fused=True)(conf, params, box), U_ref, rtol=1e-10
+    )
+
+
+def test_pair_geometry():
+    from timemachine.potentials.jax_utils import PairGeometry, delta_r, pairwise_distances2
+
+    rng = np.random.default_rng(2026)
+    conf = rng.uniform(0, 2.0, (10, 3))
+    box = np.eye(3) * 1.5
+    pairs = np.array([[0, 1], [5, 2], [2, 5], [9, 3]], dtype=np.int32)
+    d2_ref = np.sum(delta_r(conf[pairs[:, 0]], conf[pairs[:, 1]], box) ** 2, axis=-1)
+
+    sparse = PairGeometry(conf, box, pairs[:3])
+    assert not sparse.is_dense
+    np.testing.assert_array_equal(sparse.distances2(pairs[:3]), d2_ref[:3])
+    with pytest.raises(ValueError, match="not included in the geometry"):
+        sparse.distances2(pairs)
+    with pytest.raises(ValueError, match="dense geometry"):
+        sparse.pairwise_distances2()
+
+    dense = PairGeometry(conf, box)
+    assert dense.is_dense
+    np.testing.assert_array_equal(dense.distances2(pairs), d2_ref)
+    np.testing.assert_array_equal(dense.pairwise_distances2(), pairwise_distances2(conf, box))
+    np.testing.assert_array_equal(dense.pairwise_distances2(np.array([3, 7])), pairwise_distances2(conf[[3, 7]], box))
@@ -1,12 +1,13 @@
 import numpy as np
 import pymbar
 import pytest
-from jax import grad, jit, value_and_grad, vmap
+from jax import grad, jit, make_jaxpr, value_and_grad, vmap
 from jax import numpy as jnp
 
 from timemachine.constants import BOLTZ
 from timemachine.fe.bar import DEFAULT_SOLVER_PROTOCOL, DG_KEY
 from timemachine.fe.reweighting import (
+    chunked_one_sided_exp,
     construct_endpoint_reweighting_estimator,
     construct_mixture_reweighting_estimator,
     interpret_as_mixture_potential,
@@ -162,6 +163,84 @@ def test_mixture_reweighting_1d():
         assert_estimator_accurate(estimate_delta_f, analytical_delta_f, ref_params, n_random_trials=10, atol=atol)
 
 
+@pytest.mark.parametrize("chunk_size", [1, 7, 100, 1000])
+def test_chunked_reweighting_1d(chunk_size):
+    """assert that chunked variants of the reweighting estimators agree with the unchunked versions, including
+    gradients, when the chunk size does not evenly divide the number of samples"""
+    np.random.seed(2022)
+
+    u_fxn, _, sample, reduced_free_energy = make_gaussian_testsystem()
+    ref_params = np.ones(2)
+    ref_delta_f = reduced_free_energy(1.0, ref_params) - reduced_free_energy(0.0, ref_params)
+    trial_params = jnp.array([1.3, 0.6])
+
+    n_samples = 250
+    samples_0 = sample(0, ref_params, n_samples)
+    samples_1 = sample(1, ref_params, n_samples)
+
+    vec_u = vmap(u_fxn, in_axes=(0, None, None))
+    vec_u_0_fxn = lambda xs, params: vec_u(xs, 0, params)
+    vec_u_1_fxn = lambda xs, params: vec_u(xs, 1, params)
+
+    def assert_chunked_consistent(construct_estimator, *args):
+        v, g = value_and_grad(construct_estimator(*args))(trial_params)
+        estimate_delta_f_chunked = construct_estimator(*args, chunk_size=chunk_size)
+        v_chunked, g_chunked = value_and_grad(estimate_delta_f_chunked)(trial_params)
+        np.testing.assert_allclose(v_chunked, v, rtol=1e-10)
+        np.testing.assert_allclose(g_chunked, g, rtol=1e-10)
+
+        # under jit, chunks are processed by a loop rather than unrolled
+        v_jit, g_jit = jit(value_and_grad(estimate_delta_f_chunked))(trial_params)
+        np.testing.assert_allclose(v_jit, v, rtol=1e-10)
+        np.testing.assert_allclose(g_jit, g, rtol=1e-10)
+        n_eqns = len(make_jaxpr(value_and_grad(estimate_delta_f_chunked))(trial_params).eqns)
+        n_eqns_one_chunk = len(
+            make_jaxpr(value_and_grad(construct_estimator(*args, chunk_size=2 * n_samples)))(trial_params).eqns
+        )
+        assert n_eqns == n_eqns_one_chunk
+
+    assert_chunked_consistent(
+        construct_endpoint_reweighting_estimator,
+        samples_0,
+        samples_1,
+        vec_u_0_fxn,
+        vec_u_1_fxn,
+        ref_params,
+        ref_delta_f,
+    )
+
+    xs = np.concatenate([samples_0, samples_1])
+    N_k = [n_samples, n_samples]
+    u_kn = np.stack([vec_u(xs, 0.0, ref_params), vec_u(xs, 1.0, ref_params)])
+    f_k = jnp.array([0.0, ref_delta_f])
+
+    mixture_u_n = interpret_as_mixture_potential(u_kn, f_k, N_k)
+    np.testing.assert_allclose(interpret_as_mixture_potential(u_kn, f_k, N_k, chunk_size), mixture_u_n, rtol=1e-12)
+
+    # gradients w.r.t. f_k are unaffected by chunking
+    def mixture_u_sum(f_k, chunk_size=None):
+        return jnp.sum(interpret_as_mixture_potential(u_kn, f_k, N_k, chunk_size))
+
+    np.testing.assert_allclose(grad(mixture_u_sum)(f_k, chunk_size), grad(mixture_u_sum)(f_k), rtol=1e-10)
+
+    assert_chunked_consistent(construct_mixture_reweighting_estimator, xs, mixture_u_n, vec_u_0_fxn, vec_u_1_fxn)
+
+    # on-device u_kn is processed with lax.map, and can be traced
+    np.testing.assert_allclose(
+        jit(lambda u_kn, f_k: interpret_as_mixture_potential(u_kn, f_k, N_k, chunk_size))(jnp.asarray(u_kn), f_k),
+        mixture_u_n,
+        rtol=1e-12,
+    )
+
+    # running logsumexp over chunks is stable for large reduced works
+    delta_us = 1e3 * np.random.randn(n_samples)
+    np.testing.assert_allclose(
+        chunked_one_sided_exp(lambda _, delta_us_chunk: delta_us_chunk, None, delta_us, chunk_size),
+        one_sided_exp(delta_us),
+        rtol=1e-12,
+    )
+
+
 def _make_fake_sample_batch(conf, box, ligand_indices, n_snapshots=25):
     """PURELY FOR TESTING -- get arrays that look like a batch of confs, boxes
     (but instead of actually populating confs, boxes with valid samples
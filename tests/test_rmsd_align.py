@@ -3,6 +3,7 @@ import numpy as np
 import pytest
 from scipy.stats import ortho_group, special_ortho_group
 
+from timemachine.fe.stored_arrays import StoredArrays
 from timemachine.lib import custom_ops
 from timemachine.potentials import rmsd
 
@@ -85,3 +86,61 @@ def test_rmsd_align_improper():
         assert np.linalg.norm(x2_aligned_test - x1) < initial_rmsd
 
         np.testing.assert_almost_equal(x2_aligned_reference, x2_aligned_test)
+
+
+@pytest.mark.parametrize("chunk_size", [7, 100])
+def test_align_trajectory(chunk_size):
+    """Assert that batched alignment of a trajectory (including one backed by StoredArrays) agrees with the
+    reference `rmsd.align_x2_unto_x1`, applied frame by frame"""
+    N, T = 25, 50
+    rng = np.random.default_rng(2024)
+
+    x_ref = rng.random((N, 3))
+    random_Rs = special_ortho_group.rvs(3, size=T, random_state=2024)
+    random_ts = rng.random((T, 3))
+    xs = np.einsum("nk,tkl->tnl", x_ref, random_Rs) + random_ts[:, None] + 0.01 * rng.normal(size=(T, N, 3))
+
+    for traj in [xs, StoredArrays.from_chunks([xs[:20], xs[20:]])]:
+        alignment = rmsd.align_trajectory(x_ref, traj, chunk_size=chunk_size)
+        assert alignment.rmsds.shape == (T,)
+        assert alignment.rotations.shape == (T, 3, 3)
+        assert alignment.translations.shape == (T, 3)
+
+        aligned_ref = np.array([rmsd.align_x2_unto_x1(x_ref, x) for x in xs])
+        aligned = rmsd.apply_alignment(xs, alignment.rotations, alignment.translations)
+        np.testing.assert_allclose(aligned, aligned_ref, atol=1e-10)
+        np.testing.assert_allclose(alignment.rmsds, np.sqrt(np.mean(np.sum((aligned_ref - x_ref) ** 2, -1), -1)))
+        np.testing.assert_allclose(np.linalg.det(alignment.rotations), 1.0)
+
+    # alignment on a subset of atoms
+    atom_idxs = np.arange(5, 15)
+    alignment = rmsd.align_trajectory(x_ref, xs, atom_idxs=atom_idxs)
+    alignment_ref = rmsd.align_trajectory(x_ref[atom_idxs], xs[:, atom_idxs])
+    for a, b in zip(alignment, alignment_ref):
+        np.testing.assert_allclose(a, b)
+
+    # selection is applied to the reference even if the number of selected atoms equals the number of atoms
+    permutation = rng.permutation(N)
+    alignment = rmsd.align_trajectory(x_ref, xs, atom_idxs=permutation)
+    alignment_ref = rmsd.align_trajectory(x_ref[permutation], xs[:, permutation])
+    for a, b in zip(alignment, alignment_ref):
+        np.testing.assert_allclose(a, b)
+
+    with pytest.raises(AssertionError, match="does not match reference shape"):
+        rmsd.align_trajectory(x_ref[atom_idxs], xs, atom_idxs=atom_idxs)
+
+
+def test_align_all_pairs():
+    K, N = 12, 20
+    rng = np.random.default_rng(2024)
+    xs = rng.random((K, N, 3))
+
+    alignment = rmsd.align_all_pairs(xs)
+    assert alignment.rmsds.shape == (K, K)
+    np.testing.assert_allclose(alignment.rmsds, alignment.rmsds.T, atol=1e-12)
+    np.testing.assert_allclose(np.diag(alignment.rmsds), 0.0, atol=1e-6)
+
+    for i in range(K):
+        alignment_i = rmsd.align_trajectory(xs[i], xs)
+        for a, b in zip(alignment, alignment_i):
+            np.testing.assert_allclose(a[i], b, atol=1e-12)
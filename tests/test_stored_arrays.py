@@ -3,7 +3,9 @@ import pickle
 import tempfile
 import weakref
 from contextlib import contextmanager
+from functools import partial
 from pathlib import Path
+from unittest.mock import patch
 
 import numpy as np
 import pytest
@@ -11,6 +13,7 @@ from hypothesis import assume, example, given, seed
 from hypothesis.extra.numpy import array_shapes, arrays, floating_dtypes, from_dtype
 from hypothesis.strategies import composite, integers, lists
 
+from timemachine.fe.chunk_codecs import QuantizeCodec, ShuffleCompressCodec
 from timemachine.fe.stored_arrays import StoredArrays
 from timemachine.parallel.client import FileClient
 
@@ -59,6 +62,74 @@ def test_stored_arrays_getitem(chunks_index):
     np.testing.assert_array_equal(sa[ix], ref[ix])
 
 
+@given(lists_of_chunks_with_index(), integers(-5, 5), integers(-5, 5), integers(1, 3))
+@seed(2023)
+def test_stored_arrays_getitem_slice(chunks_index, start_offset, stop_offset, step):
+    chunks, ix = chunks_index
+    sa = stored_arrays_from_chunks(chunks)
+    ref = np.array([arr for chunk in chunks for arr in chunk])
+    for key in [slice(ix, ix + stop_offset), slice(start_offset, None, step), slice(None, stop_offset, -step)]:
+        np.testing.assert_array_equal(sa[key], ref[key])
+        assert sa[key].shape == ref[key].shape
+
+
+@given(lists_of_chunks_with_index(), lists(integers(0, 100)))
+@seed(2023)
+def test_stored_arrays_getitem_fancy(chunks_index, raw_idxs):
+    chunks, _ = chunks_index
+    sa = stored_arrays_from_chunks(chunks)
+    ref = np.array([arr for chunk in chunks for arr in chunk])
+    n = len(ref)
+
+    idxs = [i % (2 * n) - n for i in raw_idxs]  # negative and nonnegative indices, in arbitrary order
+    np.testing.assert_array_equal(sa[idxs], ref[idxs])
+    np.testing.assert_array_equal(sa[np.array(idxs, dtype=int)], ref[np.array(idxs, dtype=int)])
+
+    mask = np.arange(n) % 2 == 0
+    np.testing.assert_array_equal(sa[mask], ref[mask])
+    np.testing.assert_array_equal(sa[list(mask)], ref[mask])
+
+    with pytest.raises(IndexError):
+        sa[[n]]
+    with pytest.raises(IndexError):
+        sa[mask[:-1]]
+
+
+@given(lists(chunks()).map(stored_arrays_from_chunks))
+@seed(2023)
+def test_stored_arrays_array(sa):
+    try:
+        ref = np.array(list(sa))
+    except ValueError:
+        assume(False)  # chunks with incompatible shapes
+    if len(sa) == 0:
+        assume(False)  # np.array([]) has float dtype, while empty chunks may have any dtype
+
+    np.testing.assert_array_equal(np.asarray(sa), ref)
+    np.testing.assert_array_equal(np.array(sa), ref)
+    assert np.asarray(sa).shape == ref.shape
+    assert np.asarray(sa).dtype == ref.dtype
+
+
+def test_stored_arrays_array_view():
+    sa = stored_arrays_from_chunks([[], np.arange(6).reshape(2, 3)])
+
+    # single nonempty chunk: read-only memory-mapped view
+    view = np.asarray(sa)
+    assert not view.flags.writeable
+    np.testing.assert_array_equal(view, np.arange(6).reshape(2, 3))
+
+    copy = np.array(sa)
+    assert copy.flags.writeable
+    copy[0, 0] = -1
+    assert sa[0][0] == 0
+
+    sa.extend(np.arange(6, 9).reshape(1, 3))
+    np.testing.assert_array_equal(np.asarray(sa), np.arange(9).reshape(3, 3))
+    with pytest.raises(ValueError, match="multiple chunks"):
+        np.asarray(sa, copy=False)
+
+
 @pytest.mark.parametrize(
     "ctor",
     [
@@ -146,3 +217,183 @@ def test_stored_arrays_store_raises_on_file_collision():
 def test_stored_arrays_pickle_roundtrip(sa_ref):
     sa_test = pickle.loads(pickle.dumps(sa_ref))
     assert sa_ref == sa_test
+
+
+@pytest.mark.parametrize("codec", [ShuffleCompressCodec(), ShuffleCompressCodec("lzma"), QuantizeCodec(1e3)])
+def test_stored_arrays_codec(codec):
+    rng = np.random.default_rng(2024)
+    chunks = [rng.uniform(size=(n, 10, 3)) for n in [3, 0, 5]]
+    sa_raw = stored_arrays_from_chunks(chunks)
+    sa = StoredArrays.from_chunks(chunks, codec=codec)
+    assert sa.codec == codec
+    assert len(sa) == len(sa_raw)
+
+    lossless = isinstance(codec, ShuffleCompressCodec)
+    assert_equal = np.testing.assert_array_equal if lossless else partial(np.testing.assert_allclose, atol=5e-4)
+    assert (sa == sa_raw) == lossless
+
+    # reading is transparent
+    assert_equal(np.array(list(sa)), np.array(list(sa_raw)))
+    assert_equal(sa[4], sa_raw[4])
+    assert_equal(sa[1:7:2], sa_raw[1:7:2])
+    assert_equal(np.asarray(sa), np.asarray(sa_raw))
+
+    # pickling and store/load preserve the encoded values
+    sa_pickled = pickle.loads(pickle.dumps(sa))
+    assert sa_pickled.codec == codec
+    assert sa_pickled == sa
+
+    with file_client() as fc:
+        sa.store(fc)
+        sa_raw.store(fc, prefix=Path("raw"))
+        assert fc.exists("0.npc") and not fc.exists("0.npy")
+        assert sa_pickled == StoredArrays.load(fc)
+        assert StoredArrays.load(fc).codec is None
+        assert StoredArrays.load(fc, codec=codec) == sa
+        assert StoredArrays.load(fc, prefix=Path("raw"), codec=codec) == sa
+
+
+@pytest.mark.parametrize("max_pending_writes", [1, 3])
+@given(lists(chunks()))
+@seed(2023)
+def test_stored_arrays_write_behind(max_pending_writes, chunks):
+    sa_ref = stored_arrays_from_chunks(chunks)
+    sa = StoredArrays(max_pending_writes=max_pending_writes)
+    for chunk in chunks:
+        sa.extend(chunk)
+        assert len(sa._pending_writes) <= max_pending_writes
+    assert len(sa) == len(sa_ref)
+    assert sa == sa_ref
+    assert not sa._pending_writes
+
+    with file_client() as fc:
+        sa.store(fc)
+        assert StoredArrays.load(fc) == sa_ref
+
+
+def test_stored_arrays_write_behind_copies_input():
+    sa = StoredArrays(max_pending_writes=2)
+    x = np.zeros((2, 3))
+    sa.extend(x)
+    x[:] = 1.0
+    np.testing.assert_array_equal(np.asarray(sa), np.zeros((2, 3)))
+
+
+def test_stored_arrays_write_behind_error():
+    sa = StoredArrays(max_pending_writes=2)
+    sa.extend([np.array([1, 2, 3])])
+
+    with patch("timemachine.fe.stored_arrays._write_chunk", side_effect=OSError("disk full")):
+        sa.extend([np.array([4, 5, 6])])  # returns before the write fails
+        sa._pending_writes[-1].exception()  # wait for the write to fail
+
+    # error is raised by the next call, and by subsequent calls
+    with pytest.raises(RuntimeError, match="failed to write chunk") as e:
+        sa.extend([np.array([7, 8, 9])])
+    assert isinstance(e.value.__cause__, OSError)
+    with pytest.raises(RuntimeError, match="failed to write chunk"):
+        len(sa)
+    with pytest.raises(RuntimeError, match="failed to write chunk"):
+        list(sa)
+
+
+def test_stored_arrays_write_behind_cleanup():
+    sa = StoredArrays(max_pending_writes=2)
+    sa.extend([np.array([1, 2, 3])])
+    path = sa._path()
+    sa.flush()
+    assert path.exists()
+
+    del sa
+    gc.collect()
+    assert not path.exists()
+
+
+@pytest.mark.parametrize("max_pending_writes", [0, 2])
+@given(lists_of_chunks_with_index())
+@seed(2023)
+def test_stored_arrays_packed(max_pending_writes, chunks_index):
+    chunks, ix = chunks_index
+    sa_ref = stored_arrays_from_chunks(chunks)
+    sa = StoredArrays(max_pending_writes=max_pending_writes, packed=True)
+    for chunk in chunks:
+        sa.extend(chunk)
+    assert sa.packed
+    assert sa == sa_ref
+    assert [path.name for path in sa._path().iterdir()] == ["chunks.pack"]
+
+    np.testing.assert_array_equal(sa[ix], sa_ref[ix])
+    np.testing.assert_array_equal(sa[::2], sa_ref[::2])
+    np.testing.assert_array_equal(np.asarray(sa), np.asarray(sa_ref))
+
+    sa_pickled = pickle.loads(pickle.dumps(sa))
+    assert sa_pickled.packed
+    assert sa_pickled == sa
+
+    with file_client() as fc:
+        sa.store(fc)
+        assert [path.name for path in fc.base.iterdir()] == ["chunks.pack"]
+        sa_loaded = StoredArrays.load(fc)
+    assert sa_loaded.packed
+    assert sa_loaded == sa_ref
+
+    # can extend after store and load
+    sa_loaded.extend(chunks[0])
+    assert len(sa_loaded) == len(sa_ref) + len(chunks[0])
+
+
+def test_stored_arrays_packed_mmap():
+    sa = StoredArrays(packed=True)
+    sa.extend(np.arange(6).reshape(2, 3))
+    view = np.asarray(sa)
+    assert not view.flags.writeable
+    np.testing.assert_array_equal(view, np.arange(6).reshape(2, 3))
+
+    sa.extend(np.asfortranarray(np.arange(6, 12).reshape(2, 3)))
+    sa.extend(np.zeros((0, 3), dtype=int))
+    np.testing.assert_array_equal(np.asarray(sa), np.arange(12).reshape(4, 3))
+    assert isinstance(sa._load_chunk(1, mmap_mode="r"), np.memmap)
+
+
+def test_stored_arrays_packed_store_load_single_transfer():
+    sa = StoredArrays.from_chunks([[np.array([1, 2, 3])] for _ in range(10)], packed=True)
+    with file_client() as fc:
+        with patch.object(fc, "store_stream", wraps=fc.store_stream) as store_stream:
+            sa.store(fc)
+        assert store_stream.call_count == 1
+
+        with patch.object(fc, "load", wraps=fc.load) as load, patch.object(fc, "exists", wraps=fc.exists) as exists:
+            assert StoredArrays.load(fc) == sa
+        assert load.call_count == 1
+        assert exists.call_count == 1
+
+        with pytest.raises(FileExistsError):
+            sa.store(fc)
+
+    # local data are unchanged by store
+    assert len(sa) == 10
+    sa.extend([np.array([4, 5, 6])])
+    np.testing.assert_array_equal(sa[-2:], [[1, 2, 3], [4, 5, 6]])
+
+
+@pytest.mark.parametrize("codec", [ShuffleCompressCodec(), QuantizeCodec(1e3)])
+def test_stored_arrays_packed_codec(codec):
+    rng = np.random.default_rng(2024)
+    chunks = [rng.uniform(size=(n, 10, 3)).astype(np.float32) for n in [3, 0, 5]]
+    sa_files = StoredArrays.from_chunks(chunks, codec=codec)
+    sa = StoredArrays.from_chunks(chunks, codec=codec, packed=True)
+    assert sa == sa_files
+    np.testing.assert_array_equal(sa[1:7:2], sa_files[1:7:2])
+
+    with file_client() as fc:
+        sa.store(fc)
+        # encoded chunks are loaded without re-encoding, regardless of codec
+        assert StoredArrays.load(fc) == sa
+        assert StoredArrays.load(fc, codec=codec).codec == codec
+
+
+def test_stored_arrays_packed_load_invalid():
+    with file_client() as fc:
+        fc.store("chunks.pack", b"not a packed container")
+        with pytest.raises(ValueError, match="not a packed container"):
+            StoredArrays.load(fc)
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from timemachine.fe.bar import df_and_err_from_u_kln, df_err_and_overlap_from_u_kln_batch, pair_overlap_from_ukln
+from timemachine.fe.streaming_bar import StreamingPairBar
+
+pytestmark = [pytest.mark.nocuda]
+
+
+def sample_u_kl_by_iter(n_states, n_iters, seed=2024):
+    """Reduced energies of harmonic oscillators with shifted centers, u_l(x) = (x - l)^2 / 2 / sigma^2"""
+    rng = np.random.default_rng(seed)
+    sigma = 0.7
+    x_by_iter = np.arange(n_states)[None, :] + sigma * rng.normal(size=(n_iters, n_states))
+    u_kl_by_iter = (x_by_iter[:, :, None] - np.arange(n_states)[None, None, :]) ** 2 / (2 * sigma**2)
+
+    # only neighbors are needed, as with HREXParams.max_delta_states = 1
+    far = np.abs(np.arange(n_states)[:, None] - np.arange(n_states)[None, :]) > 1
+    u_kl_by_iter[:, far] = np.inf
+
+    return u_kl_by_iter
+
+
+def test_streaming_pair_bar():
+    n_states, n_iters = 4, 200
+    u_kl_by_iter = sample_u_kl_by_iter(n_states, n_iters)
+
+    bar = StreamingPairBar(n_states)
+    for u_kl in u_kl_by_iter:
+        bar.update(u_kl)
+    assert bar.n_samples == n_iters
+    assert bar.stride == 1
+
+    df, df_err, overlap = bar.estimate()
+    assert df.shape == df_err.shape == overlap.shape == (n_states - 1,)
+
+    for k, u_kln in enumerate(bar.u_kln_by_pair()):
+        # u_kln in the conventional layout, u_kln[k, l, n] = u_l(x_n) for x_n sampled from state k
+        u_kln_ref = np.stack([u_kl_by_iter[:, [k, k + 1]][:, i, [k, k + 1]].T for i in range(2)])
+        df_ref, df_err_ref = df_and_err_from_u_kln(u_kln_ref)
+        np.testing.assert_allclose(df[k], df_ref, atol=1e-5)
+        np.testing.assert_allclose(df_err[k], df_err_ref, rtol=1e-5)
+        np.testing.assert_allclose(overlap[k], pair_overlap_from_ukln(u_kln_ref), rtol=1e-5)
+        np.testing.assert_allclose(u_kln[0, 1] - u_kln[0, 0], u_kln_ref[0, 1] - u_kln_ref[0, 0])
+        np.testing.assert_allclose(u_kln[1, 1] - u_kln[1, 0], u_kln_ref[1, 1] - u_kln_ref[1, 0])
+
+
+@pytest.mark.parametrize("n_iters", [1, 7, 8, 9, 33, 100])
+def test_streaming_pair_bar_bounded_memory(n_iters):
+    n_states, max_samples = 3, 8
+    u_kl_by_iter = sample_u_kl_by_iter(n_states, n_iters)
+
+    bar = StreamingPairBar(n_states, max_samples_per_state=max_samples)
+    for u_kl in u_kl_by_iter:
+        bar.update(u_kl)
+        assert bar.n_samples <= max_samples
+
+    # stored samples are evenly spaced in the stream, starting from the first
+    kept = u_kl_by_iter[:: bar.stride]
+    assert bar.n_samples == len(kept)
+    assert bar.stride == 1 or bar.n_samples > max_samples // 4
+
+    reference = StreamingPairBar(n_states, max_samples_per_state=len(u_kl_by_iter) + len(u_kl_by_iter) % 2)
+    for u_kl in kept:
+        reference.update(u_kl)
+    np.testing.assert_array_equal(bar.u_kln_by_pair(), reference.u_kln_by_pair())
+    np.testing.assert_array_equal(bar.estimate(), df_err_and_overlap_from_u_kln_batch(reference.u_kln_by_pair()))
+
+
+def test_streaming_pair_bar_invalid():
+    with pytest.raises(AssertionError, match="even"):
+        StreamingPairBar(3, max_samples_per_state=5)
+    bar = StreamingPairBar(3)
+    with pytest.raises(AssertionError, match="no samples"):
+        bar.estimate()
+    with pytest.raises(AssertionError):
+        bar.update(np.zeros((2, 2)))
@@ -10,4 +10,13 @@ def _suppress_jax_no_gpu_warning():
     jax.config.update("jax_platform_name", "cpu")
 
 
+def _configure_jax_compilation_cache():
+    """Enables the persistent compilation cache and warm-up manifest recording if requested via environment variables.
+    See `timemachine.jax_cache`"""
+    from timemachine.jax_cache import configure_from_environment
+
+    configure_from_environment()
+
+
 _suppress_jax_no_gpu_warning()
+_configure_jax_compilation_cache()
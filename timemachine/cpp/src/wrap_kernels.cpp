@@ -362,7 +362,14 @@ void declare_context(py::module &m) {
                 py::array_t<double, py::array::c_style> out_x_buffer({n_samples, N, D});
                 py::array_t<double, py::array::c_style> box_buffer({n_samples, D, D});
                 auto res = py::make_tuple(out_x_buffer, box_buffer);
-                ctxt.multiple_steps(n_steps, n_samples, out_x_buffer.mutable_data(), box_buffer.mutable_data());
+                double *out_x_ptr = out_x_buffer.mutable_data();
+                double *box_ptr = box_buffer.mutable_data();
+                {
+                    // Release the GIL while stepping so that other Python threads (e.g. host-side work in pipelined
+                    // HREX) can run concurrently. Only the preallocated buffers are accessed.
+                    py::gil_scoped_release release;
+                    ctxt.multiple_steps(n_steps, n_samples, out_x_ptr, box_ptr);
+                }
                 return res;
             },
             py::arg("n_steps"),
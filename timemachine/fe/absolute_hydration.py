@@ -24,12 +24,15 @@ from timemachine.fe.topology import BaseTopology
 from timemachine.fe.utils import get_mol_name, get_romol_conf
 from timemachine.ff import Forcefield
 from timemachine.lib import LangevinIntegrator, MonteCarloBarostat
-from timemachine.md import builders, enhanced, minimizer, smc
+from timemachine.md import enhanced, minimizer, smc
 from timemachine.md.barostat.moves import NPTMove
 from timemachine.md.barostat.utils import get_bond_list, get_group_indices
 from timemachine.md.states import CoordsVelBox
 from timemachine.potentials import SummedPotential
 from timemachine.potentials.potential import get_potential_by_type
+from timemachine.utils import lazy_import
+
+builders = lazy_import("timemachine.md.builders")
 
 DEFAULT_AHFE_MD_PARAMS = MDParams(n_frames=1000, n_eq_steps=10_000, steps_per_frame=400, seed=2023)
 
@@ -1,14 +1,20 @@
 import logging
+from functools import partial
 from typing import Optional
 
 import jax
+import jax.experimental
 import jax.numpy as jnp
 import numpy as np
-import pymbar
 from jax.scipy.special import logsumexp
+from jax.typing import ArrayLike
 from numpy.typing import NDArray
-from pymbar.utils import kln_to_kn
-from scipy.stats import normaltest
+
+from timemachine.parallel.client import AbstractClient
+from timemachine.utils import lazy_import
+
+pymbar = lazy_import("pymbar")
+stats = lazy_import("scipy.stats")
 
 DG_KEY = "Delta_f"
 DG_ERR_KEY = "dDelta_f"
@@ -115,7 +121,7 @@ def ukln_to_ukn(u_kln: NDArray) -> tuple[NDArray, NDArray]:
         * the first dimension (k) indexes the state from which the configuration was sampled
         * the second dimension (l) indexes the state for which we evaluate the energy
     """
-    u_kn = kln_to_kn(u_kln)
+    u_kn = pymbar.utils.kln_to_kn(u_kln)
     k, l, n = u_kln.shape
     assert k == l == 2
     assert u_kn.shape == (k, l * n)
@@ -149,6 +155,188 @@ def df_and_err_from_u_kln(u_kln: NDArray, maximum_iterations: int = DEFAULT_MAXI
         return df[0, 1], np.nan
 
 
+DEFAULT_BATCH_TOLERANCE = 1e-10  # absolute tolerance on df, in reduced units
+
+
+def _log_sigmoid(z):
+    return -jnp.logaddexp(0.0, -z)
+
+
+def _bar_solve(delta_u, weights, initial_df, tolerance: float, maximum_iterations: int):
+    """Solve the two-state MBAR (equivalently, BAR) equations for a single pair of states.
+
+    Parameters
+    ----------
+    delta_u : array (2n,)
+        u_1(x) - u_0(x) for pooled samples x from both states; the first n are from state 0, the remaining n from
+        state 1
+    weights : array (2n,)
+        non-negative multiplicity of each sample, e.g. 0 or 1 to select a subset of samples, or bootstrap counts
+    initial_df : float
+        initial guess, used to bracket the solution. If NaN, the solution is bracketed using the exponential
+        averages of forward and reverse works
+
+    Returns
+    -------
+    df, df_err, overlap : float
+        df_err and overlap are as computed by pymbar.MBAR, see `df_and_err_from_u_kln` and `pair_overlap_from_ukln`
+    """
+    n = delta_u.shape[0] // 2
+    n_0 = jnp.sum(weights[:n])
+    n_1 = jnp.sum(weights[n:])
+    log_c = jnp.log(n_1) - jnp.log(n_0)
+
+    # excluded samples have zero weight in all sums below
+    delta_u = jnp.where(weights > 0, delta_u, jnp.inf)
+    log_w = jnp.log(weights)
+
+    def g_and_dg(df):
+        # g(df) = log(sum_n sigmoid(z_n) / n_1) is increasing, and zero at the solution
+        # (the normalization condition of state 1, with f_0 = 0).
+        # log(sigmoid(z)) and log(sigmoid(-z)) share log1p(exp(-|z|)), and both sums share a common scale
+        z = log_c + df - delta_u
+        log1p_exp = jnp.log1p(jnp.exp(-jnp.abs(z)))
+        log_sigma = jnp.minimum(z, 0.0) - log1p_exp + log_w
+        scale = jnp.max(log_sigma)
+        sigma = jnp.exp(log_sigma - scale)
+        sum_sigma = jnp.sum(sigma)
+        g = scale + jnp.log(sum_sigma) - jnp.log(n_1)
+        dg = jnp.sum(sigma * jnp.exp(jnp.minimum(-z, 0.0) - log1p_exp)) / sum_sigma
+        return g, dg
+
+    def expand_bracket(state):
+        lo, hi, g_lo, g_hi, width = state
+        lo = jnp.where(g_lo > 0, lo - width, lo)
+        hi = jnp.where(g_hi < 0, hi + width, hi)
+        return lo, hi, g_and_dg(lo)[0], g_and_dg(hi)[0], 2 * width
+
+    def bracket_not_found(state):
+        _, _, g_lo, g_hi, width = state
+        return ((g_lo > 0) | (g_hi < 0)) & (width < 1e12)
+
+    # initial bracket around initial_df if passed, otherwise between the exponential averages of forward and reverse
+    # works
+    df_fwd = jnp.log(n_0) - logsumexp(-delta_u[:n] + log_w[:n])
+    df_rev = logsumexp(jnp.where(weights[n:] > 0, delta_u[n:], -jnp.inf) + log_w[n:]) - jnp.log(n_1)
+    df_fwd, df_rev = (jnp.where(jnp.isfinite(x), x, 0.0) for x in (df_fwd, df_rev))
+    lo = jnp.where(jnp.isnan(initial_df), jnp.minimum(df_fwd, df_rev), initial_df) - 0.5
+    hi = jnp.where(jnp.isnan(initial_df), jnp.maximum(df_fwd, df_rev), initial_df) + 0.5
+    lo, hi, _, _, _ = jax.lax.while_loop(
+        bracket_not_found, expand_bracket, (lo, hi, g_and_dg(lo)[0], g_and_dg(hi)[0], 1.0)
+    )
+
+    def newton_or_bisection_step(state):
+        # Newton step, falling back to bisection if the step leaves the bracket
+        lo, hi, df, _, i = state
+        g, dg = g_and_dg(df)
+        lo = jnp.where(g < 0, df, lo)
+        hi = jnp.where(g < 0, hi, df)
+        df_newton = df - g / dg
+        df_next = jnp.where((df_newton >= lo) & (df_newton <= hi), df_newton, (lo + hi) / 2)
+        return lo, hi, df_next, jnp.abs(df_next - df), i + 1
+
+    def not_converged(state):
+        lo, hi, _, step, i = state
+        return (step > tolerance) & (hi - lo > tolerance) & (i < maximum_iterations)
+
+    df_start = jnp.where(jnp.isnan(initial_df), (lo + hi) / 2, jnp.clip(initial_df, lo, hi))
+    _, _, df, _, _ = jax.lax.while_loop(not_converged, newton_or_bisection_step, (lo, hi, df_start, jnp.inf, 0))
+
+    # sum_n sigmoid(z_n) (1 - sigmoid(z_n)) determines both the asymptotic variance and the overlap
+    log_s = logsumexp(_log_sigmoid(log_c + df - delta_u) + _log_sigmoid(delta_u - log_c - df) + log_w)
+    # the variance is zero up to rounding when the states are identical; clamp so that df_err is 0 as in pymbar
+    df_err = jnp.sqrt(jnp.maximum(jnp.exp(-log_s) - (n_0 + n_1) / (n_0 * n_1), 0.0))
+    overlap = jnp.clip(2 * jnp.exp(log_s) / n_0, 0.0, 1.0)
+
+    return df, df_err, overlap
+
+
+def _delta_u_from_u_kln(u_kln):
+    """u_1(x) - u_0(x) for pooled samples from both states, with shape (..., 2n)"""
+    return jnp.concatenate([u_kln[..., 0, 1, :] - u_kln[..., 0, 0, :], u_kln[..., 1, 1, :] - u_kln[..., 1, 0, :]], -1)
+
+
+@partial(jax.jit, static_argnames=("tolerance", "maximum_iterations"))
+def _bar_solve_batch(u_kln, n_samples, tolerance: float, maximum_iterations: int):
+    # u_kln: (B, 2, 2, n), n_samples: (P,). Returns arrays of shape (P, B)
+    n = u_kln.shape[-1]
+    delta_u = _delta_u_from_u_kln(u_kln)
+
+    def solve_prefix(prev_df, n_samples_):
+        # warm start from the solution for the previous prefix, which is typically close when consecutive prefixes
+        # differ by a small number of samples
+        weights = jnp.tile(jnp.arange(n) < n_samples_, 2).astype(delta_u.dtype)
+        result = jax.vmap(_bar_solve, (0, None, 0, None, None))(
+            delta_u, weights, prev_df, tolerance, maximum_iterations
+        )
+        df = result[0]
+        return jnp.where(jnp.isfinite(df), df, jnp.nan), result
+
+    # loop over prefixes to bound memory
+    _, results = jax.lax.scan(solve_prefix, jnp.full(delta_u.shape[0], jnp.nan, delta_u.dtype), n_samples)
+    return results
+
+
+@partial(jax.jit, static_argnames=("tolerance", "maximum_iterations"))
+def _bar_solve_weighted(u_kln, weights, initial_df, tolerance: float, maximum_iterations: int):
+    # u_kln: (2, 2, n), weights: (R, 2n). Returns arrays of shape (R,)
+    delta_u = _delta_u_from_u_kln(u_kln)
+    return jax.vmap(_bar_solve, (None, 0, None, None, None))(
+        delta_u, weights, initial_df, tolerance, maximum_iterations
+    )
+
+
+def df_err_and_overlap_from_u_kln_batch(
+    u_kln: NDArray,
+    n_samples: Optional[ArrayLike] = None,
+    tolerance: float = DEFAULT_BATCH_TOLERANCE,
+    maximum_iterations: int = DEFAULT_MAXIMUM_ITERATIONS,
+) -> tuple[NDArray, NDArray, NDArray]:
+    """Compute free energy differences, uncertainties and overlaps for a batch of 2-state u_kln matrices, e.g. for
+    all lambda windows and energy components, using a vectorized solver in place of pymbar.
+
+    Results agree with `df_and_err_from_u_kln` and `pair_overlap_from_ukln` to within solver tolerance.
+
+    Parameters
+    ----------
+    u_kln : array (..., 2, 2, n)
+        batch of 2-state u_kln matrices
+
+    n_samples : int array (P,), optional
+        If passed, compute estimates using only the first n_samples[p] samples from each state (e.g. to monitor
+        convergence over time), for each p
+
+    tolerance : float
+        absolute tolerance on df
+
+    maximum_iterations : int
+        maximum number of solver iterations
+
+    Returns
+    -------
+    df, df_err, overlap : arrays
+        of shape (...), or (P, ...) if n_samples is passed. df_err is NaN where the asymptotic variance estimate is
+        negative.
+    """
+    u_kln = np.asarray(u_kln)
+    *batch_shape, k, l, n = u_kln.shape
+    assert k == l == 2
+    n_samples_ = np.atleast_1d(n_samples if n_samples is not None else n)
+    assert np.all((1 <= n_samples_) & (n_samples_ <= n)), "n_samples must be in [1, n]"
+
+    with jax.experimental.enable_x64():
+        results = _bar_solve_batch(
+            jnp.asarray(u_kln.reshape(-1, 2, 2, n), dtype=jnp.float64),
+            jnp.asarray(n_samples_),
+            tolerance,
+            maximum_iterations,
+        )
+        result_shape = batch_shape if n_samples is None else [len(n_samples_), *batch_shape]
+        df, df_err, overlap = (np.asarray(x).reshape(result_shape) for x in results)
+
+    return df, df_err, overlap
+
+
 def df_from_u_kln(
     u_kln: NDArray, initial_f_k: Optional[NDArray] = None, maximum_iterations: int = DEFAULT_MAXIMUM_ITERATIONS
 ) -> float:
@@ -166,8 +354,22 @@ def df_from_u_kln(
     return df[0, 1]
 
 
+BOOTSTRAP_METHODS = ("batched", "poisson", "sequential")
+
+
+def _bootstrap_counts(rng: np.random.Generator, n: int, n_bootstrap: int) -> NDArray:
+    """Multiplicity of each sample in each of n_bootstrap resamples with replacement, with shape (n_bootstrap, n).
+    Draws the same resamples as n_bootstrap sequential calls to rng.choice(..., size=(n,), replace=True)."""
+    idxs = rng.choice(n, size=(n_bootstrap, n), replace=True)
+    offsets = n * np.arange(n_bootstrap)[:, None]
+    return np.bincount((idxs + offsets).ravel(), minlength=n_bootstrap * n).reshape(n_bootstrap, n)
+
+
 def bootstrap_bar(
-    u_kln: NDArray, n_bootstrap: int = 100, maximum_iterations: int = DEFAULT_MAXIMUM_ITERATIONS
+    u_kln: NDArray,
+    n_bootstrap: int = 100,
+    maximum_iterations: int = DEFAULT_MAXIMUM_ITERATIONS,
+    method: str = "batched",
 ) -> tuple[float, float, NDArray]:
     """Given a 2-state u_kln matrix, subsample u_kln with replacement and re-run df_from_u_kln many times
 
@@ -179,6 +381,14 @@ def bootstrap_bar(
         number of bootstrap samples
     maximum_iterations : int
         maximum number of solver iterations to use for each sample
+    method : str
+        One of
+
+        * "batched": draw all resamples at once, represented as per-sample multiplicities, and solve for all
+          bootstrap samples in a single call to the vectorized solver (see `df_err_and_overlap_from_u_kln_batch`),
+          warm-started from the estimate using all samples. Uses the same resamples as "sequential".
+        * "poisson": as "batched", but using Poisson(1) multiplicities (Poisson bootstrap)
+        * "sequential": resample u_kln and solve using pymbar, one bootstrap sample at a time
 
     Returns
     -------
@@ -194,32 +404,46 @@ def bootstrap_bar(
     Notes
     -----
     * TODO[deboggle] -- upgrade from pymbar3 to pymbar4 and remove this
-    * TODO[performance] -- multiprocessing, if needed?
     """
+    if method not in BOOTSTRAP_METHODS:
+        raise ValueError(f"unknown bootstrap method {method!r}, expected one of {BOOTSTRAP_METHODS}")
 
     full_bar_result, full_bar_err = df_and_err_from_u_kln(u_kln, maximum_iterations=maximum_iterations)
 
     _, _, n = u_kln.shape
 
-    bootstrap_samples = []
-
     seed = 2022
     rng = np.random.default_rng(seed)
 
-    for _ in range(n_bootstrap):
-        u_kln_sample = rng.choice(u_kln, size=(n,), replace=True, axis=2)
-        bar_result = df_from_u_kln(
-            u_kln_sample,
-            initial_f_k=np.array([0.0, full_bar_result]),  # warm start
-            maximum_iterations=maximum_iterations,
+    if method == "sequential":
+        bootstrap_samples = []
+        for _ in range(n_bootstrap):
+            u_kln_sample = rng.choice(u_kln, size=(n,), replace=True, axis=2)
+            bar_result = df_from_u_kln(
+                u_kln_sample,
+                initial_f_k=np.array([0.0, full_bar_result]),  # warm start
+                maximum_iterations=maximum_iterations,
+            )
+            bootstrap_samples.append(bar_result)
+        return full_bar_result, full_bar_err, np.array(bootstrap_samples)
+
+    # samples from both states are resampled jointly, as in the sequential method
+    counts = _bootstrap_counts(rng, n, n_bootstrap) if method == "batched" else rng.poisson(1.0, (n_bootstrap, n))
+    weights = np.tile(counts, 2)
+
+    with jax.experimental.enable_x64():
+        bootstrap_dfs, _, _ = _bar_solve_weighted(
+            jnp.asarray(u_kln, dtype=jnp.float64),
+            jnp.asarray(weights, dtype=jnp.float64),
+            full_bar_result,  # warm start
+            DEFAULT_BATCH_TOLERANCE,
+            maximum_iterations,
         )
-        bootstrap_samples.append(bar_result)
-
-    return full_bar_result, full_bar_err, np.array(bootstrap_samples)
+        return full_bar_result, full_bar_err, np.asarray(bootstrap_dfs)
 
 
 def bar_with_pessimistic_uncertainty(
-    u_kln: NDArray, n_bootstrap=100, maximum_iterations: int = DEFAULT_MAXIMUM_ITERATIONS
+    u_kln: NDArray, n_bootstrap=100, maximum_iterations: int = DEFAULT_MAXIMUM_ITERATIONS, method: str = "batched"
 ) -> tuple[float, float]:
     """Given 2-state u_kln, returns free energy difference and the uncertainty. The uncertainty can be produced either by
     BAR using all samples or the bootstrapped error, whichever is greater.
@@ -232,6 +456,8 @@ def bar_with_pessimistic_uncertainty(
         number of bootstrap samples
     maximum_iterations : int
         maximum number of solver iterations to use for each sample
+    method : str
+        bootstrap method, see `bootstrap_bar`
 
     Returns
     -------
@@ -242,10 +468,12 @@ def bar_with_pessimistic_uncertainty(
         `max(error_estimates)` where `error_estimates = [bootstrapped_bar_stddev, two_state_mbar_uncertainty]`
     """
 
-    df, ddf, bootstrap_dfs = bootstrap_bar(u_kln, n_bootstrap=n_bootstrap, maximum_iterations=maximum_iterations)
+    df, ddf, bootstrap_dfs = bootstrap_bar(
+        u_kln, n_bootstrap=n_bootstrap, maximum_iterations=maximum_iterations, method=method
+    )
 
     # warn if bootstrap distribution deviates significantly from normality
-    normaltest_result = normaltest(bootstrap_dfs)
+    normaltest_result = stats.normaltest(bootstrap_dfs)
     pvalue_threshold = 1e-3  # arbitrary, small
     if normaltest_result.pvalue < pvalue_threshold:
         logger.warning(f"bootstrapped errors non-normal: {normaltest_result}")
@@ -309,27 +537,41 @@ def df_from_ukln_by_lambda(ukln_by_lambda: NDArray) -> tuple[float, float]:
     df_err: float
         pair BAR uncertainty across lambda
     """
-    win_dfs = []
-    win_errs = []
-    for lambda_idx in range(ukln_by_lambda.shape[0]):
-        window_ukln = ukln_by_lambda[lambda_idx]
-        df, df_err = df_and_err_from_u_kln(window_ukln)
-        win_dfs.append(df)
-        win_errs.append(df_err)
+    win_dfs, win_errs, _ = df_err_and_overlap_from_u_kln_batch(ukln_by_lambda)
     return np.sum(win_dfs), np.linalg.norm(win_errs)  # type: ignore
 
 
+@jax.jit
+def _pair_overlap_from_delta_u(delta_u, df):
+    # delta_u: (..., 2n), df: (...). Assumes equal numbers of samples from both states
+    n = delta_u.shape[-1] // 2
+    z = df[..., None] - delta_u
+    log_s = logsumexp(_log_sigmoid(z) + _log_sigmoid(-z), axis=-1)
+    return jnp.clip(2 * jnp.exp(log_s) / n, 0.0, 1.0)
+
+
 def pair_overlap_from_ukln(
-    u_kln: NDArray, maximum_iterations=DEFAULT_MAXIMUM_ITERATIONS, relative_tolerance=DEFAULT_RELATIVE_TOLERANCE
+    u_kln: NDArray,
+    maximum_iterations=DEFAULT_MAXIMUM_ITERATIONS,
+    relative_tolerance=DEFAULT_RELATIVE_TOLERANCE,
+    df: Optional[float] = None,
 ) -> float:
     """Compute the off-diagonal entry of 2x2 MBAR overlap matrix,
         and normalize to interval [0,1]
 
+    Given the converged free energy difference, the overlap is computed in closed form as
+    (2 / n) sum_n sigmoid(z_n) (1 - sigmoid(z_n)), where z_n = df - (u_1(x_n) - u_0(x_n)) for pooled samples x_n from
+    both states. Falls back to pymbar.MBAR for degenerate inputs where this is not finite.
+
     Parameters
     ----------
     u_kln : [2, 2, n] array
         pymbar u_kln input format, where k = l = 2
 
+    df : float, optional
+        BAR estimate of the free energy difference for u_kln, if already computed (e.g. by `df_and_err_from_u_kln`).
+        Otherwise, solved for using the vectorized solver (see `df_err_and_overlap_from_u_kln_batch`)
+
     Returns
     -------
     pair_overlap: float
@@ -337,6 +579,22 @@ def pair_overlap_from_ukln(
         (normalized to interval [0,1] rather than [0,0.5])
 
     """
+    u_kln = np.asarray(u_kln)
+    if df is None:
+        _, _, overlap_ = df_err_and_overlap_from_u_kln_batch(u_kln, maximum_iterations=maximum_iterations)
+    elif np.isfinite(df):
+        with jax.experimental.enable_x64():
+            overlap_ = np.asarray(
+                _pair_overlap_from_delta_u(
+                    _delta_u_from_u_kln(jnp.asarray(u_kln, dtype=jnp.float64)), jnp.asarray(df, dtype=jnp.float64)
+                )
+            )
+    else:
+        overlap_ = np.asarray(np.nan)
+
+    if np.isfinite(overlap_):
+        return float(overlap_)
+
     u_kn, N_k = ukln_to_ukn(u_kln)
     overlap = (
         2
@@ -353,12 +611,30 @@ def pair_overlap_from_ukln(
     return overlap
 
 
+def _df_and_err_by_prefix(
+    ukln_by_lambda: NDArray, n_samples: NDArray, client: Optional[AbstractClient]
+) -> tuple[NDArray, NDArray]:
+    if client is None:
+        dfs, df_errs, _ = df_err_and_overlap_from_u_kln_batch(ukln_by_lambda, n_samples)
+        return dfs, df_errs
+
+    futures = [
+        client.submit(df_err_and_overlap_from_u_kln_batch, batch, n_samples)
+        for batch in np.array_split(ukln_by_lambda, client.max_workers)
+        if len(batch)
+    ]
+    results = [future.result() for future in futures]
+    dfs, df_errs = (np.concatenate([result[i] for result in results], axis=1) for i in range(2))
+    return dfs, df_errs
+
+
 def compute_fwd_and_reverse_df_over_time(
-    ukln_by_lambda: NDArray, frames_per_step: int = 100
+    ukln_by_lambda: NDArray, frames_per_step: int = 100, client: Optional[AbstractClient] = None
 ) -> tuple[NDArray, NDArray, NDArray, NDArray]:
     """Provided a u_kln computes the forward and reverse dF estimates.
 
-    Computes the dF value for increasing numbers of samples in both the forward and reverse direction.
+    Computes the dF value for increasing numbers of samples in both the forward and reverse direction. Estimates for
+    consecutive numbers of samples are warm-started from the previous estimate.
 
     Parameters
     ----------
@@ -369,6 +645,10 @@ def compute_fwd_and_reverse_df_over_time(
     frames_per_step: int
         Number of frames to include in a sample when computing u_kln over time
 
+    client: AbstractClient, optional
+        If passed, split lambda windows into client.max_workers batches and compute estimates for each batch in
+        parallel
+
     Returns
     -------
         fwd_df: [N // frames_per_step] np.ndarray
@@ -382,20 +662,20 @@ def compute_fwd_and_reverse_df_over_time(
     """
     assert len(ukln_by_lambda.shape) == 4
     assert ukln_by_lambda.shape[1] == 2
-    forward_predictions_ = []
-    reverse_predictions_ = []
     total_frames = ukln_by_lambda.shape[-1]
     assert total_frames >= frames_per_step, "fewer samples than frames_per_step"
 
     # Reverse the u_kln along last axis to get the reverse
     reversed_ukln_by_lambda = np.flip(ukln_by_lambda, 3)
-    for num_frames in range(frames_per_step, total_frames + 1, frames_per_step):
-        fwd_ukln = ukln_by_lambda[..., :num_frames]
-        reverse_ukln = reversed_ukln_by_lambda[..., :num_frames]
+    n_samples = np.arange(frames_per_step, total_frames + 1, frames_per_step)
 
-        forward_predictions_.append(df_from_ukln_by_lambda(fwd_ukln))
-        reverse_predictions_.append(df_from_ukln_by_lambda(reverse_ukln))
+    # estimates for all prefixes and windows, with shape (n_prefixes, n_lambda)
+    fwd_dfs, fwd_errs = _df_and_err_by_prefix(ukln_by_lambda, n_samples, client)
+    rev_dfs, rev_errs = _df_and_err_by_prefix(reversed_ukln_by_lambda, n_samples, client)
 
-    forward_predictions = np.array(forward_predictions_)
-    reverse_predictions = np.array(reverse_predictions_)
-    return forward_predictions[:, 0], forward_predictions[:, 1], reverse_predictions[:, 0], reverse_predictions[:, 1]
+    return (
+        np.sum(fwd_dfs, axis=1),
+        np.linalg.norm(fwd_errs, axis=1),
+        np.sum(rev_dfs, axis=1),
+        np.linalg.norm(rev_errs, axis=1),
+    )
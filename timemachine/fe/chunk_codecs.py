@@ -0,0 +1,217 @@
+"""Codecs for compressed storage of chunks of :py:class:`timemachine.fe.stored_arrays.StoredArrays`.
+
+Encoded chunks are self-describing: a header records the codec and its parameters, together with the dtype and shape
+of the array, so that :py:func:`deserialize_chunk` does not need to know how a chunk was encoded.
+"""
+
+import json
+import lzma
+import struct
+import zlib
+from abc import ABC, abstractmethod
+from collections.abc import Sequence
+from dataclasses import asdict, dataclass, field
+from typing import ClassVar, Literal, Optional
+
+import numpy as np
+from numpy.typing import NDArray
+
+MAGIC = b"\x93TMCHUNK"
+
+Compression = Literal["zlib", "lzma"]
+
+
+class ChunkCodec(ABC):
+    """Encodes an array as bytes. Subclasses must be dataclasses whose fields are JSON-serializable."""
+
+    name: ClassVar[str]
+
+    @abstractmethod
+    def encode(self, array: NDArray) -> bytes: ...
+
+    @abstractmethod
+    def decode(self, bs: bytes, dtype: np.dtype, shape: tuple[int, ...]) -> NDArray: ...
+
+
+def _compress(bs: bytes, compression: Compression) -> bytes:
+    if compression == "zlib":
+        return zlib.compress(bs)
+    elif compression == "lzma":
+        return lzma.compress(bs)
+    else:
+        raise ValueError(f"unknown compression: {compression}")
+
+
+def _decompress(bs: bytes, compression: Compression) -> bytes:
+    if compression == "zlib":
+        return zlib.decompress(bs)
+    elif compression == "lzma":
+        return lzma.decompress(bs)
+    else:
+        raise ValueError(f"unknown compression: {compression}")
+
+
+def _shuffle(array: NDArray) -> bytes:
+    """Byte-shuffle: group the k-th bytes of all elements together, which typically improves compression of numeric
+    data since high-order bytes of neighboring values tend to be similar"""
+    array = np.ascontiguousarray(array)
+    return array.view(np.uint8).reshape(array.size, array.dtype.itemsize).T.tobytes()
+
+
+def _unshuffle(bs: bytes, dtype: np.dtype, shape: tuple[int, ...]) -> NDArray:
+    n_elements = int(np.prod(shape))
+    byte_planes = np.frombuffer(bs, dtype=np.uint8).reshape(dtype.itemsize, n_elements)
+    return np.ascontiguousarray(byte_planes.T).view(dtype).reshape(shape)
+
+
+@dataclass(frozen=True)
+class ShuffleCompressCodec(ChunkCodec):
+    """Lossless: byte-shuffle followed by compression using zlib or lzma (from the standard library)
+
+    Examples
+    --------
+    >>> codec = ShuffleCompressCodec("lzma")
+    >>> x = np.linspace(0.0, 1.0, 12).reshape(2, 2, 3)
+    >>> np.array_equal(deserialize_chunk(serialize_chunk(x, codec)), x)
+    True
+    """
+
+    compression: Compression = "zlib"
+
+    name: ClassVar[str] = "shuffle"
+
+    def __post_init__(self):
+        assert self.compression in ("zlib", "lzma")
+
+    def encode(self, array: NDArray) -> bytes:
+        return _compress(_shuffle(array), self.compression)
+
+    def decode(self, bs: bytes, dtype: np.dtype, shape: tuple[int, ...]) -> NDArray:
+        return _unshuffle(_decompress(bs, self.compression), dtype, shape)
+
+
+@dataclass(frozen=True)
+class QuantizeCodec(ChunkCodec):
+    """Lossy fixed-precision quantization of floating point arrays with shape (frames, atoms, ...), similar to the XTC
+    format, followed by lossless compression (see :py:class:`ShuffleCompressCodec`).
+
+    Values are rounded to the nearest multiple of 1 / precision, i.e. the absolute error is at most 0.5 / precision
+    (e.g. 5e-4 nm with the default precision of 1000 / nm). The precision of specific groups of atoms (axis 1) can be
+    overridden using atom_group_precisions; a precision of None stores the group exactly, e.g. to keep ligand atoms at
+    full precision while quantizing water.
+
+    Arrays that are not floating point are stored losslessly.
+
+    Parameters
+    ----------
+    precision: float
+        Default precision, in inverse units of the values
+
+    atom_group_precisions: sequence of (atom indices, precision or None)
+        Precision by group of atoms. Groups must not overlap
+
+    compression: "zlib" or "lzma"
+        Compression applied after quantization
+
+    Examples
+    --------
+    >>> codec = QuantizeCodec(precision=100.0, atom_group_precisions=[([0], None)])
+    >>> x = np.array([[[0.1234567, 1.0, 2.0], [0.1234567, 1.0, 2.0]]])
+    >>> deserialize_chunk(serialize_chunk(x, codec))
+    array([[[0.1234567, 1.       , 2.       ],
+            [0.12     , 1.       , 2.       ]]])
+    """
+
+    precision: float = 1000.0
+    atom_group_precisions: Sequence[tuple[Sequence[int], Optional[float]]] = field(default_factory=tuple)
+    compression: Compression = "zlib"
+
+    name: ClassVar[str] = "quantize"
+
+    def __post_init__(self):
+        assert self.precision > 0.0
+        assert self.compression in ("zlib", "lzma")
+        # normalize to nested tuples (hashable, and consistent after a JSON roundtrip)
+        groups = tuple((tuple(int(i) for i in idxs), p) for idxs, p in self.atom_group_precisions)
+        for _, p in groups:
+            assert p is None or p > 0.0
+        all_idxs = [i for idxs, _ in groups for i in idxs]
+        assert len(set(all_idxs)) == len(all_idxs), "atom groups must not overlap"
+        object.__setattr__(self, "atom_group_precisions", groups)
+
+    def _precision_by_atom(self, n_atoms: int) -> NDArray:
+        """Precision for each atom, with NaN for atoms stored exactly"""
+        precision_by_atom = np.full(n_atoms, self.precision)
+        for idxs, p in self.atom_group_precisions:
+            precision_by_atom[list(idxs)] = np.nan if p is None else p
+        return precision_by_atom
+
+    def encode(self, array: NDArray) -> bytes:
+        if not np.issubdtype(array.dtype, np.floating) or array.ndim < 2:
+            return ShuffleCompressCodec(self.compression).encode(array)
+
+        precision_by_atom = self._precision_by_atom(array.shape[1])
+        exact = np.isnan(precision_by_atom)
+        scale = precision_by_atom[~exact].reshape((-1,) + (1,) * (array.ndim - 2))
+        scaled = np.rint(array[:, ~exact] * scale)
+        if not np.all(np.abs(scaled) < 2**31):
+            raise ValueError("values out of range for quantization at the specified precision")
+        quantized = scaled.astype(np.int32)
+        return _compress(_shuffle(quantized) + _shuffle(array[:, exact]), self.compression)
+
+    def decode(self, bs: bytes, dtype: np.dtype, shape: tuple[int, ...]) -> NDArray:
+        if not np.issubdtype(dtype, np.floating) or len(shape) < 2:
+            return ShuffleCompressCodec(self.compression).decode(bs, dtype, shape)
+
+        precision_by_atom = self._precision_by_atom(shape[1])
+        exact = np.isnan(precision_by_atom)
+        quantized_shape = (shape[0], int(np.sum(~exact)), *shape[2:])
+        exact_shape = (shape[0], int(np.sum(exact)), *shape[2:])
+
+        raw = _decompress(bs, self.compression)
+        n_quantized_bytes = int(np.prod(quantized_shape)) * np.dtype(np.int32).itemsize
+        quantized = _unshuffle(raw[:n_quantized_bytes], np.dtype(np.int32), quantized_shape)
+
+        array = np.empty(shape, dtype=dtype)
+        scale = precision_by_atom[~exact].reshape((-1,) + (1,) * (len(shape) - 2))
+        array[:, ~exact] = quantized / scale
+        array[:, exact] = _unshuffle(raw[n_quantized_bytes:], dtype, exact_shape)
+        return array
+
+
+CODECS: dict[str, type[ChunkCodec]] = {
+    ShuffleCompressCodec.name: ShuffleCompressCodec,
+    QuantizeCodec.name: QuantizeCodec,
+}
+
+
+def serialize_chunk(array: NDArray, codec: ChunkCodec) -> bytes:
+    """Encode an array, prefixed by a header describing the codec, dtype and shape"""
+    array = np.asarray(array)
+    if array.dtype.hasobject or array.dtype.fields is not None:
+        raise ValueError(f"unsupported dtype: {array.dtype}")
+    header = json.dumps(
+        dict(
+            codec=codec.name,
+            params=asdict(codec),  # type: ignore[call-overload]
+            dtype=array.dtype.str,
+            shape=array.shape,
+        )
+    ).encode()
+    return MAGIC + struct.pack("<I", len(header)) + header + codec.encode(array)
+
+
+def is_serialized_chunk(bs: bytes) -> bool:
+    return bs.startswith(MAGIC)
+
+
+def deserialize_chunk(bs: bytes) -> NDArray:
+    """Decode an array serialized by :py:func:`serialize_chunk`"""
+    if not is_serialized_chunk(bs):
+        raise ValueError("not a serialized chunk")
+    offset = len(MAGIC)
+    (header_len,) = struct.unpack_from("<I", bs, offset)
+    offset += struct.calcsize("<I")
+    header = json.loads(bs[offset : offset + header_len])
+    codec = CODECS[header["codec"]](**header["params"])
+    return codec.decode(bs[offset + header_len :], np.dtype(header["dtype"]), tuple(header["shape"]))
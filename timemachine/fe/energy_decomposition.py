@@ -97,9 +97,9 @@ def compute_energy_decomposed_u_kln(states: list[EnergyDecomposedState]) -> np.n
 
     u_kln_by_component = np.zeros((n_components, K, K, n_frames))
     for k in range(K):
-        # Load the frames into memory, then evaluate all of the components
+        # Load the frames into a single array (without copying, if possible), then evaluate all of the components
         # Done to avoid repeatedly reading from disk
-        xs, boxes = np.array(states[k].frames), states[k].boxes
+        xs, boxes = np.asarray(states[k].frames), states[k].boxes
         for l in range(K):
             for comp in range(n_components):
                 u_fxn = states[l].batch_u_fns[comp]
@@ -1,33 +1,31 @@
 import time
 from collections.abc import Iterator, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import asdict, dataclass, is_dataclass, replace
 from functools import cache
+from itertools import islice
 from typing import Callable, Optional
 from warnings import warn
 
 import jax
 import numpy as np
 from numpy.typing import NDArray
-from pymbar.utils import kln_to_kn
 
 from timemachine.constants import BOLTZ
 from timemachine.fe import model_utils, topology
 from timemachine.fe.bar import (
     bar_with_pessimistic_uncertainty,
-    df_and_err_from_u_kln,
+    df_err_and_overlap_from_u_kln_batch,
     pair_overlap_from_ukln,
     works_from_ukln,
 )
+from timemachine.fe.chunk_codecs import ChunkCodec
 from timemachine.fe.energy_decomposition import EnergyDecomposedState, compute_energy_decomposed_u_kln, get_batch_u_fns
-from timemachine.fe.plots import (
-    plot_as_png_fxn,
-    plot_dG_errs_figure,
-    plot_overlap_detail_figure,
-    plot_overlap_summary_figure,
-)
+from timemachine.fe.mbar import BandedUkn
 from timemachine.fe.protocol_refinement import greedy_bisection_step
 from timemachine.fe.rest.single_topology import InterpolationFxnName
 from timemachine.fe.stored_arrays import StoredArrays
+from timemachine.fe.streaming_bar import StreamingPairBar
 from timemachine.fe.utils import get_mol_masses, get_romol_conf
 from timemachine.ff import Forcefield, ForcefieldParams
 from timemachine.lib import LangevinIntegrator, MonteCarloBarostat, custom_ops
@@ -36,6 +34,7 @@ from timemachine.md.barostat.utils import compute_box_center, get_bond_list, get
 from timemachine.md.exchange.exchange_mover import WaterSamplingDiagnostics, get_water_idxs
 from timemachine.md.hrex import HREX, HREXDiagnostics, ReplicaIdx, StateIdx, get_swap_attempts_per_iter_heuristic
 from timemachine.md.states import CoordsVelBox
+from timemachine.parallel.client import AbstractClient, BaseFuture
 from timemachine.potentials import (
     BoundPotential,
     HarmonicBond,
@@ -45,8 +44,11 @@ from timemachine.potentials import (
     SummedPotential,
     make_summed_potential,
 )
+from timemachine.potentials.cpu_impl import CpuImpl
 from timemachine.potentials.potential import get_bound_potential_by_type
-from timemachine.utils import batches
+from timemachine.utils import batches, lazy_import
+
+fe_plots = lazy_import("timemachine.fe.plots")
 
 WATER_SAMPLER_MOVERS = (
     custom_ops.TIBDExchangeMove_f32,
@@ -72,6 +74,32 @@ class RESTParams:
     temperature_scale_interpolation: InterpolationFxnName
 
 
+@dataclass(frozen=True)
+class EarlyStoppingParams:
+    """
+    Parameters
+    ----------
+
+    target_dG_err: float
+        Stop sampling once the pair BAR estimate of the total dG error falls below this value (kJ/mol)
+
+    min_frames: int
+        Minimum number of frames to sample before stopping
+
+    check_interval: int
+        Number of frames between convergence checks
+    """
+
+    target_dG_err: float
+    min_frames: int = 100
+    check_interval: int = 100
+
+    def __post_init__(self):
+        assert self.target_dG_err > 0.0
+        assert self.min_frames > 0
+        assert self.check_interval > 0
+
+
 @dataclass(frozen=True)
 class HREXParams:
     """
@@ -92,6 +120,15 @@ class HREXParams:
     optimize_target_overlap: float or None
         If given, optimize the lambda schedule out of the initial bisection phase to target a specific minimum overlap
         between all adjacent windows. Must be in the interval (0.0, 1.0) if provided.
+
+    early_stopping_params: EarlyStoppingParams or None
+        If given, stop HREX sampling before MDParams.n_frames once the estimated dG error is below the target.
+        Estimates use the reduced potential matrix computed for replica exchange in each iteration.
+
+    pipelined: bool
+        If True, host-side work that the next iteration does not depend on (storing frames, updating running
+        estimates, printing diagnostics) runs on a worker thread, concurrently with sampling of the next iteration.
+        Results are identical to the serial loop.
     """
 
     n_frames_bisection: int = 100
@@ -99,6 +136,8 @@ class HREXParams:
     max_delta_states: Optional[int] = 4
     optimize_target_overlap: Optional[float] = None
     rest_params: Optional[RESTParams] = None
+    early_stopping_params: Optional[EarlyStoppingParams] = None
+    pipelined: bool = False
 
     def __post_init__(self):
         assert self.n_frames_bisection > 0
@@ -287,8 +326,10 @@ class Trajectory:
         self.final_barostat_volume_scale_factor = other.final_barostat_volume_scale_factor
 
     @classmethod
-    def empty(cls):
-        return Trajectory(StoredArrays(), [], None, None)
+    def empty(
+        cls, frames_codec: Optional[ChunkCodec] = None, max_pending_frame_writes: int = 0, packed_frames: bool = False
+    ):
+        return Trajectory(StoredArrays(frames_codec, max_pending_frame_writes, packed_frames), [], None, None)
 
 
 @dataclass
@@ -307,10 +348,10 @@ class SimulationResult:
     def boxes(self) -> list[NDArray]:
         return [np.array(traj.boxes) for traj in self.trajectories]
 
-    def compute_u_kn(self) -> tuple[NDArray, NDArray]:
+    def compute_u_kn(self, unbound_impl: custom_ops.Potential | CpuImpl | None = None) -> tuple[NDArray, NDArray]:
         """get MBAR input matrices u_kn and N_k"""
 
-        return compute_u_kn(self.trajectories, self.final_result.initial_states)
+        return compute_u_kn(self.trajectories, self.final_result.initial_states, unbound_impl)
 
 
 @dataclass
@@ -334,9 +375,10 @@ class HREXSimulationResult(SimulationResult):
         # (states, frames, atoms, 3)
         # NOTE: chunk[:, atom_idxs] below returns a copy (rather than a view) due to the use of "advanced indexing".
         # This is important because otherwise we would try to store all of the whole-system frames in memory at once.
+        # Chunks are memory-mapped, so that only the pages containing the selected atoms are read.
         trajs_by_state = np.array(
             [
-                np.concatenate([chunk[:, atom_idxs] for chunk in state_traj.frames._chunks()], axis=0)
+                np.concatenate([chunk[:, atom_idxs] for chunk in state_traj.frames._chunks(mmap_mode="r")], axis=0)
                 for state_traj in self.trajectories
             ]
         )
@@ -861,12 +903,13 @@ def estimate_free_energy_bar(u_kln_by_component: NDArray, temperature: float) ->
     kBT = BOLTZ * temperature
     dG, dG_err = df * kBT, df_err * kBT  # kJ/mol
 
-    overlap = pair_overlap_from_ukln(u_kln)
+    overlap = pair_overlap_from_ukln(u_kln, df=df)
 
     # Componentwise calculations
 
     w_fwd_by_component, w_rev_by_component = jax.vmap(works_from_ukln)(u_kln_by_component)
-    dG_err_by_component = np.array([df_and_err_from_u_kln(u_kln)[1] * kBT for u_kln in u_kln_by_component])
+    _, df_err_by_component, overlap_by_component = df_err_and_overlap_from_u_kln_batch(u_kln_by_component)
+    dG_err_by_component = df_err_by_component * kBT
 
     # When forward and reverse works are identically zero (usually because a given energy term does not depend on
     # lambda, e.g. host-host nonbonded interactions), BAR error is undefined; we return 0.0 by convention.
@@ -876,8 +919,6 @@ def estimate_free_energy_bar(u_kln_by_component: NDArray, temperature: float) ->
         dG_err_by_component,
     )
 
-    overlap_by_component = np.array([pair_overlap_from_ukln(u_kln) for u_kln in u_kln_by_component])
-
     return BarResult(dG, dG_err, dG_err_by_component, overlap, overlap_by_component, u_kln_by_component)
 
 
@@ -885,14 +926,22 @@ def make_pair_bar_plots(res: PairBarResult, temperature: float, prefix: str) ->
     U_names = [type(p.potential).__name__ for p in res.initial_states[0].potentials]
     lambdas = [s.lamb for s in res.initial_states]
 
-    overlap_detail_png = plot_as_png_fxn(
-        plot_overlap_detail_figure, U_names, res.dGs, res.dG_errs, res.u_kln_by_component_by_lambda, temperature, prefix
+    overlap_detail_png = fe_plots.plot_as_png_fxn(
+        fe_plots.plot_overlap_detail_figure,
+        U_names,
+        res.dGs,
+        res.dG_errs,
+        res.u_kln_by_component_by_lambda,
+        temperature,
+        prefix,
     )
 
-    dG_errs_png = plot_as_png_fxn(plot_dG_errs_figure, U_names, lambdas, res.dG_errs, res.dG_err_by_component_by_lambda)
+    dG_errs_png = fe_plots.plot_as_png_fxn(
+        fe_plots.plot_dG_errs_figure, U_names, lambdas, res.dG_errs, res.dG_err_by_component_by_lambda
+    )
 
-    overlap_summary_png = plot_as_png_fxn(
-        plot_overlap_summary_figure, U_names, lambdas, res.overlaps, res.overlap_by_component_by_lambda
+    overlap_summary_png = fe_plots.plot_as_png_fxn(
+        fe_plots.plot_overlap_summary_figure, U_names, lambdas, res.overlaps, res.overlap_by_component_by_lambda
     )
 
     return PairBarPlots(dG_errs_png, overlap_summary_png, overlap_detail_png)
@@ -1011,10 +1060,17 @@ def run_sims_bisection(
     temperature: float,
     min_overlap: Optional[float] = None,
     verbose: bool = True,
+    client: Optional[AbstractClient] = None,
+    n_speculative: Optional[int] = None,
 ) -> tuple[list[PairBarResult], list[Trajectory]]:
     r"""Starting from a specified lambda schedule, successively bisect the lambda interval between the pair of states
     with the lowest BAR overlap and sample the new state with MD.
 
+    If a client is given, new states are sampled speculatively in parallel: the initial states are sampled
+    concurrently, and in each iteration the midpoints of the n_speculative pairs with lowest overlap are submitted,
+    since these are likely to be bisected in subsequent iterations. The bisection itself is unchanged, so the results
+    are identical to the serial algorithm; speculative samples that are not used are discarded.
+
     Parameters
     ----------
     initial_lambdas: sequence of float, length >= 2, monotonically increasing
@@ -1038,6 +1094,14 @@ def run_sims_bisection(
     verbose: bool, optional
         Whether to print diagnostic information
 
+    client: AbstractClient or None, optional
+        If not None, used to sample states in parallel. The initial states returned by make_initial_state must be
+        picklable
+
+    n_speculative: int or None, optional
+        Maximum number of states to sample speculatively per iteration when client is given. Defaults to
+        client.max_workers
+
     Returns
     -------
     list of IntermediateResult
@@ -1050,13 +1114,26 @@ def run_sims_bisection(
 
     assert len(initial_lambdas) >= 2
     assert np.all(np.diff(initial_lambdas) > 0), "initial lambda schedule must be monotonically increasing"
+    assert n_speculative is None or n_speculative > 0
 
     lambdas = list(initial_lambdas)
 
     get_initial_state = cache(make_initial_state)
 
+    # lambdas submitted for sampling by the client that have not yet been retrieved by get_samples
+    pending_samples: dict[float, BaseFuture] = {}
+    submitted_lambdas: set[float] = set()
+
+    def submit_samples(lamb: float):
+        assert client is not None
+        if lamb not in submitted_lambdas:
+            submitted_lambdas.add(lamb)
+            pending_samples[lamb] = client.submit(sample, get_initial_state(lamb), md_params, max_buffer_frames=100)
+
     @cache
     def get_samples(lamb: float) -> Trajectory:
+        if lamb in pending_samples:
+            return pending_samples.pop(lamb).result()
         initial_state = get_initial_state(lamb)
         traj = sample(initial_state, md_params, max_buffer_frames=100)
         return traj
@@ -1102,6 +1179,22 @@ def run_sims_bisection(
         bar_results = [get_bar_result(lamb1, lamb2) for lamb1, lamb2 in zip(lambdas, lambdas[1:])]
         return PairBarResult(refined_initial_states, bar_results)
 
+    def speculate(lambdas: Sequence[float], n_remaining: int):
+        """Submit the midpoints of the pairs with the largest cost, which are likely to be bisected next"""
+        assert client is not None
+        pairs = list(zip(lambdas, lambdas[1:]))
+        pairs_by_cost = sorted(((cost_fn(*pair), left_idx, pair) for left_idx, pair in enumerate(pairs)), reverse=True)
+        n_top = min(n_speculative or client.max_workers, n_remaining)
+        for _, _, pair in pairs_by_cost[:n_top]:
+            lamb = midpoint(*pair)
+            if verbose and lamb not in submitted_lambdas:
+                print(f"Speculatively sampling new state at λ={lamb:.3g}…")
+            submit_samples(lamb)
+
+    if client is not None:
+        for lamb in lambdas:
+            submit_samples(lamb)
+
     result = compute_intermediate_result(lambdas)
     results = [result]
 
@@ -1111,6 +1204,9 @@ def run_sims_bisection(
                 print(f"All BAR overlaps exceed min_overlap={min_overlap}. Returning after {iteration} iterations.")
             break
 
+        if client is not None:
+            speculate(lambdas, n_bisections - iteration)
+
         lambdas_new, info = greedy_bisection_step(lambdas, cost_fn, midpoint)
         if verbose:
             costs, left_idx, lamb_new = info
@@ -1146,7 +1242,7 @@ def run_sims_bisection(
 
 
 def compute_potential_matrix(
-    potential: custom_ops.Potential,
+    potential: custom_ops.Potential | CpuImpl,
     hrex: HREX[CoordsVelBox],
     params_by_state: NDArray,
     max_delta_states: Optional[int] = None,
@@ -1157,7 +1253,7 @@ def compute_potential_matrix(
 
     Parameters
     ----------
-    potential : custom_ops.Potential
+    potential : custom_ops.Potential or CpuImpl
         potential to evaluate
 
     hrex : HREX
@@ -1217,9 +1313,12 @@ def verify_and_sanitize_potential_matrix(
     return U_kl
 
 
-def make_u_kl_fxn(trajs, initial_states):
+def make_u_kl_fxn(trajs, initial_states, unbound_impl: custom_ops.Potential | CpuImpl | None = None):
     """fxn(k, l) = "trajs[k] evaluated in ensembles[l]"
 
+    If unbound_impl is None, the summed potential of the initial states is evaluated on the GPU. Pass e.g.
+    `SummedPotential(...).to_cpu().unbound_impl` to evaluate on the CPU instead.
+
     usage note: be careful of axis-ordering convention, see: https://github.com/proteneer/timemachine/issues/1100
     """
 
@@ -1239,10 +1338,11 @@ def make_u_kl_fxn(trajs, initial_states):
         assert_potentials_compatible(s_0.potentials, s.potentials)
         all_params[i] = make_summed_potential(s.potentials).params
 
-    sp_gpu = sp.potential.to_gpu(np.float32)
+    if unbound_impl is None:
+        unbound_impl = sp.potential.to_gpu(np.float32).unbound_impl
 
     def batch_U_fxn(xs, ps, bs, x_idxs, p_idxs):
-        Us = sp_gpu.unbound_impl.execute_batch_sparse(xs, ps, bs, x_idxs, p_idxs, False, False, True)[2]
+        Us = unbound_impl.execute_batch_sparse(xs, ps, bs, x_idxs, p_idxs, False, False, True)[2]
         return np.nan_to_num(Us, nan=+np.inf)
 
     def u_kl(k, l):
@@ -1297,28 +1397,114 @@ def assert_ensembles_compatible(state_a: InitialState, state_b: InitialState):
         assert (state_a.box0 == state_b.box0).all()
 
 
-def compute_u_kn(trajs, initial_states) -> tuple[NDArray, NDArray]:
-    """makes K^2 calls to execute_batch_sparse"""
+def iter_u_kl_batches(
+    trajs: Sequence[Trajectory],
+    initial_states: Sequence[InitialState],
+    unbound_impl: custom_ops.Potential | CpuImpl | None = None,
+    batch_size: int = 100,
+) -> Iterator[tuple[int, int, NDArray]]:
+    """Evaluate reduced energies of all frames of trajs[k] in all states, for each k.
+
+    Frames of each trajectory are loaded once, in batches of up to batch_size frames (streamed from disk for
+    StoredArrays), and each batch is evaluated in all states with a single call to execute_batch. Compared with
+    K^2 calls of `make_u_kl_fxn`, this requires only one neighborlist build per frame.
+
+    Yields
+    ------
+    k, start, u_lb: int, int, array (K, n_batch)
+        u_lb[l, b] is the reduced energy of frame start + b of trajs[k] evaluated in state l
+    """
+    kBTs = [BOLTZ * state.integrator.temperature for state in initial_states]
+    assert len(set(kBTs)) == 1
+    kBT = kBTs[0]
+    assert len(trajs) == len(initial_states)
+
+    s_0 = initial_states[0]
+    sp = make_summed_potential(s_0.potentials)
+    params_by_state = np.array([make_summed_potential(s.potentials).params for s in initial_states])
+    for s in initial_states[1:]:
+        assert_ensembles_compatible(s_0, s)
+        assert_potentials_compatible(s_0.potentials, s.potentials)
+
+    if unbound_impl is None:
+        unbound_impl = sp.potential.to_gpu(np.float32).unbound_impl
+
+    for k, traj in enumerate(trajs):
+        frames = iter(traj.frames)
+        start = 0
+        for n_batch in batches(len(traj.frames), batch_size):
+            coords = np.array(list(islice(frames, n_batch)))
+            boxes = np.asarray(traj.boxes[start : start + n_batch])
+            _, _, U = unbound_impl.execute_batch(coords, params_by_state, boxes, False, False, True)
+            yield k, start, np.nan_to_num(U.T, nan=+np.inf) / kBT
+            start += n_batch
+
+
+def compute_u_kn(
+    trajs,
+    initial_states,
+    unbound_impl: custom_ops.Potential | CpuImpl | None = None,
+    batch_size: int = 100,
+    out: Optional[NDArray] = None,
+) -> tuple[NDArray, NDArray]:
+    """Compute MBAR inputs u_kn and N_k, evaluating all frames of each trajectory in all states using batched calls
+    (see `iter_u_kl_batches`).
+
+    Parameters
+    ----------
+    out: array (K, sum(N_k)), optional
+        Preallocated output array, e.g. a memory-mapped array created with `np.lib.format.open_memmap`, to avoid
+        holding u_kn in memory for large numbers of states and frames
+    """
+    N_k = np.array([len(traj.frames) for traj in trajs])
+    K = len(N_k)
+    assert len(initial_states) == K
+
+    u_kn = np.empty((K, np.sum(N_k))) if out is None else out
+    assert u_kn.shape == (K, np.sum(N_k))
+
+    offsets = np.concatenate([[0], np.cumsum(N_k)])
+    for k, start, u_lb in iter_u_kl_batches(trajs, initial_states, unbound_impl, batch_size):
+        u_kn[:, offsets[k] + start : offsets[k] + start + u_lb.shape[1]] = u_lb
+
+    return u_kn, N_k
+
+
+def compute_u_kln(
+    trajs,
+    initial_states,
+    unbound_impl: custom_ops.Potential | CpuImpl | None = None,
+    batch_size: int = 100,
+    out: Optional[NDArray] = None,
+) -> NDArray:
+    """Compute u_kln[k, l, n], the reduced energy of frame n of trajs[k] evaluated in state l, using batched calls
+    (see `iter_u_kl_batches`). Entries for n >= len(trajs[k].frames) are NaN.
 
-    u_kl = make_u_kl_fxn(trajs, initial_states)
+    Parameters
+    ----------
+    out: array (K, K, max(N_k)), optional
+        Preallocated output array, e.g. a memory-mapped array created with `np.lib.format.open_memmap`
+    """
     N_k = [len(traj.frames) for traj in trajs]
     K = len(N_k)
     assert len(initial_states) == K
 
-    u_kln = np.nan * np.zeros((K, K, max(N_k)))
-    for k in range(K):
-        for l in range(K):
-            u_kln[k, l, : N_k[k]] = u_kl(k, l)
+    u_kln = np.empty((K, K, max(N_k))) if out is None else out
+    assert u_kln.shape == (K, K, max(N_k))
+    for k, n_k in enumerate(N_k):
+        u_kln[k, :, n_k:] = np.nan
+
+    for k, start, u_lb in iter_u_kl_batches(trajs, initial_states, unbound_impl, batch_size):
+        u_kln[k, :, start : start + u_lb.shape[1]] = u_lb
 
-    u_kn = kln_to_kn(u_kln, N_k)
-    return u_kn, np.array(N_k)
+    return u_kln
 
 
 def generate_pair_bar_ulkns(
     initial_states: Sequence[InitialState],
     samples_by_state: Sequence[Trajectory],
     temperature: float,
-    unbound_impls: Sequence[custom_ops.Potential] | None,
+    unbound_impls: Sequence[custom_ops.Potential | CpuImpl] | None,
 ) -> NDArray:
     """Generate pair bair u_klns.
     This is a specialized variant of generating u_klns, only loading each set of frames into memory once.
@@ -1326,6 +1512,9 @@ def generate_pair_bar_ulkns(
     This improves throughput for potentials that use Neighborlists, as there are at most len(frames) neighborlist
     rebuilds, rather than 3 * len(frames).
 
+    If unbound_impls is None, GPU implementations are constructed from the potentials of the first initial state. To
+    evaluate on the CPU, pass `[bp.potential.to_cpu().unbound_impl for bp in initial_states[0].potentials]`.
+
     Returns
     -------
         u_klns: np.array[len(initial_states) - 1, len(unbound_impls), 2, 2, n_frames]
@@ -1342,7 +1531,7 @@ def generate_pair_bar_ulkns(
         (len(initial_states), len(initial_states), len(unbound_impls)), dtype=object
     )
     for i, state in enumerate(initial_states):
-        frames = np.array(samples_by_state[i].frames)
+        frames = np.asarray(samples_by_state[i].frames)
         boxes = np.asarray(samples_by_state[i].boxes)
 
         state_idxs = []
@@ -1380,11 +1569,47 @@ def generate_pair_bar_ulkns(
     return u_kln_by_component_by_lambda
 
 
+class _HostWorkQueue:
+    """Runs host-side work immediately or, if pipelined, in order on a single worker thread.
+
+    At most one unit of work is outstanding: each submission first waits for the previous one, which bounds memory
+    and re-raises any exception from the worker at the next call to submit or wait.
+    """
+
+    def __init__(self, pipelined: bool):
+        self._executor = ThreadPoolExecutor(max_workers=1) if pipelined else None
+        self._pending: Optional[Future] = None
+
+    def submit(self, fn: Callable[..., None], *args):
+        self.wait()
+        if self._executor is None:
+            fn(*args)
+        else:
+            self._pending = self._executor.submit(fn, *args)
+
+    def wait(self):
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            pending.result()
+
+    def shutdown(self):
+        try:
+            self.wait()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+
+
 def run_sims_hrex(
     initial_states: Sequence[InitialState],
     md_params: MDParams,
     n_swap_attempts_per_iter: Optional[int] = None,
     print_diagnostics_interval: Optional[int] = 10,
+    streaming_bar: Optional[StreamingPairBar] = None,
+    banded_u_kn: Optional[BandedUkn] = None,
+    frames_codec: Optional[ChunkCodec] = None,
+    max_pending_frame_writes: int = 0,
+    packed_frames: bool = False,
 ) -> tuple[PairBarResult, list[Trajectory], HREXDiagnostics, WaterSamplingDiagnostics | None]:
     r"""Sample from a sequence of states using nearest-neighbor Hamiltonian Replica EXchange (HREX).
 
@@ -1405,6 +1630,28 @@ def run_sims_hrex(
     print_diagnostics_interval: int or None, optional
         If not None, print diagnostics every N iterations
 
+    streaming_bar: StreamingPairBar or None, optional
+        If not None, updated with the reduced potential matrix of each iteration, giving running pair BAR estimates
+        (printed with diagnostics) without re-evaluating energies over the trajectories. Created internally if
+        md_params.hrex_params.early_stopping_params is set, in which case sampling may stop before md_params.n_frames
+
+    banded_u_kn: BandedUkn or None, optional
+        If not None, the reduced potential matrix of each iteration is appended, e.g. for multi-state MBAR analysis
+        over all states using :py:func:`timemachine.fe.mbar.mbar_banded` without re-evaluating energies. Must be
+        constructed with max_delta_states at least md_params.hrex_params.max_delta_states (ideally equal)
+
+    frames_codec: ChunkCodec or None, optional
+        If not None, used to encode stored frames, e.g. :py:class:`timemachine.fe.chunk_codecs.QuantizeCodec` to
+        reduce the storage used by solvent coordinates
+
+    max_pending_frame_writes: int, optional
+        If greater than zero, stored frames are written to disk on a background thread, with at most this many frames
+        per state queued. See :py:class:`timemachine.fe.stored_arrays.StoredArrays`
+
+    packed_frames: bool, optional
+        If True, stored frames of each state are appended to a single file, rather than written to one file per
+        iteration. See :py:class:`timemachine.fe.stored_arrays.StoredArrays`
+
     Returns
     -------
     PairBarResult
@@ -1418,6 +1665,19 @@ def run_sims_hrex(
     """
 
     assert md_params.hrex_params is not None
+    early_stopping_params = md_params.hrex_params.early_stopping_params
+    if streaming_bar is None and early_stopping_params is not None:
+        streaming_bar = StreamingPairBar(len(initial_states))
+    if streaming_bar is not None:
+        assert streaming_bar.n_states == len(initial_states)
+    if banded_u_kn is not None:
+        assert banded_u_kn.n_states == len(initial_states)
+        # energies computed by HREX but outside of the band would be silently dropped
+        max_delta_states = md_params.hrex_params.max_delta_states or len(initial_states) - 1
+        assert banded_u_kn.max_delta_states >= min(max_delta_states, len(initial_states) - 1), (
+            f"banded_u_kn.max_delta_states={banded_u_kn.max_delta_states} is less than "
+            f"hrex_params.max_delta_states={md_params.hrex_params.max_delta_states}"
+        )
 
     # TODO: to support replica exchange with variable temperatures,
     #  consider modifying sample fxn to rescale velocities by sqrt(T_new/T_orig)
@@ -1465,7 +1725,9 @@ def run_sims_hrex(
 
     hrex = HREX.from_replicas([CoordsVelBox(s.x0, s.v0, s.box0) for s in initial_states])
 
-    samples_by_state: list[Trajectory] = [Trajectory.empty() for _ in initial_states]
+    samples_by_state: list[Trajectory] = [
+        Trajectory.empty(frames_codec, max_pending_frame_writes, packed_frames) for _ in initial_states
+    ]
     replica_idx_by_state_by_iter: list[list[ReplicaIdx]] = []
     water_sampler_proposals_by_state_by_iter: list[list[tuple[int, int]]] = []
     fraction_accepted_by_pair_by_iter: list[list[tuple[int, int]]] = []
@@ -1479,78 +1741,22 @@ def run_sims_hrex(
     begin_loop_time = time.perf_counter()
     last_update_time = begin_loop_time
 
-    for current_frame in range(md_params.n_frames):
-        water_sampling_acceptance_proposal_counts_by_state = [(0, 0) for _ in range(len(initial_states))]
-
-        def sample_replica(xvb: CoordsVelBox, state_idx: StateIdx) -> tuple[NDArray, NDArray, NDArray, Optional[float]]:
-            context.set_x_t(xvb.coords)
-            context.set_v_t(xvb.velocities)
-            context.set_box(xvb.box)
-
-            params = params_by_state[state_idx]
-            bound_potentials[0].set_params(params)
-
-            current_step = current_frame * md_params.steps_per_frame
-            # Setup the MC movers of the Context
-            starting_water_acceptances = 0
-            starting_water_proposals = 0
-            if water_sampler is not None:
-                assert water_params_by_state is not None
-                water_sampler.set_params(water_params_by_state[state_idx])
-                water_sampler.set_step(current_step)
-                starting_water_proposals = water_sampler.n_proposed()
-                starting_water_acceptances = water_sampler.n_accepted()
-            if barostat is not None:
-                barostat.set_step(current_step)
-
-            md_params_replica = replace(
-                md_params,
-                n_frames=1,
-                # Run equilibration as part of the first frame
-                n_eq_steps=md_params.n_eq_steps if current_frame == 0 else 0,
-                seed=state_idx + current_frame,
-            )
-
-            assert md_params_replica.n_frames == 1
-            # Get the next set of frames from the iterator, which will be the only value returned
-            frame, box, final_velos = next(
-                sample_with_context_iter(context, md_params_replica, temperature, ligand_idxs, batch_size=1)
-            )
-            assert frame.shape[0] == 1
-
-            if water_sampler is not None:
-                final_water_proposals = water_sampler.n_proposed() - starting_water_proposals
-                final_water_acceptances = water_sampler.n_accepted() - starting_water_acceptances
-                water_sampling_acceptance_proposal_counts_by_state[state_idx] = (
-                    final_water_acceptances,
-                    final_water_proposals,
-                )
-
-            final_barostat_volume_scale_factor = barostat.get_volume_scale_factor() if barostat is not None else None
-
-            return frame[-1], box[-1], final_velos, final_barostat_volume_scale_factor
-
-        def replica_from_samples(last_sample: tuple[NDArray, NDArray, NDArray, Optional[float]]) -> CoordsVelBox:
-            frame, box, velos, _ = last_sample
-            return CoordsVelBox(frame, velos, box)
-
-        hrex, samples_by_state_iter = hrex.sample_replicas(sample_replica, replica_from_samples)
-        water_sampler_proposals_by_state_by_iter.append(water_sampling_acceptance_proposal_counts_by_state)
-        U_kl_raw = compute_potential_matrix(potential, hrex, params_by_state, md_params.hrex_params.max_delta_states)
-        U_kl = verify_and_sanitize_potential_matrix(U_kl_raw, hrex.replica_idx_by_state)
-        log_q_kl = -U_kl / (BOLTZ * temperature)
-
-        replica_idx_by_state_by_iter.append(hrex.replica_idx_by_state)
-
-        hrex, fraction_accepted_by_pair = hrex.attempt_neighbor_swaps_fast(
-            neighbor_pairs,
-            log_q_kl,
-            n_swap_attempts_per_iter,
-            md_params.seed + current_frame + 1,  # NOTE: "+ 1" is for bitwise compatibility with previous version
-        )
+    def record_iteration(
+        current_frame: int,
+        samples_by_state_iter: Sequence[tuple[NDArray, NDArray, NDArray, Optional[float]]],
+        u_kl_by_state: NDArray,
+        replica_idx_by_state: list[ReplicaIdx],
+        fraction_accepted_by_pair: list[tuple[int, int]],
+        total_accepted_by_pair: Optional[NDArray],
+        current_time: float,
+    ):
+        """Host-side work for an iteration that the next iteration does not depend on"""
+        nonlocal last_update_time
 
-        if len(initial_states) == 2:
-            fraction_accepted_by_pair = fraction_accepted_by_pair[1:]  # remove stats for identity move
+        if streaming_bar is not None:
+            streaming_bar.update(u_kl_by_state)
+        if banded_u_kn is not None:
+            banded_u_kn.append(u_kl_by_state)
 
         for samples, (xs, boxes, velos, final_barostat_volume_scale_factor) in zip(
             samples_by_state, samples_by_state_iter
@@ -1560,10 +1766,8 @@ def run_sims_hrex(
             samples.final_velocities = velos
             samples.final_barostat_volume_scale_factor = final_barostat_volume_scale_factor
 
-        fraction_accepted_by_pair_by_iter.append(fraction_accepted_by_pair)
-
-        if print_diagnostics_interval and (current_frame + 1) % print_diagnostics_interval == 0:
-            current_time = time.perf_counter()
+        if total_accepted_by_pair is not None:
+            assert print_diagnostics_interval
 
             def get_swap_acceptance_rates(fraction_accepted_by_pair):
                 return [
@@ -1572,7 +1776,7 @@ def run_sims_hrex(
                 ]
 
             instantaneous_swap_acceptance_rates = get_swap_acceptance_rates(fraction_accepted_by_pair)
-            average_swap_acceptance_rates = get_swap_acceptance_rates(np.sum(fraction_accepted_by_pair_by_iter, axis=0))
+            average_swap_acceptance_rates = get_swap_acceptance_rates(total_accepted_by_pair)
 
             wall_time_per_frame_current = (current_time - last_update_time) / print_diagnostics_interval
             wall_time_per_frame_average = (current_time - begin_loop_time) / (current_frame + 1)
@@ -1592,11 +1796,136 @@ def run_sims_hrex(
             )
             print("HREX acceptance rates, current:", format_rates(instantaneous_swap_acceptance_rates))
             print("HREX acceptance rates, average:", format_rates(average_swap_acceptance_rates))
-            print("HREX replica permutation      :", hrex.replica_idx_by_state)
+            print("HREX replica permutation      :", replica_idx_by_state)
+            if streaming_bar is not None:
+                dfs, df_errs, overlaps = streaming_bar.estimate()
+                kBT = BOLTZ * temperature
+                print(f"Running pair BAR dG (kJ/mol)  : {np.sum(dfs) * kBT:.2f} +- {np.linalg.norm(df_errs) * kBT:.2f}")
+                print("Running pair BAR overlaps     :", format_rates(overlaps))
             print()
 
             last_update_time = current_time
 
+    host_work = _HostWorkQueue(md_params.hrex_params.pipelined)
+
+    try:
+        for current_frame in range(md_params.n_frames):
+            water_sampling_acceptance_proposal_counts_by_state = [(0, 0) for _ in range(len(initial_states))]
+
+            def sample_replica(
+                xvb: CoordsVelBox, state_idx: StateIdx
+            ) -> tuple[NDArray, NDArray, NDArray, Optional[float]]:
+                context.set_x_t(xvb.coords)
+                context.set_v_t(xvb.velocities)
+                context.set_box(xvb.box)
+
+                params = params_by_state[state_idx]
+                bound_potentials[0].set_params(params)
+
+                current_step = current_frame * md_params.steps_per_frame
+                # Setup the MC movers of the Context
+                starting_water_acceptances = 0
+                starting_water_proposals = 0
+                if water_sampler is not None:
+                    assert water_params_by_state is not None
+                    water_sampler.set_params(water_params_by_state[state_idx])
+                    water_sampler.set_step(current_step)
+                    starting_water_proposals = water_sampler.n_proposed()
+                    starting_water_acceptances = water_sampler.n_accepted()
+                if barostat is not None:
+                    barostat.set_step(current_step)
+
+                md_params_replica = replace(
+                    md_params,
+                    n_frames=1,
+                    # Run equilibration as part of the first frame
+                    n_eq_steps=md_params.n_eq_steps if current_frame == 0 else 0,
+                    seed=state_idx + current_frame,
+                )
+
+                assert md_params_replica.n_frames == 1
+                # Get the next set of frames from the iterator, which will be the only value returned
+                frame, box, final_velos = next(
+                    sample_with_context_iter(context, md_params_replica, temperature, ligand_idxs, batch_size=1)
+                )
+                assert frame.shape[0] == 1
+
+                if water_sampler is not None:
+                    final_water_proposals = water_sampler.n_proposed() - starting_water_proposals
+                    final_water_acceptances = water_sampler.n_accepted() - starting_water_acceptances
+                    water_sampling_acceptance_proposal_counts_by_state[state_idx] = (
+                        final_water_acceptances,
+                        final_water_proposals,
+                    )
+
+                final_barostat_volume_scale_factor = (
+                    barostat.get_volume_scale_factor() if barostat is not None else None
+                )
+
+                return frame[-1], box[-1], final_velos, final_barostat_volume_scale_factor
+
+            def replica_from_samples(last_sample: tuple[NDArray, NDArray, NDArray, Optional[float]]) -> CoordsVelBox:
+                frame, box, velos, _ = last_sample
+                return CoordsVelBox(frame, velos, box)
+
+            hrex, samples_by_state_iter = hrex.sample_replicas(sample_replica, replica_from_samples)
+            water_sampler_proposals_by_state_by_iter.append(water_sampling_acceptance_proposal_counts_by_state)
+            U_kl_raw = compute_potential_matrix(
+                potential, hrex, params_by_state, md_params.hrex_params.max_delta_states
+            )
+            U_kl = verify_and_sanitize_potential_matrix(U_kl_raw, hrex.replica_idx_by_state)
+            log_q_kl = -U_kl / (BOLTZ * temperature)
+
+            # rows of U_kl are indexed by replica; reorder to index by the state of each sample
+            u_kl_by_state = -log_q_kl[hrex.replica_idx_by_state]
+
+            replica_idx_by_state_by_iter.append(hrex.replica_idx_by_state)
+
+            hrex, fraction_accepted_by_pair = hrex.attempt_neighbor_swaps_fast(
+                neighbor_pairs,
+                log_q_kl,
+                n_swap_attempts_per_iter,
+                md_params.seed + current_frame + 1,  # NOTE: "+ 1" is for bitwise compatibility with previous version
+            )
+
+            if len(initial_states) == 2:
+                fraction_accepted_by_pair = fraction_accepted_by_pair[1:]  # remove stats for identity move
+
+            fraction_accepted_by_pair_by_iter.append(fraction_accepted_by_pair)
+
+            print_diagnostics = bool(
+                print_diagnostics_interval and (current_frame + 1) % print_diagnostics_interval == 0
+            )
+            host_work.submit(
+                record_iteration,
+                current_frame,
+                samples_by_state_iter,
+                u_kl_by_state,
+                hrex.replica_idx_by_state,
+                fraction_accepted_by_pair,
+                np.sum(fraction_accepted_by_pair_by_iter, axis=0) if print_diagnostics else None,
+                time.perf_counter(),
+            )
+
+            n_frames_sampled = current_frame + 1
+            if (
+                early_stopping_params is not None
+                and n_frames_sampled >= early_stopping_params.min_frames
+                and n_frames_sampled % early_stopping_params.check_interval == 0
+            ):
+                assert streaming_bar is not None
+                host_work.wait()
+                _, df_errs, _ = streaming_bar.estimate()
+                dG_err = np.linalg.norm(df_errs) * BOLTZ * temperature
+                if dG_err < early_stopping_params.target_dG_err:
+                    print(
+                        f"Estimated dG error {dG_err:.3f} kJ/mol below target "
+                        f"{early_stopping_params.target_dG_err:.3f} kJ/mol. Stopping after {n_frames_sampled} frames."
+                    )
+                    break
+    finally:
+        host_work.shutdown()
+
     # Use the unbound potentials associated with the summed potential once to compute the u_kln
     # Avoids repeated creation of underlying GPU potentials
     assert isinstance(potential, custom_ops.SummedPotential)
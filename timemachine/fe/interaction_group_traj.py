@@ -1,4 +1,4 @@
-from typing import Callable
+from typing import Callable, Optional
 
 import numpy as np
 from jax import jit, vmap
@@ -6,7 +6,7 @@ from jax import numpy as jnp
 from numpy.typing import NDArray as Array
 
 from timemachine.potentials import nonbonded
-from timemachine.potentials.jax_utils import distance2
+from timemachine.potentials.jax_utils import PairListCSR, distance2
 
 Position = Array
 Param = Array
@@ -52,8 +52,34 @@ def env_mask_within_cutoff(x_env, x_lig, box, cutoff):
     return vmap(within_cutoff)(x_env)
 
 
+def env_mask_from_pair_list(pair_list: PairListCSR, env_idxs: Array, n_atoms: int) -> Array:
+    """result[k, i] = True if env_idxs[i] appears in any of the pairs of frame k"""
+    env_positions = np.full(n_atoms, -1)
+    env_positions[env_idxs] = np.arange(len(env_idxs))
+
+    not_padding = np.asarray(pair_list.mask)
+    frame_idxs = np.asarray(pair_list.frame_idxs)[not_padding]
+    pairs = np.asarray(pair_list.pairs)[not_padding]
+
+    mask = np.zeros((pair_list.n_frames, len(env_idxs)), dtype=bool)
+    for col in range(2):
+        positions = env_positions[pairs[:, col]]
+        is_env = positions >= 0
+        mask[frame_idxs[is_env], positions[is_env]] = True
+    return mask
+
+
 class InteractionGroupTraj:
-    def __init__(self, xs: Array, box_diags: Array, ligand_idxs: Array, env_idxs: Array, cutoff=1.2, verbose=True):
+    def __init__(
+        self,
+        xs: Array,
+        box_diags: Array,
+        ligand_idxs: Array,
+        env_idxs: Array,
+        cutoff=1.2,
+        verbose=True,
+        pair_list: Optional[PairListCSR] = None,
+    ):
         r"""support [U_ig(x; params) for x in traj]
 
         where U_ig = \sum_i \sum_j pair_fxn(||x_j - x_j||; params_i, params_j)
@@ -68,10 +94,15 @@ class InteractionGroupTraj:
         env_idxs : int array (subset of arange(N))
         cutoff : float
         verbose: bool
+        pair_list: Optional[PairListCSR]
+            (ligand, env) pairs within cutoff in each frame, e.g. computed using
+            `get_interacting_pair_indices_csr(xs, boxes, pairs_from_interaction_groups(ligand_idxs, env_idxs), cutoff)`.
+            If None, computed using a naive jax implementation.
 
         Notes
         -----
-        * Constructor precomputes neighborlist using a naive jax implementation, which is expensive, but done once
+        * If pair_list is not provided, constructor precomputes neighborlist using a naive jax implementation, which is
+            expensive, but done once
             TODO: extract from GPU neighborlist
         * Assumes pair_fxn(r) == 0 when r >= cutoff, but does not confirm or enforce this
         """
@@ -90,12 +121,16 @@ class InteractionGroupTraj:
         if verbose:
             print(f"precomputing neighborlist on ({num_lig}, {num_env}) interaction group, at cutoff={cutoff}")
 
-        # note: vmap here can consume excessive memory if len(env_idxs) * len(xs) is large -> python loop
-        # mask = vmap(env_mask_within_cutoff, (0,0,0,None))(_xs_env, self.xs_lig, boxes, cutoff)
-        def f(x_env, x_lig, box):
-            return env_mask_within_cutoff(x_env, x_lig, box, cutoff)
+        if pair_list is not None:
+            mask = env_mask_from_pair_list(pair_list, env_idxs, xs.shape[1])
+        else:
+            # note: vmap here can consume excessive memory if len(env_idxs) * len(xs) is large -> python loop
+            # mask = vmap(env_mask_within_cutoff, (0,0,0,None))(_xs_env, self.xs_lig, boxes, cutoff)
+            def f(x_env, x_lig, box):
+                return env_mask_within_cutoff(x_env, x_lig, box, cutoff)
 
-        mask = np.array([f(_xs_env[i], self.xs_lig[i], np.diag(box_diags[i])) for i in range(self.n_frames)])
+            mask = np.array([f(_xs_env[i], self.xs_lig[i], np.diag(box_diags[i])) for i in range(self.n_frames)])
+        assert mask.shape == (self.n_frames, num_env)
 
         padded_num_env_atoms = mask.sum(1).max()
 
@@ -0,0 +1,248 @@
+import warnings
+from functools import partial
+from typing import Optional
+
+import jax
+import jax.experimental
+import jax.numpy as jnp
+import numpy as np
+from jax.scipy.special import logsumexp
+from numpy.typing import NDArray
+
+DEFAULT_TOLERANCE = 1e-10  # absolute tolerance on f_k, in reduced units
+DEFAULT_MAXIMUM_ITERATIONS = 1_000
+
+
+class MBARConvergenceWarning(UserWarning):
+    pass
+
+
+class BandedUkn:
+    """Reduced energies of samples from each of K states, evaluated only in states within a band around the state of
+    each sample. Uses memory proportional to N * (2 * max_delta_states + 1), rather than N * K for a dense u_kn matrix.
+
+    This matches the potential matrix computed by HREX with HREXParams.max_delta_states, where energies of samples in
+    states outside the band are not computed (and are set to inf).
+
+    Examples
+    --------
+    >>> u_kl = np.array([[0.0, 1.0, np.inf], [2.0, 0.0, 1.0], [np.inf, 2.0, 0.0]])
+    >>> banded_u_kn = BandedUkn(n_states=3, max_delta_states=1)
+    >>> banded_u_kn.append(u_kl)
+    >>> banded_u_kn.N_k
+    array([1, 1, 1])
+    """
+
+    def __init__(self, n_states: int, max_delta_states: Optional[int] = None):
+        """
+        Parameters
+        ----------
+        n_states: int
+            Number of states K
+
+        max_delta_states: int or None
+            Half-width of the band. If None, all energies are stored (equivalent to max_delta_states = K - 1)
+        """
+        self.n_states = n_states
+        self.max_delta_states = max_delta_states if max_delta_states is not None else n_states - 1
+        assert self.max_delta_states > 0
+        self._u_bands: list[NDArray] = []
+        self._state_idxs: list[NDArray] = []
+
+    @property
+    def offsets(self) -> NDArray:
+        """Offsets of the states in the band relative to the state of each sample"""
+        return np.arange(-self.max_delta_states, self.max_delta_states + 1)
+
+    def append(self, u_kl: NDArray, state_idxs: Optional[NDArray] = None):
+        """Add samples.
+
+        Parameters
+        ----------
+        u_kl: array (n_samples, K)
+            u_kl[n, l] is the reduced energy of sample n evaluated in state l. Entries outside the band may be inf, and
+            are not stored
+
+        state_idxs: int array (n_samples,), optional
+            State from which each sample was drawn. Defaults to arange(K), i.e. one sample from each state, as for the
+            state-ordered potential matrix of an HREX iteration
+        """
+        u_kl = np.asarray(u_kl)
+        assert u_kl.ndim == 2 and u_kl.shape[1] == self.n_states
+        state_idxs = np.arange(self.n_states) if state_idxs is None else np.asarray(state_idxs)
+        assert state_idxs.shape == (len(u_kl),)
+
+        band_state_idxs = state_idxs[:, None] + self.offsets[None, :]
+        in_range = (0 <= band_state_idxs) & (band_state_idxs < self.n_states)
+        u_band = np.where(
+            in_range, np.take_along_axis(u_kl, np.clip(band_state_idxs, 0, self.n_states - 1), axis=1), np.inf
+        )
+        self._u_bands.append(u_band)
+        self._state_idxs.append(state_idxs)
+
+    @property
+    def u_band(self) -> NDArray:
+        """Array (N, 2 * max_delta_states + 1) of reduced energies, where u_band[n, b] is the energy of sample n in
+        state state_idxs[n] + offsets[b]"""
+        return np.concatenate(self._u_bands) if self._u_bands else np.empty((0, len(self.offsets)))
+
+    @property
+    def state_idxs(self) -> NDArray:
+        return np.concatenate(self._state_idxs) if self._state_idxs else np.empty(0, dtype=int)
+
+    @property
+    def N_k(self) -> NDArray:
+        return np.bincount(self.state_idxs, minlength=self.n_states)
+
+    def to_u_kn(self) -> NDArray:
+        """Returns the dense (K, N) u_kn matrix expected by pymbar.MBAR, with inf outside of the band"""
+        u_band, state_idxs = self.u_band, self.state_idxs
+        u_kn = np.full((self.n_states, len(state_idxs)), np.inf)
+        band_state_idxs = state_idxs[:, None] + self.offsets[None, :]
+        sample_idxs, band_idxs = np.nonzero((0 <= band_state_idxs) & (band_state_idxs < self.n_states))
+        u_kn[band_state_idxs[sample_idxs, band_idxs], sample_idxs] = u_band[sample_idxs, band_idxs]
+        return u_kn
+
+
+@partial(jax.jit, static_argnames=("n_states", "compute_gram"))
+def _mbar_terms(f_k, u_band, band_state_idxs, log_N_k, n_states: int, compute_gram: bool):
+    """Returns log(sum_n W_nk) and (optionally) the Gram matrix sum_n W_nk W_nl of the MBAR weight matrix
+    W_nk = exp(f_k - u_kn) / sum_j N_j exp(f_j - u_jn), evaluated using only the entries in the band"""
+    valid = jnp.isfinite(u_band)
+    idxs = jnp.clip(band_state_idxs, 0, n_states - 1)
+    log_q = jnp.where(valid, f_k[idxs] - u_band, -jnp.inf)
+    log_denom = logsumexp(log_q + jnp.where(valid, log_N_k[idxs], 0.0), axis=1)
+    log_w = log_q - log_denom[:, None]
+
+    # log(sum_n W_nk), accumulated by state index
+    flat_idxs = idxs.ravel()
+    log_w_max = jax.ops.segment_max(log_w.ravel(), flat_idxs, n_states)
+    log_w_max = jnp.where(jnp.isfinite(log_w_max), log_w_max, 0.0)
+    log_sum_w = log_w_max + jnp.log(
+        jax.ops.segment_sum(jnp.exp(log_w.ravel() - log_w_max[flat_idxs]), flat_idxs, n_states)
+    )
+
+    if not compute_gram:
+        return log_sum_w, None
+
+    # sum_n W_nk W_nl, accumulated one band offset at a time to bound memory
+    w = jnp.exp(log_w)
+
+    def gram_terms(b):
+        pair_idxs = idxs[:, b, None] * n_states + idxs
+        return jax.ops.segment_sum((w[:, b, None] * w).ravel(), pair_idxs.ravel(), n_states * n_states)
+
+    gram = jnp.sum(jax.lax.map(gram_terms, jnp.arange(u_band.shape[1])), axis=0).reshape(n_states, n_states)
+    return log_sum_w, gram
+
+
+def mbar_banded(
+    banded_u_kn: BandedUkn,
+    initial_f_k: Optional[NDArray] = None,
+    tolerance: float = DEFAULT_TOLERANCE,
+    maximum_iterations: int = DEFAULT_MAXIMUM_ITERATIONS,
+    compute_uncertainty: bool = True,
+) -> tuple[NDArray, Optional[NDArray]]:
+    """Solve the MBAR equations for all K states given reduced energies in a band around the state of each sample.
+
+    Energies outside of the band are taken to be infinite, i.e. samples are assumed to have negligible weight in
+    states far from the state they were drawn from. With a band that includes all states, this is equivalent to
+    pymbar.MBAR.
+
+    Each iteration takes either a Newton step or a self-consistent iteration step, whichever gives the smaller
+    gradient norm (as in pymbar's "adaptive" solver). All intermediates have size O(N * band width + K^2).
+
+    Parameters
+    ----------
+    banded_u_kn: BandedUkn
+        reduced energies; all states must have at least one sample
+
+    initial_f_k: array (K,), optional
+        initial guess, e.g. cumulative pair BAR estimates
+
+    tolerance: float
+        absolute tolerance on f_k
+
+    maximum_iterations: int
+        maximum number of iterations. If the tolerance is not met within this number of iterations, an
+        MBARConvergenceWarning is issued and the last iterate is returned
+
+    compute_uncertainty: bool
+        whether to compute uncertainties
+
+    Returns
+    -------
+    f_k: array (K,)
+        reduced free energies relative to state 0
+
+    df_ij: array (K, K) or None
+        uncertainty in f_j - f_i, estimated as in pymbar.MBAR.compute_free_energy_differences
+    """
+    K = banded_u_kn.n_states
+    N_k = banded_u_kn.N_k
+    assert np.all(N_k > 0), "all states must have at least one sample"
+
+    with jax.experimental.enable_x64():
+        u_band = jnp.asarray(banded_u_kn.u_band, dtype=jnp.float64)
+        band_state_idxs = jnp.asarray(banded_u_kn.state_idxs[:, None] + banded_u_kn.offsets[None, :])
+        log_N_k = jnp.log(jnp.asarray(N_k, dtype=jnp.float64))
+        terms = partial(_mbar_terms, u_band=u_band, band_state_idxs=band_state_idxs, log_N_k=log_N_k, n_states=K)
+
+        def gradient_norm(log_sum_w):
+            return np.linalg.norm(N_k * np.expm1(np.asarray(log_sum_w)))
+
+        f_k = np.zeros(K) if initial_f_k is None else np.asarray(initial_f_k, dtype=np.float64)
+        f_k = f_k - f_k[0]
+
+        converged = False
+        max_step = np.inf
+        for _ in range(maximum_iterations):
+            log_sum_w_, gram = terms(jnp.asarray(f_k), compute_gram=True)
+            log_sum_w = np.asarray(log_sum_w_)
+
+            # self-consistent iteration
+            f_k_sc = f_k - log_sum_w
+            f_k_sc -= f_k_sc[0]
+
+            # Newton step on f_k[1:], with f_k[0] = 0 fixed
+            sum_w = np.exp(log_sum_w)
+            hessian = np.diag(N_k * sum_w) - np.outer(N_k, N_k) * np.asarray(gram)
+            gradient = N_k * (sum_w - 1.0)
+            f_k_newton = f_k.copy()
+            f_k_newton[1:] -= np.linalg.solve(hessian[1:, 1:], gradient[1:])
+
+            f_k_next = f_k_sc
+            if np.all(np.isfinite(f_k_newton)):
+                gradient_norm_newton = gradient_norm(terms(jnp.asarray(f_k_newton), compute_gram=False)[0])
+                gradient_norm_sc = gradient_norm(terms(jnp.asarray(f_k_sc), compute_gram=False)[0])
+                if gradient_norm_newton < gradient_norm_sc:
+                    f_k_next = f_k_newton
+
+            max_step = np.max(np.abs(f_k_next - f_k))
+            converged = max_step < tolerance
+            f_k = f_k_next
+            if converged:
+                break
+
+        if not converged:
+            warnings.warn(
+                f"MBAR did not converge in {maximum_iterations} iterations: "
+                f"last step {max_step:.3g} exceeds tolerance {tolerance:.3g}",
+                MBARConvergenceWarning,
+            )
+
+        if not compute_uncertainty:
+            return f_k, None
+
+        # Asymptotic covariance of f_k from the weight matrix W = U S V^T (as in pymbar), using only the Gram matrix
+        # W^T W = V S^2 V^T, so that the (N, K) weight matrix is never formed
+        _, gram = terms(jnp.asarray(f_k), compute_gram=True)
+        s2, V = np.linalg.eigh(np.asarray(gram))
+        S = np.diag(np.sqrt(np.clip(s2, 0.0, None)))
+        inner = np.eye(K) - S @ V.T @ np.diag(N_k) @ V @ S
+        theta = V @ S @ np.linalg.pinv(inner, rcond=1e-10) @ S @ V.T
+        diag = np.diag(theta)
+        d2 = diag[:, None] + diag[None, :] - 2 * theta
+        df_ij = np.sqrt(np.clip(d2, 0.0, None))
+
+    return f_k, df_ij
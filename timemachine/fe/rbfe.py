@@ -3,12 +3,10 @@ import warnings
 from collections.abc import Iterable, Sequence
 from dataclasses import dataclass, replace
 from functools import partial
-from typing import Callable, Optional, Union, cast
+from typing import TYPE_CHECKING, Callable, Optional, Union, cast
 
 import numpy as np
 from numpy.typing import NDArray
-from openmm import app
-from pymbar.mbar import MBAR
 from rdkit import Chem
 
 from timemachine.constants import DEFAULT_POSITIONAL_RESTRAINT_K, DEFAULT_PRESSURE, DEFAULT_TEMP
@@ -31,23 +29,25 @@ from timemachine.fe.free_energy import (
     run_sims_sequential,
 )
 from timemachine.fe.lambda_schedule import bisection_lambda_schedule
-from timemachine.fe.plots import (
-    plot_as_png_fxn,
-    plot_hrex_replica_state_distribution_heatmap,
-    plot_hrex_swap_acceptance_rates_convergence,
-    plot_hrex_transition_matrix,
-)
 from timemachine.fe.rest.single_topology import SingleTopologyREST
 from timemachine.fe.single_topology import AtomMapFlags, SingleTopology, assert_default_system_constraints
 from timemachine.fe.system import HostSystem
 from timemachine.fe.utils import bytes_to_id, get_mol_name, get_romol_conf
 from timemachine.ff import Forcefield
 from timemachine.lib import LangevinIntegrator, MonteCarloBarostat
-from timemachine.md import builders, minimizer
+from timemachine.md import minimizer
 from timemachine.md.barostat.utils import get_bond_list, get_group_indices
 from timemachine.md.thermostat.utils import sample_velocities
 from timemachine.optimize.protocol import greedily_optimize_protocol, make_fast_approx_overlap_distance_fxn
 from timemachine.potentials import BoundPotential, jax_utils
+from timemachine.utils import lazy_import
+
+if TYPE_CHECKING:
+    from openmm import app
+
+builders = lazy_import("timemachine.md.builders")
+fe_plots = lazy_import("timemachine.fe.plots")
+pymbar = lazy_import("pymbar")
 
 DEFAULT_NUM_WINDOWS = 48
 
@@ -77,7 +77,7 @@ class Host:
     conf: NDArray
     box: NDArray
     num_water_atoms: int
-    omm_topology: app.topology.Topology
+    omm_topology: "app.topology.Topology"
 
 
 def _get_default_state_minimization_config() -> minimizer.MinimizationConfig:
@@ -305,7 +305,7 @@ def rebalance_lambda_schedule(
     lambda_max = max(initial_lambs)
 
     u_kn, n_k = compute_u_kn(trajectories, initial_states)
-    mbar = MBAR(
+    mbar = pymbar.MBAR(
         u_kn,
         n_k,
         maximum_iterations=DEFAULT_MAXIMUM_ITERATIONS,
@@ -908,19 +908,22 @@ def estimate_relative_free_energy_bisection_hrex_impl(
             replace(md_params, n_eq_steps=0),  # using pre-equilibrated samples
         )
 
+        # sampling may have stopped early; record the number of frames actually sampled
+        md_params = replace(md_params, n_frames=len(trajectories_by_state[0].frames))
+
         plots = make_pair_bar_plots(pair_bar_result, temperature, combined_prefix)
 
         hrex_plots = HREXPlots(
-            transition_matrix_png=plot_as_png_fxn(
-                plot_hrex_transition_matrix, hrex_diagnostics.transition_matrix, prefix=combined_prefix
+            transition_matrix_png=fe_plots.plot_as_png_fxn(
+                fe_plots.plot_hrex_transition_matrix, hrex_diagnostics.transition_matrix, prefix=combined_prefix
             ),
-            swap_acceptance_rates_convergence_png=plot_as_png_fxn(
-                plot_hrex_swap_acceptance_rates_convergence,
+            swap_acceptance_rates_convergence_png=fe_plots.plot_as_png_fxn(
+                fe_plots.plot_hrex_swap_acceptance_rates_convergence,
                 hrex_diagnostics.cumulative_swap_acceptance_rates,
                 prefix=combined_prefix,
             ),
-            replica_state_distribution_heatmap_png=plot_as_png_fxn(
-                plot_hrex_replica_state_distribution_heatmap,
+            replica_state_distribution_heatmap_png=fe_plots.plot_as_png_fxn(
+                fe_plots.plot_hrex_replica_state_distribution_heatmap,
                 hrex_diagnostics.cumulative_replica_state_counts,
                 [state.lamb for state in initial_states_hrex],
                 prefix=combined_prefix,
@@ -1137,7 +1140,7 @@ def run_complex(
     mol_b: Chem.rdchem.Mol,
     core: NDArray,
     forcefield: Forcefield,
-    protein: Union[app.PDBFile, str],
+    protein: Union["app.PDBFile", str],
     md_params: MDParams = DEFAULT_HREX_PARAMS,
     n_windows: Optional[int] = None,
     min_overlap: Optional[float] = None,
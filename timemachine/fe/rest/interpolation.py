@@ -3,10 +3,13 @@
 from dataclasses import dataclass
 from typing import Generic, Literal, Protocol, TypeVar
 
-import matplotlib.pyplot as plt
 import numpy as np
 from numpy.typing import ArrayLike, NDArray
 
+from timemachine.utils import lazy_import
+
+plt = lazy_import("matplotlib.pyplot")
+
 
 class InterpolationFxn(Protocol):
     @property
@@ -1,11 +1,11 @@
 from dataclasses import replace
 from functools import cached_property
+from typing import TYPE_CHECKING
 
 import jax.numpy as jnp
 import networkx as nx
 import numpy as np
 from numpy.typing import NDArray
-from openmm import app
 from rdkit import Chem
 
 from timemachine.constants import NBParamIdx
@@ -18,6 +18,9 @@ from .bond import CanonicalBond, CanonicalProper, mkbond, mkproper
 from .interpolation import InterpolationFxn, InterpolationFxnName, Symmetric, get_interpolation_fxn
 from .queries import get_aliphatic_ring_bonds, get_rotatable_bonds
 
+if TYPE_CHECKING:
+    from openmm import app
+
 
 def get_temperature_scale_interpolation_fxn(
     max_temperature_scale: float, interpolation: InterpolationFxnName
@@ -257,7 +260,7 @@ class SingleTopologyREST(SingleTopology):
         lamb: float,
         num_water_atoms: int,
         ff: Forcefield,
-        omm_topology: app.topology.Topology,
+        omm_topology: "app.topology.Topology",
     ) -> HostGuestSystem:
         ref_state = super().combine_with_host(host_system, lamb, num_water_atoms, ff, omm_topology)
 
@@ -1,4 +1,5 @@
 __all__ = [
+    "chunked_one_sided_exp",
     "construct_endpoint_reweighting_estimator",
     "construct_mixture_reweighting_estimator",
     "interpret_as_mixture_potential",
@@ -6,8 +7,9 @@ __all__ = [
 ]
 
 from collections.abc import Collection
-from typing import Callable
+from typing import Any, Callable, Optional
 
+import jax
 import numpy as np
 from jax import Array
 from jax import numpy as jnp
@@ -51,7 +53,9 @@ def one_sided_exp(delta_us: ArrayLike) -> Array:
     return -estimate_log_z_ratio(-delta_us)
 
 
-def interpret_as_mixture_potential(u_kn: ArrayLike, f_k: ArrayLike, N_k: ArrayLike) -> Array:
+def interpret_as_mixture_potential(
+    u_kn: ArrayLike, f_k: ArrayLike, N_k: ArrayLike, chunk_size: Optional[int] = None
+) -> Array:
     r"""Interpret samples from multiple states k as if they originate from a single state
     defined as a weighted mixture:
 
@@ -75,6 +79,11 @@ def interpret_as_mixture_potential(u_kn: ArrayLike, f_k: ArrayLike, N_k: ArrayLi
     N_k : [K,] int array
         number of samples from each individual state
         (sum(N_k) must equal N)
+    chunk_size : int, optional
+        if given, process u_kn in chunks of chunk_size samples. If u_kn is a jax array, chunks are processed using
+        lax.map (so that this function can be traced). Otherwise, u_kn is kept on the host and chunks are transferred
+        to device one at a time, so that only a [K, chunk_size] block of u_kn is on device at a time (u_kn may then be
+        e.g. a memory-mapped numpy array)
 
     Returns
     -------
@@ -107,7 +116,10 @@ def interpret_as_mixture_potential(u_kn: ArrayLike, f_k: ArrayLike, N_k: ArrayLi
     [3] [Elvira+, 2019] Generalized multiple importance sampling
         https://arxiv.org/abs/1511.03095
     """
-    u_kn = jnp.asarray(u_kn)
+    if chunk_size is None or isinstance(u_kn, jax.Array):
+        u_kn = jnp.asarray(u_kn)
+    else:
+        u_kn = np.asarray(u_kn)  # keep on host; transferred to device one chunk at a time
     f_k = jnp.asarray(f_k)
 
     # one-liner: mixture_u_n = -logsumexp(f_k - u_kn.T, b=N_k, axis=1)
@@ -118,29 +130,95 @@ def interpret_as_mixture_potential(u_kn: ArrayLike, f_k: ArrayLike, N_k: ArrayLi
     N_k = np.array(N_k)
     assert np.sum(N_k) == N
 
-    # q_k(x_n) = exp(-u_k(x_n))
-    log_q_kn = -u_kn
-
     # p_k(x_n) = c q_k(x_n) / Z_k
     # (up to a single undetermined constant c, shared across k)
     log_Z_k = -f_k
-    normalized_log_q_kn = log_q_kn - jnp.expand_dims(log_Z_k, 1)
 
     # mixture weights from sampling proportions
     log_w_k = jnp.log(N_k) - jnp.log(jnp.sum(N_k))
 
-    # q_mix(x_n) = \sum_k w_k p_k(x_n)
-    weighted_log_q_kn = jnp.expand_dims(log_w_k, 1) + normalized_log_q_kn
-    mixture_log_q_n = logsumexp(weighted_log_q_kn, axis=0)
+    def mixture_u(u_kn_block: ArrayLike) -> Array:
+        # q_k(x_n) = exp(-u_k(x_n))
+        log_q_kn = -jnp.asarray(u_kn_block)
+
+        normalized_log_q_kn = log_q_kn - jnp.expand_dims(log_Z_k, 1)
+
+        # q_mix(x_n) = \sum_k w_k p_k(x_n)
+        weighted_log_q_kn = jnp.expand_dims(log_w_k, 1) + normalized_log_q_kn
+        mixture_log_q_n = logsumexp(weighted_log_q_kn, axis=0)
 
-    # q_mix(x_n) = exp(-u_mix(x_n))
-    mixture_u_n = -mixture_log_q_n
+        # q_mix(x_n) = exp(-u_mix(x_n))
+        return -mixture_log_q_n
+
+    if chunk_size is None:
+        mixture_u_n = mixture_u(u_kn)
+    elif isinstance(u_kn, jax.Array):
+        chunked_u_nk, _ = _to_chunks(u_kn.T, chunk_size)
+        mixture_u_n = jax.lax.map(lambda u_nk: mixture_u(u_nk.T), chunked_u_nk).reshape(-1)[:N]
+    else:
+        mixture_u_n = jnp.concatenate(
+            [mixture_u(u_kn[:, start : start + chunk_size]) for start in range(0, N, chunk_size)]
+        )
 
     assert mixture_u_n.shape == (N,)
 
     return mixture_u_n
 
 
+def _to_chunks(x: ArrayLike, chunk_size: int) -> tuple[Array, Array]:
+    """Pad x along the leading axis to a multiple of chunk_size, by repeating the last element, and reshape to
+    (n_chunks, chunk_size, ...). Also returns a mask of shape (n_chunks, chunk_size) that is False for padding."""
+    x = jnp.asarray(x)
+    n = len(x)
+    assert n > 0 and chunk_size > 0
+    n_chunks = -(-n // chunk_size)
+    pad_width = [(0, n_chunks * chunk_size - n)] + [(0, 0)] * (x.ndim - 1)
+    chunked_x = jnp.pad(x, pad_width, mode="edge").reshape(n_chunks, chunk_size, *x.shape[1:])
+    mask = (jnp.arange(n_chunks * chunk_size) < n).reshape(n_chunks, chunk_size)
+    return chunked_x, mask
+
+
+def _tree_to_chunks(xs: Any, chunk_size: int) -> tuple[Any, Array]:
+    """`_to_chunks` applied to each leaf of a pytree of arrays with a common leading axis"""
+    leaves, treedef = jax.tree_util.tree_flatten(xs)
+    assert len({len(leaf) for leaf in leaves}) == 1, "leaves must have a common leading axis"
+    chunked_leaves, masks = zip(*[_to_chunks(leaf, chunk_size) for leaf in leaves])
+    return jax.tree_util.tree_unflatten(treedef, chunked_leaves), masks[0]
+
+
+def _one_sided_exp_over_chunks(
+    delta_us_fxn: Callable[[Params, Any], Array], params: Params, chunked_xs: Any, mask: Array
+) -> Array:
+    """`chunked_one_sided_exp`, given chunked_xs and mask computed by `_tree_to_chunks`"""
+
+    @jax.checkpoint
+    def chunk_log_sum(p, xs_chunk, mask_chunk):
+        return logsumexp(jnp.where(mask_chunk, -delta_us_fxn(p, xs_chunk), -jnp.inf))
+
+    def accumulate(log_sum, chunk):
+        xs_chunk, mask_chunk = chunk
+        return jnp.logaddexp(log_sum, chunk_log_sum(params, xs_chunk, mask_chunk)), None
+
+    log_sum, _ = jax.lax.scan(accumulate, jnp.array(-jnp.inf), (chunked_xs, mask))
+    return -(log_sum - jnp.log(jnp.sum(mask)))
+
+
+def chunked_one_sided_exp(
+    delta_us_fxn: Callable[[Params, Any], Array], params: Params, xs: Any, chunk_size: int
+) -> Array:
+    """exponential averaging of delta_us = delta_us_fxn(params, xs), evaluated chunk by chunk
+
+    xs is an array, or a pytree (e.g. tuple) of arrays, with a common leading axis of length n. It is padded to a
+    multiple of chunk_size (by repeating the last element) and split into chunks; each chunk is reduced to the
+    logsumexp of -delta_us_fxn(params, xs_chunk) with padding masked out, and chunks are combined with a numerically
+    stable running logsumexp using lax.scan. Chunks are rematerialized in the backward pass (using jax.checkpoint), so
+    that memory for intermediates is bounded by chunk_size, including under jax.jit and when differentiating with
+    respect to params. delta_us_fxn must be traceable by jax.
+    """
+    chunked_xs, mask = _tree_to_chunks(xs, chunk_size)
+    return _one_sided_exp_over_chunks(delta_us_fxn, params, chunked_xs, mask)
+
+
 def construct_endpoint_reweighting_estimator(
     samples_0: Samples,
     samples_1: Samples,
@@ -148,6 +226,7 @@ def construct_endpoint_reweighting_estimator(
     batched_u_1_fxn: BatchedReducedPotentialFxn,
     ref_params: Params,
     ref_delta_f: float,
+    chunk_size: Optional[int] = None,
 ) -> Callable[[Params], Array]:
     """assuming
     * endpoint samples (samples_0, samples_1)
@@ -174,6 +253,10 @@ def construct_endpoint_reweighting_estimator(
     ref_delta_f
         free energy difference between endstates 0, 1 at ref_params
         ref_delta_f ~= f(ref_params, 1) - f(ref_params, 0)
+    chunk_size
+        if given, evaluate energies for chunks of chunk_size samples at a time, combining chunks with a running
+        logsumexp (see `chunked_one_sided_exp`). Samples must be arrays (or tuples of arrays) with a leading sample
+        axis, and batched_u_*_fxn must be traceable by jax
 
     Returns
     -------
@@ -185,6 +268,11 @@ def construct_endpoint_reweighting_estimator(
         * estimate_delta_f(params) can become unreliable when
           params is very different from ref_params
     """
+    if chunk_size is not None:
+        return _construct_chunked_endpoint_reweighting_estimator(
+            samples_0, samples_1, batched_u_0_fxn, batched_u_1_fxn, ref_params, ref_delta_f, chunk_size
+        )
+
     ref_u_0 = batched_u_0_fxn(samples_0, ref_params)
     ref_u_1 = batched_u_1_fxn(samples_1, ref_params)
 
@@ -223,11 +311,45 @@ def construct_endpoint_reweighting_estimator(
     return estimate_delta_f
 
 
+def _construct_chunked_endpoint_reweighting_estimator(
+    samples_0: Samples,
+    samples_1: Samples,
+    batched_u_0_fxn: BatchedReducedPotentialFxn,
+    batched_u_1_fxn: BatchedReducedPotentialFxn,
+    ref_params: Params,
+    ref_delta_f: float,
+    chunk_size: int,
+) -> Callable[[Params], Array]:
+    chunked_samples_0, mask_0 = _tree_to_chunks(samples_0, chunk_size)
+    chunked_samples_1, mask_1 = _tree_to_chunks(samples_1, chunk_size)
+
+    # reference energies of padded samples are finite, and are masked out in the estimates
+    ref_u_0 = jax.lax.map(lambda samples: batched_u_0_fxn(samples, ref_params), chunked_samples_0)
+    ref_u_1 = jax.lax.map(lambda samples: batched_u_1_fxn(samples, ref_params), chunked_samples_1)
+
+    def endpoint_correction(chunked_samples, mask, batched_u_fxn, ref_u, params) -> Array:
+        def delta_us_fxn(p, chunk):
+            samples, ref_u = chunk
+            return batched_u_fxn(samples, p) - ref_u
+
+        return _one_sided_exp_over_chunks(delta_us_fxn, params, (chunked_samples, ref_u), mask)
+
+    def estimate_delta_f(params: Params) -> Array:
+        return (
+            ref_delta_f
+            - endpoint_correction(chunked_samples_0, mask_0, batched_u_0_fxn, ref_u_0, params)
+            + endpoint_correction(chunked_samples_1, mask_1, batched_u_1_fxn, ref_u_1, params)
+        )
+
+    return estimate_delta_f
+
+
 def construct_mixture_reweighting_estimator(
     samples_n: Samples,
     u_ref_n: ArrayLike,
     batched_u_0_fxn: BatchedReducedPotentialFxn,
     batched_u_1_fxn: BatchedReducedPotentialFxn,
+    chunk_size: Optional[int] = None,
 ) -> Callable[[Params], Array]:
     r"""assuming
     * samples x_n from a distribution p_ref(x) \propto(exp(-u_ref(x))
@@ -250,6 +372,10 @@ def construct_mixture_reweighting_estimator(
     batched_u_1_fxn
         computes batch of endstate 1 energies at specified params
         [u_1(x, params) for x in samples_n]
+    chunk_size
+        if given, evaluate energies for chunks of chunk_size samples at a time, combining chunks with a running
+        logsumexp (see `chunked_one_sided_exp`). samples_n must be an array (or tuple of arrays) with a leading sample
+        axis, and batched_u_*_fxn must be traceable by jax
 
     Returns
     -------
@@ -285,15 +411,26 @@ def construct_mixture_reweighting_estimator(
     u_ref_n = jnp.asarray(u_ref_n)
     assert len(samples_n) == len(u_ref_n)
 
+    if chunk_size is not None:
+        chunked_samples_and_u_ref, mask = _tree_to_chunks((samples_n, u_ref_n), chunk_size)
+
+    def reweight(batched_u_fxn: BatchedReducedPotentialFxn, params) -> Array:
+        if chunk_size is None:
+            return one_sided_exp(batched_u_fxn(samples_n, params) - u_ref_n)
+
+        def delta_us_fxn(p, chunk):
+            samples, u_ref = chunk
+            return batched_u_fxn(samples, p) - u_ref
+
+        return _one_sided_exp_over_chunks(delta_us_fxn, params, chunked_samples_and_u_ref, mask)
+
     def f_0(params):
         """estimate f(params, 0) - f(ref) by reweighting"""
-        u_0_n = batched_u_0_fxn(samples_n, params)
-        return one_sided_exp(u_0_n - u_ref_n)
+        return reweight(batched_u_0_fxn, params)
 
     def f_1(params) -> Array:
         """estimate f(params, 1) - f(ref) by reweighting"""
-        u_1_n = batched_u_1_fxn(samples_n, params)
-        return one_sided_exp(u_1_n - u_ref_n)
+        return reweight(batched_u_1_fxn, params)
 
     def estimate_delta_f(params) -> Array:
         r"""estimate f(params, 1) - f(params, 0)
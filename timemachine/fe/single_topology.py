@@ -31,6 +31,7 @@ from timemachine.fe.system import GuestSystem, HostGuestSystem, HostSystem
 from timemachine.fe.topology import get_ligand_ixn_pots_params
 from timemachine.ff import Forcefield
 from timemachine.graph_utils import convert_to_nx
+from timemachine.jax_cache import warmup_entry_point
 from timemachine.potentials import (
     BoundPotential,
     ChiralAtomRestraint,
@@ -951,20 +952,25 @@ def interpolate_w_coord(w0: float | jax.Array, w1: float | jax.Array, lamb: floa
     )
 
 
-batch_interpolate_harmonic_bond_params = jax.jit(
-    jax.vmap(interpolate_harmonic_bond_params, in_axes=(0, 0, None, None, 0, 0))
+batch_interpolate_harmonic_bond_params = warmup_entry_point(
+    jax.jit(jax.vmap(interpolate_harmonic_bond_params, in_axes=(0, 0, None, None, 0, 0))),
+    "timemachine.fe.single_topology:batch_interpolate_harmonic_bond_params",
 )
-batch_interpolate_harmonic_angle_params = jax.jit(
-    jax.vmap(interpolate_harmonic_angle_params, in_axes=(0, 0, None, None, 0, 0))
+batch_interpolate_harmonic_angle_params = warmup_entry_point(
+    jax.jit(jax.vmap(interpolate_harmonic_angle_params, in_axes=(0, 0, None, None, 0, 0))),
+    "timemachine.fe.single_topology:batch_interpolate_harmonic_angle_params",
 )
-batch_interpolate_periodic_torsion_params = jax.jit(
-    jax.vmap(interpolate_periodic_torsion_params, in_axes=(0, 0, None, 0, 0))
+batch_interpolate_periodic_torsion_params = warmup_entry_point(
+    jax.jit(jax.vmap(interpolate_periodic_torsion_params, in_axes=(0, 0, None, 0, 0))),
+    "timemachine.fe.single_topology:batch_interpolate_periodic_torsion_params",
 )
-batch_interpolate_chiral_atom_params = jax.jit(
-    jax.vmap(interpolate_chiral_volume_params, in_axes=(0, 0, None, None, 0, 0))
+batch_interpolate_chiral_atom_params = warmup_entry_point(
+    jax.jit(jax.vmap(interpolate_chiral_volume_params, in_axes=(0, 0, None, None, 0, 0))),
+    "timemachine.fe.single_topology:batch_interpolate_chiral_atom_params",
 )
 
 
+@warmup_entry_point
 @jax.jit
 def batch_interpolate_nonbonded_pair_list_params(
     cutoff,
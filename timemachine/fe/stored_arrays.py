@@ -1,21 +1,75 @@
 import io
+import json
+import struct
 import tempfile
+import threading
+from bisect import bisect_right
+from collections import deque
 from collections.abc import Collection, Iterable, Iterator, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial, reduce
 from itertools import count
 from pathlib import Path
-from typing import NoReturn, Self, overload
+from typing import Literal, Optional, Self, overload
 
 import numpy as np
 from numpy.typing import ArrayLike, NDArray
 
+from timemachine.fe.chunk_codecs import MAGIC as CHUNK_MAGIC
+from timemachine.fe.chunk_codecs import ChunkCodec, deserialize_chunk, is_serialized_chunk, serialize_chunk
 from timemachine.parallel.client import AbstractFileClient
 
+RAW_CHUNK_SUFFIX = ".npy"
+ENCODED_CHUNK_SUFFIX = ".npc"
+
+# Packed container: serialized chunks (.npy or encoded) concatenated in a single file, followed by a trailer consisting
+# of a JSON index, its length (little-endian uint64) and PACKED_MAGIC
+PACKED_FILENAME = "chunks.pack"
+PACKED_MAGIC = b"\x93TMPACK\x00"
+
+# Single background thread shared by all StoredArrays using write-behind, so that the number of threads does not grow
+# with the number of instances (e.g. one per HREX state). Writes are performed in submission order.
+_writer: Optional[ThreadPoolExecutor] = None
+_writer_lock = threading.Lock()
+
+
+def _get_writer() -> ThreadPoolExecutor:
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="StoredArraysWriter")
+        return _writer
+
+
+def _write_chunk(path: Path, array: NDArray, codec: Optional[ChunkCodec]):
+    if codec is not None:
+        path.write_bytes(serialize_chunk(array, codec))
+    else:
+        np.save(path, array)
+
+
+def _append_chunk(
+    path: Path, array: NDArray, codec: Optional[ChunkCodec], byte_ranges: list[Optional[tuple[int, int]]], idx: int
+):
+    """Append a serialized chunk to a packed data file, recording its (offset, length) in byte_ranges[idx]"""
+    with open(path, "ab") as f:
+        offset = f.tell()
+        if codec is not None:
+            f.write(serialize_chunk(array, codec))
+        else:
+            np.save(f, array)
+        byte_ranges[idx] = (offset, f.tell() - offset)
+
 
 class StoredArrays(Sequence[NDArray]):
     """Sequence of numpy arrays using O(1) memory, backed by disk storage.
 
     Data is stored in a temporary directory that is cleaned when the `StoredArrays` object is finalized.
 
+    By default, chunks are stored as uncompressed .npy files. If a codec is given (see
+    :py:mod:`timemachine.fe.chunk_codecs`), chunks are instead encoded, e.g. compressed or quantized, when written and
+    decoded when read; this is transparent to readers, but chunks can no longer be memory-mapped.
+
     Examples
     --------
     >>> sa = StoredArrays()
@@ -27,15 +81,64 @@ class StoredArrays(Sequence[NDArray]):
     3
     >>> list(sa)
     [array([1, 2, 3]), array([4, 5, 6]), array([7, 8, 9])]
+
+    Random access reads only the requested rows, using memory-mapped chunks. Slices and integer or boolean index arrays
+    return a stacked array
+
+    >>> sa[1:]
+    array([[4, 5, 6],
+           [7, 8, 9]])
+    >>> sa[[2, 0]]
+    array([[7, 8, 9],
+           [1, 2, 3]])
+    >>> np.asarray(sa).shape
+    (3, 3)
+
+    >>> from timemachine.fe.chunk_codecs import ShuffleCompressCodec
+    >>> compressed = StoredArrays.from_chunks([[np.array([1.0, 2.0])]], codec=ShuffleCompressCodec())
+    >>> list(compressed)
+    [array([1., 2.])]
+
+    With max_pending_writes > 0, `extend` copies its input and returns immediately, writing chunks to disk on a
+    background thread (write-behind), with at most max_pending_writes chunks queued before `extend` blocks. Pending
+    writes are flushed before any read and by `store`; an error in a background write is raised by the next call to
+    `extend`, `flush`, `len` or a read.
+
+    >>> sa = StoredArrays(max_pending_writes=4)
+    >>> sa.extend([np.array([1, 2, 3])])
+    >>> list(sa)
+    [array([1, 2, 3])]
+
+    With packed=True, chunks are appended to a single data file with an in-memory index of byte offsets, rather than
+    written to one file per chunk, e.g. to limit the number of files created when extending many times. Raw chunks are
+    still memory-mapped on read, and `store` and `load` transfer a single file (see :py:data:`PACKED_FILENAME`).
+
+    >>> sa = StoredArrays(packed=True)
+    >>> sa.extend([np.array([1, 2, 3]), np.array([4, 5, 6])])
+    >>> sa.extend([np.array([7, 8, 9])])
+    >>> sa[1:]
+    array([[4, 5, 6],
+           [7, 8, 9]])
     """
 
-    def __init__(self) -> None:
+    def __init__(self, codec: Optional[ChunkCodec] = None, max_pending_writes: int = 0, packed: bool = False) -> None:
+        assert max_pending_writes >= 0
+        self._codec = codec
+        self._max_pending_writes = max_pending_writes
+        self._packed = packed
+        self._chunk_byte_ranges: list[Optional[tuple[int, int]]] = []  # (offset, length) in the packed data file
+        self._pending_writes: deque[Future] = deque()
+        self._write_error: Optional[BaseException] = None
         self._chunk_sizes: list[int] = []
+        self._chunk_offsets: list[int] = [0]  # prefix sums of _chunk_sizes
+        self._chunk_metas: list[tuple[tuple[int, ...], np.dtype]] = []  # (row shape, dtype) of each chunk
         self._dir = tempfile.TemporaryDirectory()
 
     @classmethod
-    def from_chunks(cls, chunks: Iterable[Collection[NDArray]]) -> Self:
-        sa = cls()
+    def from_chunks(
+        cls, chunks: Iterable[Collection[NDArray]], codec: Optional[ChunkCodec] = None, packed: bool = False
+    ) -> Self:
+        sa = cls(codec, packed=packed)
         for chunk in chunks:
             sa.extend(chunk)
         return sa
@@ -45,61 +148,210 @@ class StoredArrays(Sequence[NDArray]):
             yield from chunk
 
     def __len__(self) -> int:
-        return sum(self._chunk_sizes)
+        self._check_pending_writes()
+        return self._chunk_offsets[-1]
 
-    @overload
+    @overload  # type: ignore[override]
     def __getitem__(self, key: int) -> NDArray: ...
 
     @overload
-    def __getitem__(self, key: slice) -> NoReturn: ...
+    def __getitem__(self, key: slice | list[int] | list[bool] | range | NDArray) -> NDArray: ...
 
     def __getitem__(self, key) -> NDArray:
-        if isinstance(key, int):
-            key = range(len(self))[key]
-            for idx, size in enumerate(self._chunk_sizes):
-                if key < size:
-                    return np.load(self._get_chunk_path(idx))[key]
-                key -= size
-            assert False, "internal error"
+        if isinstance(key, (int, np.integer)):
+            chunk_idx, row_idx = self._locate(range(len(self))[key])
+            return np.array(self._load_chunk(chunk_idx, mmap_mode="r")[row_idx])
         elif isinstance(key, slice):
-            raise NotImplementedError("slices are not implemented")
+            return self._take(np.arange(len(self))[key])
+        elif isinstance(key, (list, range, np.ndarray)):
+            idxs = np.asarray(key)
+            if idxs.dtype == bool:
+                if idxs.shape != (len(self),):
+                    raise IndexError(f"boolean index has shape {idxs.shape}, expected ({len(self)},)")
+                idxs = np.flatnonzero(idxs)
+            elif idxs.size == 0:
+                idxs = idxs.astype(int)
+            elif not np.issubdtype(idxs.dtype, np.integer) or idxs.ndim != 1:
+                raise ValueError("invalid subscript")
+            if np.any((idxs < -len(self)) | (idxs >= len(self))):
+                raise IndexError("index out of range")
+            return self._take(np.where(idxs < 0, idxs + len(self), idxs))
         else:
             raise ValueError("invalid subscript")
 
+    def _locate(self, idx: int) -> tuple[int, int]:
+        """Returns (chunk index, row index within chunk) of a nonnegative row index"""
+        chunk_idx = bisect_right(self._chunk_offsets, idx) - 1
+        return chunk_idx, idx - self._chunk_offsets[chunk_idx]
+
+    def _take(self, idxs: NDArray) -> NDArray:
+        """Gathers rows with nonnegative indices idxs, reading only the touched rows of each chunk"""
+        row_shape, dtype = self._row_shape_and_dtype()
+        out = np.empty((len(idxs), *row_shape), dtype=dtype)
+        chunk_idxs = np.searchsorted(self._chunk_offsets, idxs, side="right") - 1
+        for chunk_idx in np.unique(chunk_idxs):
+            (positions,) = np.nonzero(chunk_idxs == chunk_idx)
+            chunk = self._load_chunk(chunk_idx, mmap_mode="r")
+            out[positions] = chunk[idxs[positions] - self._chunk_offsets[chunk_idx]]
+        return out
+
+    def _row_shape_and_dtype(self) -> tuple[tuple[int, ...], np.dtype]:
+        """Returns the shape and dtype of rows in a stacked array, consistent with np.array(list(self))"""
+        nonempty_chunk_metas = [meta for meta, size in zip(self._chunk_metas, self._chunk_sizes) if size > 0]
+        if not nonempty_chunk_metas:
+            return (), np.dtype(np.float64)
+        row_shapes = {row_shape for row_shape, _ in nonempty_chunk_metas}
+        if len(row_shapes) > 1:
+            raise ValueError(f"cannot stack rows with different shapes: {sorted(row_shapes)}")
+        return row_shapes.pop(), reduce(np.promote_types, [dtype for _, dtype in nonempty_chunk_metas])
+
+    def __array__(self, dtype=None, copy=None) -> NDArray:
+        """Returns all rows as a single array.
+
+        If the data are stored in a single chunk and a copy is not required, returns a read-only memory-mapped view.
+        Otherwise, chunks are copied directly into a preallocated array, avoiding intermediate copies.
+        """
+        nonempty_chunk_idxs = [idx for idx, size in enumerate(self._chunk_sizes) if size > 0]
+        if len(nonempty_chunk_idxs) == 1 and not copy:
+            array = self._load_chunk(nonempty_chunk_idxs[0], mmap_mode="r")
+            return array if dtype is None else array.astype(dtype, copy=False)
+        if len(nonempty_chunk_idxs) > 1 and copy is False:
+            raise ValueError("unable to avoid copy: data are stored in multiple chunks")
+
+        row_shape, common_dtype = self._row_shape_and_dtype()
+        out = np.empty((len(self), *row_shape), dtype=dtype or common_dtype)
+        for idx in nonempty_chunk_idxs:
+            start, stop = self._chunk_offsets[idx], self._chunk_offsets[idx + 1]
+            out[start:stop] = self._load_chunk(idx, mmap_mode="r")
+        return out
+
+    @property
+    def codec(self) -> Optional[ChunkCodec]:
+        return self._codec
+
+    @property
+    def packed(self) -> bool:
+        return self._packed
+
+    @property
+    def _chunk_suffix(self) -> str:
+        return RAW_CHUNK_SUFFIX if self._codec is None else ENCODED_CHUNK_SUFFIX
+
     def _get_chunk_path(self, idx: int) -> Path:
-        return self.get_chunk_path(self._path(), idx)
+        return self.get_chunk_path(self._path(), idx, self._chunk_suffix)
 
     def __eq__(self, other) -> bool:
         return self._chunk_sizes == other._chunk_sizes and all(
             np.array_equal(a, b, equal_nan=True) for a, b in zip(self, other)
         )
 
-    def _chunks(self) -> Iterator[NDArray]:
+    def _chunks(self, mmap_mode: Optional[Literal["r"]] = None) -> Iterator[NDArray]:
         """Returns an iterator over chunks.
 
-        Each chunk is a numpy array stored in a single .npy file
+        Each chunk is a numpy array stored in a single file, or in a byte range of the packed data file. If mmap_mode is
+        given, chunks are memory-mapped rather than read into memory (unless a codec is used).
         """
         for idx, _ in enumerate(self._chunk_sizes):
-            yield np.load(self._get_chunk_path(idx))
+            yield self._load_chunk(idx, mmap_mode)
+
+    def _load_chunk(self, idx: int, mmap_mode: Optional[Literal["r"]] = None) -> NDArray:
+        self.flush()
+        if self._packed:
+            return self._load_packed_chunk(idx, mmap_mode)
+        if self._codec is not None:
+            return deserialize_chunk(self._get_chunk_path(idx).read_bytes())
+        return np.load(self._get_chunk_path(idx), mmap_mode=mmap_mode)
+
+    def _load_packed_chunk(self, idx: int, mmap_mode: Optional[Literal["r"]] = None) -> NDArray:
+        byte_range = self._chunk_byte_ranges[idx]
+        assert byte_range is not None
+        offset, length = byte_range
+        with open(self._get_packed_data_path(), "rb") as f:
+            f.seek(offset)
+            prefix = f.read(len(CHUNK_MAGIC))
+            if is_serialized_chunk(prefix):
+                return deserialize_chunk(prefix + f.read(length - len(prefix)))
+            f.seek(offset)
+            if mmap_mode is None:
+                return np.lib.format.read_array(f)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            if np.prod(shape) == 0:
+                return np.empty(shape, dtype)  # empty regions can't be memory-mapped
+            return np.memmap(
+                self._get_packed_data_path(),
+                dtype=dtype,
+                mode=mmap_mode,
+                offset=f.tell(),
+                shape=shape,
+                order="F" if fortran_order else "C",
+            )
+
+    def _get_packed_data_path(self) -> Path:
+        return self._path() / PACKED_FILENAME
 
     def _path(self) -> Path:
         return Path(self._dir.name)
 
     def extend(self, xs: Collection[ArrayLike]):
-        np.save(self._get_chunk_path(len(self._chunk_sizes)), np.asarray(xs))
+        self._check_pending_writes()
+        idx = len(self._chunk_sizes)
+        array = np.array(xs) if self._max_pending_writes > 0 else np.asarray(xs)  # copy if written asynchronously
+        if self._packed:
+            self._chunk_byte_ranges.append(None)
+            write = partial(
+                _append_chunk, self._get_packed_data_path(), array, self._codec, self._chunk_byte_ranges, idx
+            )
+        else:
+            write = partial(_write_chunk, self._get_chunk_path(idx), array, self._codec)
+        if self._max_pending_writes > 0:
+            while len(self._pending_writes) >= self._max_pending_writes:
+                self._wait(self._pending_writes.popleft())
+            # single writer thread, so packed chunks are appended in order
+            self._pending_writes.append(_get_writer().submit(write))
+        else:
+            write()
         self._chunk_sizes.append(len(xs))
+        self._chunk_metas.append((array.shape[1:], array.dtype))
+        self._chunk_offsets.append(self._chunk_offsets[-1] + len(xs))
+
+    def flush(self):
+        """Wait for pending background writes to complete, raising the first error, if any"""
+        while self._pending_writes:
+            self._wait(self._pending_writes.popleft())
+        self._check_pending_writes()
+
+    def _check_pending_writes(self):
+        """Raise an error from a completed background write, without waiting for pending writes"""
+        while self._pending_writes and self._pending_writes[0].done():
+            self._wait(self._pending_writes.popleft())
+        if self._write_error is not None:
+            raise RuntimeError("failed to write chunk") from self._write_error
+
+    def _wait(self, future: Future):
+        try:
+            future.result()
+        except Exception as e:
+            # chunks written after a failure are not readable; subsequent operations also raise
+            if self._write_error is None:
+                self._write_error = e
+            raise RuntimeError("failed to write chunk") from e
 
     @staticmethod
-    def get_chunk_path(path: Path, idx: int) -> Path:
-        return (path / str(idx)).with_suffix(".npy")
+    def get_chunk_path(path: Path, idx: int, suffix: str = RAW_CHUNK_SUFFIX) -> Path:
+        return (path / str(idx)).with_suffix(suffix)
 
     def __reduce__(self):
-        return self.from_chunks, (list(self._chunks()),)
+        return partial(self.from_chunks, codec=self._codec, packed=self._packed), (list(self._chunks()),)
 
     def store(self, client: AbstractFileClient, prefix: Path = Path(".")):
         """Save to persistent storage.
 
-        Uses O(1) memory.
+        Uses O(1) memory. Chunks are stored as encoded by the codec, if any. If packed, all chunks and the index are
+        stored as a single file under prefix; otherwise, each chunk is stored as a separate file.
 
         Examples
         --------
@@ -111,25 +363,84 @@ class StoredArrays(Sequence[NDArray]):
         >>> StoredArrays.load(fc) == sa
         True
         """
+        self.flush()
+        if self._packed:
+            self._store_packed(client, prefix / PACKED_FILENAME)
+            return
         for idx, _ in enumerate(self._chunk_sizes):
-            dest_path = self.get_chunk_path(prefix, idx)
+            dest_path = self.get_chunk_path(prefix, idx, self._chunk_suffix)
             if client.exists(str(dest_path)):
                 raise FileExistsError(f"file already exists: {dest_path}")
             src_path = self._get_chunk_path(idx)
             with open(src_path, "rb") as ifs:
                 client.store_stream(str(dest_path), ifs)
 
+    def _store_packed(self, client: AbstractFileClient, dest_path: Path):
+        if client.exists(str(dest_path)):
+            raise FileExistsError(f"file already exists: {dest_path}")
+        index = dict(
+            byte_ranges=self._chunk_byte_ranges,
+            chunk_sizes=self._chunk_sizes,
+            row_shapes=[row_shape for row_shape, _ in self._chunk_metas],
+            dtypes=[np.lib.format.dtype_to_descr(dtype) for _, dtype in self._chunk_metas],
+        )
+        index_bytes = json.dumps(index).encode()
+        trailer = index_bytes + struct.pack("<Q", len(index_bytes)) + PACKED_MAGIC
+
+        # temporarily append the trailer to the local data file, so that the container is stored in one transfer
+        with open(self._get_packed_data_path(), "a+b") as f:
+            data_len = f.tell()
+            f.write(trailer)
+            try:
+                f.seek(0)
+                client.store_stream(str(dest_path), f)
+            finally:
+                f.truncate(data_len)
+
     @classmethod
-    def load(cls, client: AbstractFileClient, prefix: Path = Path(".")) -> Self:
-        sa = cls()
+    def load(cls, client: AbstractFileClient, prefix: Path = Path("."), codec: Optional[ChunkCodec] = None) -> Self:
+        """Load from persistent storage. Encoded chunks are decoded regardless of codec, which is only used for local
+        storage of the result.
+
+        If a packed container is stored under prefix, it is read in a single transfer (using memory proportional to its
+        size) and the result is packed; otherwise, chunk files are read one at a time.
+        """
+        packed_path = prefix / PACKED_FILENAME
+        if client.exists(str(packed_path)):
+            return cls._from_packed_bytes(client.load(str(packed_path)), codec)
+
+        sa = cls(codec)
         for idx in count():
-            path = cls.get_chunk_path(prefix, idx)
-            if client.exists(str(path)):
-                bs = client.load(str(path))
-                chunk = list(deserialize_array(bs))
-                sa.extend(chunk)
+            raw_path = cls.get_chunk_path(prefix, idx, RAW_CHUNK_SUFFIX)
+            encoded_path = cls.get_chunk_path(prefix, idx, ENCODED_CHUNK_SUFFIX)
+            if client.exists(str(raw_path)):
+                chunk = list(deserialize_array(client.load(str(raw_path))))
+            elif client.exists(str(encoded_path)):
+                chunk = list(deserialize_chunk(client.load(str(encoded_path))))
             else:
                 break
+            sa.extend(chunk)
+        return sa
+
+    @classmethod
+    def _from_packed_bytes(cls, bs: bytes, codec: Optional[ChunkCodec] = None) -> Self:
+        if not bs.endswith(PACKED_MAGIC):
+            raise ValueError("not a packed container")
+        index_len_offset = len(bs) - len(PACKED_MAGIC) - struct.calcsize("<Q")
+        (index_len,) = struct.unpack_from("<Q", bs, index_len_offset)
+        data_len = index_len_offset - index_len
+        index = json.loads(bs[data_len:index_len_offset])
+
+        # serialized chunks are copied verbatim, without decoding or re-encoding
+        sa = cls(codec, packed=True)
+        sa._get_packed_data_path().write_bytes(memoryview(bs)[:data_len])
+        for (offset, length), size, row_shape, descr in zip(
+            index["byte_ranges"], index["chunk_sizes"], index["row_shapes"], index["dtypes"]
+        ):
+            sa._chunk_byte_ranges.append((offset, length))
+            sa._chunk_sizes.append(size)
+            sa._chunk_metas.append((tuple(row_shape), np.lib.format.descr_to_dtype(descr)))
+            sa._chunk_offsets.append(sa._chunk_offsets[-1] + size)
         return sa
 
 
@@ -0,0 +1,108 @@
+import numpy as np
+from numpy.typing import NDArray
+
+from timemachine.fe.bar import df_err_and_overlap_from_u_kln_batch
+
+DEFAULT_MAX_SAMPLES_PER_STATE = 10_000
+
+
+class StreamingPairBar:
+    """Running BAR estimates for each pair of neighboring states, updated online from the reduced energies of each
+    sampling iteration (e.g. the HREX potential matrix).
+
+    For each pair of neighboring states (k, k + 1), stores the reduced energy differences u_{k+1}(x) - u_k(x) of
+    samples x from both states, which are sufficient to compute the pair BAR estimate. Memory is bounded by
+    max_samples_per_state: when the buffer is full, every other stored sample is discarded and subsequently only every
+    other sample is stored, so that the stored samples are always evenly spaced in the stream (with spacing `stride`).
+
+    Examples
+    --------
+    >>> bar = StreamingPairBar(n_states=3)
+    >>> bar.update(np.array([[0.0, 1.0, np.inf], [-1.0, 0.0, 1.0], [np.inf, -1.0, 0.0]]))
+    >>> bar.n_samples
+    1
+    >>> df, df_err, overlap = bar.estimate()
+    """
+
+    def __init__(self, n_states: int, max_samples_per_state: int = DEFAULT_MAX_SAMPLES_PER_STATE):
+        """
+        Parameters
+        ----------
+        n_states: int
+            Number of states, ordered such that adjacent states are neighbors
+
+        max_samples_per_state: int
+            Maximum number of samples to store for each state. Must be even.
+        """
+        assert n_states >= 2, "need at least 2 states"
+        assert max_samples_per_state >= 2 and max_samples_per_state % 2 == 0, "max_samples_per_state must be even"
+        self.n_states = n_states
+        self.max_samples_per_state = max_samples_per_state
+        self.stride = 1
+        self.n_updates = 0
+        self._n_samples = 0
+
+        # reduced energy differences u_{k+1} - u_k of samples from states k and k + 1, for each pair (k, k + 1)
+        self._delta_u = np.empty((n_states - 1, 2, max_samples_per_state))
+
+    @property
+    def n_samples(self) -> int:
+        """Number of stored samples from each state"""
+        return self._n_samples
+
+    def update(self, u_kl: NDArray):
+        """Add one sample from each state.
+
+        Parameters
+        ----------
+        u_kl: array (n_states, n_states)
+            u_kl[k, l] is the reduced energy of the current sample from state k, evaluated in state l. Only the
+            diagonal and first off-diagonals are used; other entries may be inf (e.g. as computed with
+            HREXParams.max_delta_states).
+        """
+        u_kl = np.asarray(u_kl)
+        assert u_kl.shape == (self.n_states, self.n_states)
+
+        frame_idx = self.n_updates
+        self.n_updates += 1
+
+        if frame_idx % self.stride:
+            return
+
+        if self._n_samples == self.max_samples_per_state:
+            self._thin()
+            if frame_idx % self.stride:
+                return
+
+        k = np.arange(self.n_states - 1)
+        delta_u = self._delta_u[:, :, self._n_samples]
+        delta_u[:, 0] = u_kl[k, k + 1] - u_kl[k, k]
+        delta_u[:, 1] = u_kl[k + 1, k + 1] - u_kl[k + 1, k]
+        self._n_samples += 1
+
+    def _thin(self):
+        n_keep = (self._n_samples + 1) // 2
+        self._delta_u[:, :, :n_keep] = self._delta_u[:, :, : self._n_samples : 2]
+        self._n_samples = n_keep
+        self.stride *= 2
+
+    def u_kln_by_pair(self) -> NDArray:
+        """Returns 2-state reduced u_kln matrices for each pair of neighbors, with shape (n_states - 1, 2, 2, n_samples),
+        from the stored samples. Energies in state k are taken to be zero, leaving only the differences used by BAR."""
+        n = self._n_samples
+        u_kln = np.zeros((self.n_states - 1, 2, 2, n))
+        u_kln[:, 0, 1] = self._delta_u[:, 0, :n]
+        u_kln[:, 1, 1] = self._delta_u[:, 1, :n]
+        return u_kln
+
+    def estimate(self) -> tuple[NDArray, NDArray, NDArray]:
+        """Compute BAR estimates from the stored samples.
+
+        Returns
+        -------
+        df, df_err, overlap: arrays (n_states - 1,)
+            Reduced free energy difference, uncertainty and overlap for each pair of neighbors (k, k + 1). See
+            `timemachine.fe.bar.df_err_and_overlap_from_u_kln_batch`.
+        """
+        assert self._n_samples > 0, "no samples"
+        return df_err_and_overlap_from_u_kln_batch(self.u_kln_by_pair())
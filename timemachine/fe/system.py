@@ -17,6 +17,7 @@ from timemachine.potentials import (
     NonbondedInteractionGroup,
     NonbondedPairListPrecomputed,
     PeriodicTorsion,
+    make_summed_potential,
 )
 
 # Chiral bond restraints are disabled until checks are added (see GH #815)
@@ -94,6 +95,22 @@ class AbstractSystem(ABC):
 
         return U_fn
 
+    def get_fused_U_fn(self, compute_du_dx: bool = False):
+        """
+        Return a jit-compiled function that evaluates the potential energy (and, if compute_du_dx is True, its gradient
+        with respect to coordinates) of a set of coordinates in a single call, sharing pairwise distances between the
+        nonbonded terms. See `summed.fused_summed_potential`.
+        """
+        bp = make_summed_potential(self.get_U_fns())
+        fused_fxn = bp.potential.get_fused_fxn(argnums=(0,) if compute_du_dx else ())
+        params = bp.params
+
+        def U_fn(x):
+            res = fused_fxn(x, params, None)
+            return (res[0], res[1][0]) if compute_du_dx else res
+
+        return U_fn
+
     def get_U_fns(self) -> list[BoundPotential]:
         """
         Return a list of bound potential"""
@@ -8,9 +8,11 @@ from numpy.typing import NDArray
 from rdkit import Chem
 from rdkit.Chem import AllChem, Draw
 from rdkit.Chem.Draw import rdMolDraw2D
-from scipy.stats import special_ortho_group
 
 from timemachine import constants
+from timemachine.utils import lazy_import
+
+stats = lazy_import("scipy.stats")
 
 
 def convert_uIC50_to_kJ_per_mole(amount_in_uM: float, experiment_temp: float = constants.DEFAULT_TEMP) -> float:
@@ -159,7 +161,7 @@ def generate_good_rotations(
     conf_a = get_romol_conf(mol_a)
     conf_b = get_romol_conf(mol_b)
 
-    unif_so3 = special_ortho_group(dim=3, seed=seed)
+    unif_so3 = stats.special_ortho_group(dim=3, seed=seed)
 
     scores = []
     rotations = []
@@ -11,7 +11,6 @@ from shutil import which
 import jax.numpy as jnp
 import networkx as nx
 import numpy as np
-from Auto3D.ASE.geometry import opt_geometry
 from jax import jit, vmap
 from numpy.typing import NDArray
 from openff.recharge.aromaticity import AromaticityModel
@@ -20,8 +19,6 @@ from openff.toolkit import unit, RDKitToolkitWrapper
 from openff.toolkit.topology import Molecule
 from openff.toolkit.utils import AntechamberNotFoundError
 from openff.units import Quantity
-from pyscf import gto, scf
-from pyscf.data import radii
 from rdkit import Chem
 from rdkit.Chem import AllChem
 from rdkit.Chem.Descriptors import NumRadicalElectrons
@@ -216,7 +213,10 @@ def resp_assign_partial_charges(_rdmol: Chem.Mol, use_conformers: list[Quantity]
         - Array of RESP partial charges for each atom
         - Total DFT energy of the molecule
     """
+    from Auto3D.ASE.geometry import opt_geometry
     from gpu4pyscf.pop import esp
+    from pyscf import gto, scf
+    from pyscf.data import radii
 
     # Check that antechamber is available for symmetry checking
     ANTECHAMBER_PATH = which("antechamber")
@@ -0,0 +1,225 @@
+"""Opt-in persistent JAX compilation cache, and a warm-up manifest of jit-compiled entry points.
+
+Each new process (e.g. each `ProcessPoolClient` worker) otherwise pays the cost of jit compilation again. Two
+complementary mechanisms are provided, both disabled by default:
+
+* a persistent compilation cache directory (see `enable_persistent_cache`), shared between processes, which allows
+  compiled executables to be loaded from disk rather than recompiled. This applies to all jit-compiled functions,
+  including closures (e.g. in `integrator.simulate` and `exchange_mover`)
+
+* a warm-up manifest (see `record_warmup_manifest` and `warm_up`): module-level entry points decorated with
+  `warmup_entry_point` record the argument shapes and dtypes seen in production to a JSON lines file, which can be
+  used to compile (or load from the persistent cache) the same specializations when a worker starts, off the critical
+  path of the first task
+
+Both can be enabled for all processes by setting environment variables, which are inherited by worker processes:
+
+    TM_JAX_CACHE_DIR=/path/to/cache TM_JAX_WARMUP_MANIFEST=/path/to/manifest.jsonl python script.py
+"""
+
+import functools
+import importlib
+import json
+import os
+import threading
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any, NamedTuple, Optional
+
+import jax
+import numpy as np
+
+CACHE_DIR_ENV_VAR = "TM_JAX_CACHE_DIR"
+WARMUP_MANIFEST_ENV_VAR = "TM_JAX_WARMUP_MANIFEST"
+
+_manifest_path: Optional[Path] = None
+_recorded: set[tuple[str, str]] = set()
+_lock = threading.Lock()
+
+
+def enable_persistent_cache(cache_dir: str | Path, min_compile_time_secs: float = 0.0):
+    """Enable the persistent compilation cache, storing compiled executables in cache_dir.
+
+    Parameters
+    ----------
+    cache_dir: str or Path
+        Directory in which to store compiled executables. Created if it does not exist. May be shared by concurrent
+        processes.
+
+    min_compile_time_secs: float
+        Only cache executables that took at least this long to compile
+    """
+    from jax.experimental.compilation_cache import compilation_cache
+
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    jax.config.update("jax_compilation_cache_dir", str(cache_dir))
+    jax.config.update("jax_persistent_cache_min_compile_time_secs", min_compile_time_secs)
+    # the cache is initialized on first use; reset in case something has already been compiled in this process
+    compilation_cache.reset_cache()
+
+
+def record_warmup_manifest(manifest_path: Optional[str | Path]):
+    """Append the argument signatures of calls to entry points decorated with `warmup_entry_point` to manifest_path
+    (one JSON object per line). Signatures already present in the manifest are not recorded again. Pass None to
+    disable recording."""
+    global _manifest_path
+    with _lock:
+        _manifest_path = Path(manifest_path) if manifest_path is not None else None
+        _recorded.clear()
+        if _manifest_path is not None:
+            _recorded.update((entry.name, json.dumps(entry.args)) for entry in load_manifest(_manifest_path))
+
+
+def configure_from_environment():
+    """Enable the persistent cache and manifest recording if the corresponding environment variables are set"""
+    cache_dir = os.environ.get(CACHE_DIR_ENV_VAR)
+    if cache_dir:
+        enable_persistent_cache(cache_dir)
+    manifest_path = os.environ.get(WARMUP_MANIFEST_ENV_VAR)
+    if manifest_path:
+        record_warmup_manifest(manifest_path)
+
+
+class ManifestEntry(NamedTuple):
+    name: str
+    """qualified name of the entry point, e.g. "timemachine.md.hrex:_run_neighbor_swaps" """
+
+    args: list
+    """encoded argument signature, see `_encode_arg`"""
+
+
+def load_manifest(manifest_path: str | Path) -> list[ManifestEntry]:
+    """Unique entries of a warm-up manifest, in order of first occurrence. Returns an empty list if the manifest does
+    not exist."""
+    path = Path(manifest_path)
+    if not path.exists():
+        return []
+    entries: dict[tuple[str, str], ManifestEntry] = {}
+    for line in path.read_text().splitlines():
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            # may be a partially-written line from a process that was interrupted
+            continue
+        entries.setdefault((record["name"], json.dumps(record["args"])), ManifestEntry(record["name"], record["args"]))
+    return list(entries.values())
+
+
+def _encode_arg(x) -> Any:
+    if x is None:
+        return None
+    if isinstance(x, (bool, int, float)):
+        # recorded by type, since values of (non-static) python scalars don't affect compilation
+        return {"scalar": type(x).__name__}
+    if isinstance(x, (tuple, list)):
+        return {"seq": [_encode_arg(y) for y in x]}
+    if hasattr(x, "shape") and hasattr(x, "dtype"):
+        return {"shape": list(x.shape), "dtype": np.dtype(x.dtype).name}
+    raise TypeError(f"unsupported argument type for warm-up manifest: {type(x)}")
+
+
+def _decode_arg(x) -> Any:
+    if x is None:
+        return None
+    if "scalar" in x:
+        return {"bool": False, "int": 0, "float": 0.0}[x["scalar"]]
+    if "seq" in x:
+        return tuple(_decode_arg(y) for y in x["seq"])
+    return jax.ShapeDtypeStruct(tuple(x["shape"]), np.dtype(x["dtype"]))
+
+
+def _record(name: str, args: tuple):
+    try:
+        encoded = [_encode_arg(arg) for arg in args]
+    except (TypeError, ValueError):
+        return
+    key = (name, json.dumps(encoded))
+    with _lock:
+        if _manifest_path is None or key in _recorded:
+            return
+        _recorded.add(key)
+        # single short appends are effectively atomic, so concurrent workers can share a manifest
+        with open(_manifest_path, "a") as fp:
+            fp.write(json.dumps({"name": name, "args": encoded}) + "\n")
+
+
+def warmup_entry_point(jitted_fn: Callable, name: Optional[str] = None) -> Callable:
+    """Decorator registering a module-level jit-compiled function as a warm-up entry point.
+
+    When manifest recording is enabled (see `record_warmup_manifest`), the argument signature of each call is recorded
+    to the manifest. Only positional arguments that are arrays, python scalars, None, or tuples of these are supported;
+    static arguments are not.
+
+    Usage:
+
+        @warmup_entry_point
+        @jax.jit
+        def f(x, y): ...
+
+        g = warmup_entry_point(jax.jit(jax.vmap(f)), "my_module:g")
+
+    Parameters
+    ----------
+    jitted_fn: callable
+        jit-compiled function
+
+    name: str, optional
+        Qualified name "module:attribute" by which the entry point can be imported. Defaults to the module and
+        qualified name of jitted_fn.
+    """
+    name = name or f"{jitted_fn.__module__}:{jitted_fn.__qualname__}"
+
+    @functools.wraps(jitted_fn)
+    def wrapper(*args):
+        if _manifest_path is not None:
+            _record(name, args)
+        return jitted_fn(*args)
+
+    wrapper.lower = jitted_fn.lower  # type: ignore[attr-defined]
+    return wrapper
+
+
+def _resolve_entry_point(name: str) -> Callable:
+    module_name, qualname = name.split(":")
+    obj: Any = importlib.import_module(module_name)
+    for attr in qualname.split("."):
+        obj = getattr(obj, attr)
+    return obj
+
+
+def warm_up(manifest_path: Optional[str | Path] = None) -> int:
+    """Compile each entry in the manifest ahead of time, loading from the persistent cache where possible. Entries
+    that cannot be resolved or compiled (e.g. stale entries from an older version of the code) are skipped.
+
+    Parameters
+    ----------
+    manifest_path: str or Path, optional
+        Defaults to the value of the environment variable TM_JAX_WARMUP_MANIFEST. If neither is set, does nothing.
+
+    Returns
+    -------
+    int
+        number of entries compiled
+    """
+    manifest_path = manifest_path or os.environ.get(WARMUP_MANIFEST_ENV_VAR)
+    if not manifest_path:
+        return 0
+
+    n_compiled = 0
+    for entry in load_manifest(manifest_path):
+        try:
+            fn = _resolve_entry_point(entry.name)
+            fn.lower(*[_decode_arg(arg) for arg in entry.args]).compile()  # type: ignore[attr-defined]
+        except Exception:
+            continue
+        n_compiled += 1
+    return n_compiled
+
+
+def initialize_worker(manifest_path: Optional[str | Path] = None):
+    """Configure caching from the environment and warm up from the manifest. Suitable for use as the initializer of a
+    process pool."""
+    configure_from_environment()
+    warm_up(manifest_path)
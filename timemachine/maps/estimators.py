@@ -1,7 +1,10 @@
 """Utilities for computing mapped works or mapped u_kn matrix, incorporating invertible map_fxns"""
 
 import numpy as np
-from pymbar.utils import kln_to_kn
+
+from timemachine.utils import lazy_import
+
+pymbar = lazy_import("pymbar")
 
 __all__ = ["compute_mapped_reduced_work", "compute_mapped_u_kn"]
 
@@ -58,6 +61,6 @@ def compute_mapped_u_kn(sample_lists, reduced_energy_fxns, map_fxns):
             xs_mapped, logdetjacs = map_k_to_l(xs_k)
             u_kln[k, l, : N_k[k]] = u_l(xs_mapped) - logdetjacs
 
-    u_kn = kln_to_kn(u_kln, N_k)
+    u_kn = pymbar.utils.kln_to_kn(u_kln, N_k)
     assert u_kn.shape == (K, sum(N_k))
     return u_kn
@@ -21,12 +21,15 @@ from timemachine.fe import free_energy, topology
 from timemachine.fe.utils import get_mol_masses, get_romol_conf
 from timemachine.integrator import simulate
 from timemachine.lib import custom_ops
-from timemachine.md import builders, minimizer
+from timemachine.md import minimizer
 from timemachine.md.barostat.moves import NPTMove
 from timemachine.md.barostat.utils import get_bond_list, get_group_indices
 from timemachine.md.states import CoordsVelBox
 from timemachine.potentials import HarmonicBond, bonded, rmsd
 from timemachine.potentials.potential import get_potential_by_type
+from timemachine.utils import lazy_import
+
+builders = lazy_import("timemachine.md.builders")
 
 logger = logging.getLogger(__name__)
 
@@ -5,13 +5,15 @@ import jax
 import jax.numpy as jnp
 import numpy as np
 from numpy.typing import NDArray
-from scipy.special import logsumexp
-from scipy.stats import special_ortho_group
 
 from timemachine.constants import BOLTZ
 from timemachine.md import moves
 from timemachine.md.states import CoordsVelBox
 from timemachine.potentials import nonbonded
+from timemachine.utils import lazy_import
+
+special = lazy_import("scipy.special")
+stats = lazy_import("scipy.stats")
 
 
 def get_water_idxs(mol_groups: list[NDArray], ligand_idxs: Optional[NDArray] = None) -> list[NDArray]:
@@ -34,7 +36,7 @@ def randomly_rotate_and_translate(coords, new_loc):
     # coords: shape 3(OHH) x 3(xyz), water coordinates
     centroid = np.mean(coords, axis=0, keepdims=True)
     centered_coords = coords - centroid
-    rot_mat = special_ortho_group.rvs(3)
+    rot_mat = stats.special_ortho_group.rvs(3)
 
     # equivalent to standard form where R is first:
     # (R @ A.T).T = A @ R.T
@@ -204,7 +206,7 @@ class BDExchangeMove(moves.MonteCarloMove):
         coords = x.coords
         box = x.box
         log_weights_before = self.batch_log_weights(coords, box)
-        log_probs_before = log_weights_before - logsumexp(log_weights_before)
+        log_probs_before = log_weights_before - special.logsumexp(log_weights_before)
         probs_before = np.exp(log_probs_before)
         chosen_water = np.random.choice(np.arange(self.num_waters), p=probs_before)
         chosen_water_atoms = self.water_idxs_np[chosen_water]
@@ -227,7 +229,9 @@ class BDExchangeMove(moves.MonteCarloMove):
         # trial_coords[chosen_water_atoms] = moved_coords
         # log_weights_after = self.batch_log_weights(trial_coords, box)
 
-        log_acceptance_probability = np.minimum(logsumexp(log_weights_before) - logsumexp(log_weights_after), 0.0)
+        log_acceptance_probability = np.minimum(
+            special.logsumexp(log_weights_before) - special.logsumexp(log_weights_after), 0.0
+        )
         new_state = CoordsVelBox(trial_coords, x.velocities, x.box)
 
         return new_state, log_acceptance_probability
@@ -312,8 +316,8 @@ def compute_raw_ratio_given_weights(log_weights_before, log_weights_after, vi_mo
     g_rev = compute_proposal_probabilities_given_counts(rev_n_i, rev_n_j)
 
     raw_log_p = (
-        logsumexp(log_weights_before)
-        - logsumexp(log_weights_after)
+        special.logsumexp(log_weights_before)
+        - special.logsumexp(log_weights_after)
         + np.log(vol_j)
         - np.log(vol_i)
         + np.log(g_rev)
@@ -407,7 +411,7 @@ class TIBDExchangeMove(BDExchangeMove):
         # p = exp(u_i - log sum_j exp u_j)
         log_weights_before_full = self.batch_log_weights(coords, box)
         log_weights_before = log_weights_before_full[vi_mols]
-        log_probs_before = log_weights_before - logsumexp(log_weights_before)
+        log_probs_before = log_weights_before - special.logsumexp(log_weights_before)
         probs_before = np.exp(log_probs_before)
         water_idx = np.random.choice(vi_mols, p=probs_before)
 
@@ -8,10 +8,12 @@ import numpy as np
 from jax import Array
 from jax.typing import ArrayLike
 from numpy.typing import NDArray
-from scipy.stats import entropy
 
+from timemachine.jax_cache import warmup_entry_point
 from timemachine.md.moves import MixtureOfMoves, MonteCarloMove
-from timemachine.utils import batches, not_ragged
+from timemachine.utils import batches, lazy_import, not_ragged
+
+stats = lazy_import("scipy.stats")
 
 Replica = TypeVar("Replica")
 Samples = TypeVar("Samples")
@@ -47,6 +49,7 @@ class NeighborSwapMove(MonteCarloMove[list[Replica]]):
         return proposed_state, log_acceptance_probability
 
 
+@warmup_entry_point
 @jax.jit
 def _run_neighbor_swaps(
     replica_idx_by_state: Array,
@@ -259,7 +262,7 @@ def get_normalized_kl_divergence(replica_idx_by_state_by_iter: Sequence[Sequence
     count_by_replica_by_state = cumulative_counts[-1]
     fraction_by_replica_by_state = count_by_replica_by_state / n_iters
 
-    return -np.mean(entropy(fraction_by_replica_by_state, axis=0)) + np.log(n_states)
+    return -np.mean(stats.entropy(fraction_by_replica_by_state, axis=0)) + np.log(n_states)
 
 
 def get_cumulative_replica_state_counts(replica_idx_by_state_by_iter: Sequence[Sequence[ReplicaIdx]]) -> NDArray:
@@ -10,12 +10,14 @@ import jax.random as jrandom
 import numpy as np
 from jax.scipy.special import logsumexp as jlogsumexp
 from numpy.typing import NDArray
-from scipy.special import logsumexp
 
 from timemachine import lib
 from timemachine.lib import custom_ops
 from timemachine.md.states import CoordsVelBox
 from timemachine.potentials import BoundPotential
+from timemachine.utils import lazy_import
+
+special = lazy_import("scipy.special")
 
 _State = TypeVar("_State")
 
@@ -306,7 +308,7 @@ class ReferenceMTMMove(DeterministicMTMMove):
 
         # (ytz): we can use these normalized weights here directly to compute observables
         # as a "cheap" importance sampling protocol
-        normalized_weights_yj = np.exp(log_weights_yj - logsumexp(log_weights_yj))
+        normalized_weights_yj = np.exp(log_weights_yj - special.logsumexp(log_weights_yj))
 
         assert np.abs(np.sum(normalized_weights_yj) - 1) < 1e-9
 
@@ -326,6 +328,6 @@ class ReferenceMTMMove(DeterministicMTMMove):
 
         log_pi_xi = self.batch_log_pi_fn(xi)
         log_weights_xi = log_pi_xi + log_Q_x_y + self.batch_log_lambda_fn(xi, y_proposed)
-        log_ratio = logsumexp(log_weights_yj) - logsumexp(log_weights_xi)
+        log_ratio = special.logsumexp(log_weights_yj) - special.logsumexp(log_weights_xi)
 
         return y_proposed, np.exp(log_ratio), key
@@ -9,6 +9,7 @@ from pathlib import Path
 from typing import Any, Optional
 from uuid import uuid4
 
+from timemachine import jax_cache
 from timemachine.parallel.utils import get_gpu_count
 
 # (ytz): The classes in this file are designed to help provide a consistent API between
@@ -148,6 +149,10 @@ class ProcessPoolClient(AbstractClient):
         is larger than the number of workers, the jobs will be batched. Each
         worker will run at most one job.
 
+        Workers are initialized using `timemachine.jax_cache.initialize_worker`, so that if the environment variables
+        TM_JAX_CACHE_DIR and TM_JAX_WARMUP_MANIFEST are set, entry points recorded in the manifest are compiled (or
+        loaded from the persistent cache) on worker start.
+
         Parameters
         ----------
         max_workers: int
@@ -158,7 +163,9 @@ class ProcessPoolClient(AbstractClient):
         self._idx = 0
         self._total_idx = 0
         ctxt = multiprocessing.get_context("spawn")
-        self.executor = futures.ProcessPoolExecutor(max_workers=self.max_workers, mp_context=ctxt)
+        self.executor = futures.ProcessPoolExecutor(
+            max_workers=self.max_workers, mp_context=ctxt, initializer=jax_cache.initialize_worker
+        )
 
     def submit(self, task_fn, *args, **kwargs) -> BaseFuture:
         """
@@ -1,4 +1,12 @@
-from .potential import BoundGpuImplWrapper, BoundPotential, GpuImplWrapper, Potential
+from .potential import (
+    BoundCpuImplWrapper,
+    BoundGpuImplWrapper,
+    BoundPotential,
+    CpuImplWrapper,
+    GpuImplWrapper,
+    Potential,
+    SharedGeometryPotential,
+)
 from .potentials import (
     CentroidRestraint,
     ChiralAtomRestraint,
@@ -21,11 +29,13 @@ from .potentials import (
 )
 
 __all__ = [
+    "BoundCpuImplWrapper",
     "BoundGpuImplWrapper",
     "BoundPotential",
     "CentroidRestraint",
     "ChiralAtomRestraint",
     "ChiralBondRestraint",
+    "CpuImplWrapper",
     "FanoutSummedPotential",
     "FlatBottomBond",
     "GpuImplWrapper",
@@ -41,6 +51,7 @@ __all__ = [
     "NonbondedPairListPrecomputed",
     "PeriodicTorsion",
     "Potential",
+    "SharedGeometryPotential",
     "SummedPotential",
     "make_summed_potential",
 ]
@@ -62,6 +62,11 @@ def harmonic_bond(conf, params, box, bond_idxs):
     if bond_idxs.shape[0] == 0:
         return 0.0
 
+    return harmonic_bond_from_geometry(harmonic_bond_geometry(conf, bond_idxs), params)
+
+
+def harmonic_bond_geometry(conf, bond_idxs):
+    """Squared bond lengths and bond lengths, each of shape [num_bonds]. See `harmonic_bond`"""
     ci = conf[bond_idxs[:, 0]]
     cj = conf[bond_idxs[:, 1]]
 
@@ -69,6 +74,12 @@ def harmonic_bond(conf, params, box, bond_idxs):
     d2ij = jnp.sum(cij * cij, axis=-1)
     d2ij = jnp.where(d2ij == 0, 0, d2ij)  # stabilize derivative
     dij = jnp.sqrt(d2ij)
+    return d2ij, dij
+
+
+def harmonic_bond_from_geometry(geometry, params):
+    """Harmonic bond energy given the output of `harmonic_bond_geometry`"""
+    d2ij, dij = geometry
     kbs = params[:, 0]
     r0s = params[:, 1]
 
@@ -86,8 +97,13 @@ def kahan_angle(ci, cj, ck, eps):
     Note: eps is a small value used to stabilize computation when either r_ji or r_jk goes to zero.
     See: https://github.com/proteneer/timemachine/pull/935
     """
-    rji = jnp.hstack([ci - cj, jnp.expand_dims(eps, axis=-1)])
-    rjk = jnp.hstack([ck - cj, jnp.expand_dims(eps, axis=-1)])
+    return kahan_angle_from_displacements(ci - cj, ck - cj, eps)
+
+
+def kahan_angle_from_displacements(dji, djk, eps):
+    """`kahan_angle` given the displacement vectors dji = ci - cj and djk = ck - cj"""
+    rji = jnp.hstack([dji, jnp.expand_dims(eps, axis=-1)])
+    rjk = jnp.hstack([djk, jnp.expand_dims(eps, axis=-1)])
     nji = jnp.linalg.norm(rji, axis=-1)
     njk = jnp.linalg.norm(rjk, axis=-1)
     nji = jnp.expand_dims(nji, axis=-1)
@@ -131,9 +147,25 @@ def harmonic_angle(conf, params, box, angle_idxs):
     """
     if angle_idxs.shape[0] == 0:
         return 0.0
+    return harmonic_angle_from_geometry(harmonic_angle_geometry(conf, angle_idxs), params)
+
+
+def harmonic_angle_geometry(conf, angle_idxs):
+    """Displacement vectors (ci - cj, ck - cj), each of shape [num_angles, 3]. See `harmonic_angle`
+
+    Notes
+    -----
+    * The angles themselves depend on the epsilon parameters, so are computed in `harmonic_angle_from_geometry`
+    """
     ci, cj, ck = conf[angle_idxs.T]
+    return ci - cj, ck - cj
+
+
+def harmonic_angle_from_geometry(geometry, params):
+    """Harmonic angle energy given the output of `harmonic_angle_geometry`"""
+    dji, djk = geometry
     kas, a0s, eps = params.T
-    angle = kahan_angle(ci, cj, ck, eps)
+    angle = kahan_angle_from_displacements(dji, djk, eps)
     energies = kas / 2 * jnp.power(angle - a0s, 2)
     return jnp.sum(energies, -1)
 
@@ -200,6 +232,11 @@ def periodic_torsion(conf, params, box, torsion_idxs):
     if torsion_idxs.shape[0] == 0:
         return 0.0
 
+    return periodic_torsion_from_geometry(periodic_torsion_geometry(conf, torsion_idxs), params)
+
+
+def periodic_torsion_geometry(conf, torsion_idxs):
+    """Torsion angles, shape [num_torsions]. See `periodic_torsion`"""
     conf = conf[:, :3]  # this is defined only in 3d
 
     ci = conf[torsion_idxs[:, 0]]
@@ -207,10 +244,14 @@ def periodic_torsion(conf, params, box, torsion_idxs):
     ck = conf[torsion_idxs[:, 2]]
     cl = conf[torsion_idxs[:, 3]]
 
+    return signed_torsion_angle(ci, cj, ck, cl)
+
+
+def periodic_torsion_from_geometry(angle, params):
+    """Periodic torsion energy given the output of `periodic_torsion_geometry`"""
     ks = params[:, 0]
     phase = params[:, 1]
     period = params[:, 2]
-    angle = signed_torsion_angle(ci, cj, ck, cl)
 
     nrg = ks * (1 + jnp.cos(period * angle - phase))
     return jnp.sum(nrg, axis=-1)
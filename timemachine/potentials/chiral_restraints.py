@@ -112,6 +112,17 @@ def chiral_atom_restraint(conf, params, box, idxs):
     return jnp.sum(U_chiral_atom_batch_all(conf, idxs, params)) if len(idxs) else 0.0
 
 
+def chiral_atom_restraint_geometry(conf, idxs):
+    """Chiral volumes, shape [num_restraints]. See `chiral_atom_restraint`"""
+    x = jnp.array(conf)
+    return jax.vmap(lambda idxs: pyramidal_volume(*x[idxs]))(jnp.asarray(idxs))
+
+
+def chiral_atom_restraint_from_geometry(volumes, params):
+    """Chiral atom restraint energy given the output of `chiral_atom_restraint_geometry`"""
+    return jnp.sum(jnp.where(volumes > 0, params * volumes**2, 0.0))
+
+
 def chiral_bond_restraint(conf, params, box, idxs, signs):
     """
     Flat-bottom chiral bond restraint
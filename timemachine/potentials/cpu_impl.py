@@ -0,0 +1,291 @@
+"""Reference implementations of the custom_ops.Potential and custom_ops.BoundPotential interfaces that run on the CPU.
+
+These evaluate the JAX reference potentials (jitted and vmapped over batches), and can be used as drop-in
+replacements for the GPU implementations in code paths that only require the `execute*` methods, e.g. computing
+u_kln matrices on machines without a GPU.
+"""
+
+from typing import Optional
+
+import jax
+import numpy as np
+from numpy.typing import NDArray
+
+from .jax_utils import DEFAULT_CHUNK_SIZE
+from .types import PotentialFxn
+
+
+def _next_power_of_two(n: int) -> int:
+    return 1 << (n - 1).bit_length()
+
+
+def _make_batch_fxn(U_fn: PotentialFxn, compute_du_dx: bool, compute_du_dp: bool):
+    """Returns a jitted function mapping batches of (coords, params, box) to (u, (du_dx?, du_dp?))"""
+    argnums = tuple(argnum for argnum, flag in [(0, compute_du_dx), (1, compute_du_dp)] if flag)
+
+    def f(conf, params, box):
+        if not argnums:
+            return U_fn(conf, params, box), ()
+        return jax.value_and_grad(U_fn, argnums)(conf, params, box)
+
+    return jax.jit(jax.vmap(f))
+
+
+class CpuImpl:
+    """Evaluates a potential function on the CPU using JAX, with the same `execute*` interface as custom_ops.Potential.
+
+    Batches are evaluated in chunks of at most `chunk_size` (coords, params) pairs to bound memory consumption. Chunks
+    are padded to the next power of two to limit the number of distinct shapes that need to be compiled.
+    """
+
+    def __init__(self, potential: PotentialFxn, precision=np.float64, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        assert chunk_size > 0
+        self.potential = potential
+        self.precision = precision
+        self.chunk_size = chunk_size
+        self._batch_fxns: dict[tuple[bool, bool], object] = {}
+        self._call_batch_fxn = None
+
+    def _get_batch_fxn(self, compute_du_dx: bool, compute_du_dp: bool):
+        key = (compute_du_dx, compute_du_dp)
+        if key not in self._batch_fxns:
+            self._batch_fxns[key] = _make_batch_fxn(self.potential, compute_du_dx, compute_du_dp)
+        return self._batch_fxns[key]
+
+    def _get_call_batch_fxn(self):
+        if self._call_batch_fxn is None:
+            call_batch = getattr(self.potential, "call_batch", None)
+            self._call_batch_fxn = jax.jit(call_batch) if call_batch is not None else None
+        return self._call_batch_fxn
+
+    def _execute_batch_u(self, coords: NDArray, params: NDArray, boxes: NDArray) -> NDArray:
+        """Energies for every combination of coords and params, using `Potential.call_batch` to evaluate all
+        parameter sets for each chunk of frames in a single call"""
+        call_batch_fxn = self._get_call_batch_fxn()
+        coords = np.asarray(coords, dtype=self.precision)
+        params = np.asarray(params, dtype=self.precision)
+        boxes = np.asarray(boxes, dtype=self.precision)
+
+        n_coords, n_params = coords.shape[0], params.shape[0]
+        frames_per_chunk = max(1, self.chunk_size // n_params)
+        us = np.empty((n_coords, n_params))
+
+        for start in range(0, n_coords, frames_per_chunk):
+            stop = min(start + frames_per_chunk, n_coords)
+            n = stop - start
+            n_padded = min(_next_power_of_two(n), frames_per_chunk)
+            idxs = np.pad(np.arange(start, stop), (0, n_padded - n), mode="edge")
+            us[start:stop] = np.asarray(call_batch_fxn(coords[idxs], params, boxes[idxs]))[:n]
+
+        return us
+
+    def _execute_pairs(
+        self,
+        coords: NDArray,
+        params: NDArray,
+        boxes: NDArray,
+        coords_batch_idxs: NDArray,
+        params_batch_idxs: NDArray,
+        compute_du_dx: bool,
+        compute_du_dp: bool,
+        compute_u: bool,
+    ) -> tuple[Optional[NDArray], Optional[NDArray], Optional[NDArray]]:
+        batch_size = len(coords_batch_idxs)
+        coords = np.asarray(coords, dtype=self.precision)
+        params = np.asarray(params, dtype=self.precision)
+        boxes = np.asarray(boxes, dtype=self.precision)
+
+        batch_fxn = self._get_batch_fxn(compute_du_dx, compute_du_dp)
+
+        us = np.empty(batch_size) if compute_u else None
+        du_dxs = np.empty((batch_size, *coords.shape[1:])) if compute_du_dx else None
+        du_dps = np.empty((batch_size, *params.shape[1:])) if compute_du_dp else None
+
+        start = 0
+        while start < batch_size:
+            stop = min(start + self.chunk_size, batch_size)
+            n = stop - start
+            n_padded = min(_next_power_of_two(n), self.chunk_size)
+            # pad by repeating the last element of the chunk to avoid compiling a new function for each chunk size
+            c_idxs = np.pad(coords_batch_idxs[start:stop], (0, n_padded - n), mode="edge")
+            p_idxs = np.pad(params_batch_idxs[start:stop], (0, n_padded - n), mode="edge")
+
+            u, grads = batch_fxn(coords[c_idxs], params[p_idxs], boxes[c_idxs])
+            grads = list(grads)
+            if us is not None:
+                us[start:stop] = np.asarray(u)[:n]
+            if du_dxs is not None:
+                du_dxs[start:stop] = np.asarray(grads.pop(0))[:n]
+            if du_dps is not None:
+                du_dps[start:stop] = np.asarray(grads.pop(0))[:n]
+            start = stop
+
+        return du_dxs, du_dps, us
+
+    def execute(
+        self,
+        coords: NDArray,
+        params: NDArray,
+        box: NDArray,
+        compute_du_dx: bool = True,
+        compute_du_dp: bool = True,
+        compute_u: bool = True,
+    ) -> tuple:
+        """Evaluate the potential on a single (coords, params, box). See `custom_ops.Potential.execute`
+
+        Returns
+        -------
+        3-tuple of du_dx, du_dp, u
+            Elements that were not requested are returned as None
+        """
+        idxs = np.zeros(1, dtype=np.uint32)
+        du_dx, du_dp, u = self._execute_pairs(
+            np.asarray(coords)[np.newaxis],
+            np.asarray(params)[np.newaxis],
+            np.asarray(box)[np.newaxis],
+            idxs,
+            idxs,
+            compute_du_dx,
+            compute_du_dp,
+            compute_u,
+        )
+        return (
+            du_dx[0] if du_dx is not None else None,
+            du_dp[0] if du_dp is not None else None,
+            float(u[0]) if u is not None else None,
+        )
+
+    def execute_du_dx(self, coords: NDArray, params: NDArray, box: NDArray) -> NDArray:
+        du_dx, _, _ = self.execute(coords, params, box, True, False, False)
+        return du_dx
+
+    def execute_batch(
+        self,
+        coords: NDArray,
+        params: NDArray,
+        boxes: NDArray,
+        compute_du_dx: bool,
+        compute_du_dp: bool,
+        compute_u: bool,
+    ) -> tuple:
+        """Evaluate the potential on every combination of coords and params. See `custom_ops.Potential.execute_batch`
+
+        Returns
+        -------
+        3-tuple of du_dx, du_dp, u
+            coords_batch_size = coords.shape[0]
+            param_batch_size = params.shape[0]
+            du_dx has shape (coords_batch_size, param_batch_size, N, 3)
+            du_dp has shape (coords_batch_size, param_batch_size, P)
+            u has shape (coords_batch_size, param_batch_size)
+        """
+        coords = np.asarray(coords)
+        params = np.asarray(params)
+        boxes = np.asarray(boxes)
+        if coords.ndim != 3 or boxes.ndim != 3:
+            raise RuntimeError("coords and boxes must have 3 dimensions")
+        if coords.shape[0] != boxes.shape[0]:
+            raise RuntimeError("number of batches of coords and boxes don't match")
+        if params.ndim < 2:
+            raise RuntimeError("parameters must have at least 2 dimensions")
+
+        n_coords = coords.shape[0]
+        n_params = params.shape[0]
+
+        if compute_u and not compute_du_dx and not compute_du_dp and self._get_call_batch_fxn() is not None:
+            return None, None, self._execute_batch_u(coords, params, boxes)
+
+        # outer loop over coords, inner loop over params
+        coords_batch_idxs = np.repeat(np.arange(n_coords, dtype=np.uint32), n_params)
+        params_batch_idxs = np.tile(np.arange(n_params, dtype=np.uint32), n_coords)
+
+        du_dx, du_dp, u = self._execute_pairs(
+            coords, params, boxes, coords_batch_idxs, params_batch_idxs, compute_du_dx, compute_du_dp, compute_u
+        )
+
+        def unflatten(x: Optional[NDArray]) -> Optional[NDArray]:
+            return x.reshape(n_coords, n_params, *x.shape[1:]) if x is not None else None
+
+        return unflatten(du_dx), unflatten(du_dp), unflatten(u)
+
+    def execute_batch_sparse(
+        self,
+        coords: NDArray,
+        params: NDArray,
+        boxes: NDArray,
+        coords_batch_idxs: NDArray,
+        params_batch_idxs: NDArray,
+        compute_du_dx: bool,
+        compute_du_dp: bool,
+        compute_u: bool,
+    ) -> tuple:
+        """Evaluate the potential on the pairs (coords[coords_batch_idxs[i]], params[params_batch_idxs[i]]). See
+        `custom_ops.Potential.execute_batch_sparse`
+
+        Returns
+        -------
+        3-tuple of du_dx, du_dp, u
+            batch_size = len(coords_batch_idxs)
+            du_dx has shape (batch_size, N, 3)
+            du_dp has shape (batch_size, P)
+            u has shape (batch_size,)
+        """
+        coords = np.asarray(coords)
+        params = np.asarray(params)
+        boxes = np.asarray(boxes)
+        coords_batch_idxs = np.asarray(coords_batch_idxs)
+        params_batch_idxs = np.asarray(params_batch_idxs)
+        if coords.ndim != 3 or boxes.ndim != 3:
+            raise RuntimeError("coords and boxes must have 3 dimensions")
+        if coords.shape[0] != boxes.shape[0]:
+            raise RuntimeError("number of coord arrays and boxes don't match")
+        if params.ndim < 2:
+            raise RuntimeError("parameters must have at least 2 dimensions")
+        if coords_batch_idxs.ndim != 1 or params_batch_idxs.ndim != 1:
+            raise RuntimeError("coords_batch_idxs and params_batch_idxs must be one-dimensional arrays")
+        if len(coords_batch_idxs) != len(params_batch_idxs):
+            raise RuntimeError("coords_batch_idxs and params_batch_idxs must have the same length")
+        if np.any(coords_batch_idxs >= coords.shape[0]):
+            raise RuntimeError("coords_batch_idxs contains an index that is out of bounds")
+        if np.any(params_batch_idxs >= params.shape[0]):
+            raise RuntimeError("params_batch_idxs contains an index that is out of bounds")
+
+        return self._execute_pairs(
+            coords, params, boxes, coords_batch_idxs, params_batch_idxs, compute_du_dx, compute_du_dp, compute_u
+        )
+
+
+class BoundCpuImpl:
+    """CPU counterpart of custom_ops.BoundPotential"""
+
+    def __init__(self, potential: CpuImpl, params: NDArray):
+        self.potential = potential
+        self.params = np.array(params)
+
+    def get_potential(self) -> CpuImpl:
+        return self.potential
+
+    def set_params(self, params: NDArray):
+        params = np.asarray(params)
+        if params.size != self.params.size:
+            raise RuntimeError(
+                f"parameter size is not equal to device buffer size: {params.size} != {self.params.size}"
+            )
+        self.params = params.reshape(self.params.shape)
+
+    def size(self) -> int:
+        return self.params.size
+
+    def execute(self, coords: NDArray, box: NDArray, compute_du_dx: bool = True, compute_u: bool = True) -> tuple:
+        du_dx, _, u = self.potential.execute(coords, self.params, box, compute_du_dx, False, compute_u)
+        return du_dx, u
+
+    def execute_batch(self, coords: NDArray, boxes: NDArray, compute_du_dx: bool, compute_u: bool) -> tuple:
+        """Returns 2-tuple of du_dx with shape (coords_batch_size, N, 3) and u with shape (coords_batch_size,)"""
+        du_dx, _, u = self.potential.execute_batch(
+            coords, self.params[np.newaxis], boxes, compute_du_dx, False, compute_u
+        )
+        return (
+            du_dx[:, 0] if du_dx is not None else None,
+            u[:, 0] if u is not None else None,
+        )
@@ -1,8 +1,12 @@
-from typing import TypeAlias, cast
+from collections.abc import Iterable, Sized
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
+from typing import NamedTuple, Optional, TypeAlias, cast
 
+import jax
 import jax.numpy as jnp
 import numpy as np
-from jax import vmap
+from jax import lax, vmap
 from jax.scipy.special import logsumexp
 from numpy.typing import NDArray
 
@@ -116,7 +120,8 @@ def get_interacting_pair_indices_batch(confs, boxes, pairs, cutoff=1.2):
 
     Notes
     -----
-    * Padding causes some amount of wasted effort, but keeps things nice and fixed-dimensional for later XLA steps
+    * Padding causes some amount of wasted effort, but keeps things nice and fixed-dimensional for later XLA steps.
+        See `get_interacting_pair_indices_csr` for an unpadded alternative
     """
     n_snapshots, n_atoms, dim = confs.shape
     assert boxes.shape == (n_snapshots, dim, dim)
@@ -141,6 +146,104 @@ def get_interacting_pair_indices_batch(confs, boxes, pairs, cutoff=1.2):
     return batch_pairs
 
 
+class PairListCSR(NamedTuple):
+    """Ragged batch of per-frame pair lists, in compressed sparse row format
+
+    The pairs interacting in frame k are pairs[offsets[k]:offsets[k + 1]]. If padded (see
+    `get_interacting_pair_indices_csr`), pairs has more than offsets[-1] rows, and the trailing rows are padding
+    entries that belong to no frame.
+
+    All fields are arrays, and methods use only jax operations on them, so pair lists can be passed as arguments to
+    jitted functions.
+
+    offsets : (n_frames + 1,) int array
+    pair_idxs : (n_entries,) int array
+        Row indices into the array of candidate pairs that the pair list was constructed from
+    pairs : (n_entries, 2) int array
+        candidate_pairs[pair_idxs]
+    frame_idxs : (n_entries,) int array
+        Frame index of each entry, with padding entries assigned the out-of-range index n_frames
+    mask : (n_entries,) bool array
+        False for padding entries
+    """
+
+    offsets: Array
+    pair_idxs: Array
+    pairs: Array
+    frame_idxs: Array
+    mask: Array
+
+    @property
+    def n_frames(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def n_pairs(self) -> Array:
+        """number of non-padding entries"""
+        return self.offsets[-1]
+
+    def sum_by_frame(self, values) -> Array:
+        """Reduce per-entry values of shape (n_entries, ...) to per-frame sums of shape (n_frames, ...). Values of
+        padding entries are dropped."""
+        return cast(Array, jax.ops.segment_sum(values, self.frame_idxs, num_segments=self.n_frames))
+
+
+def get_interacting_pair_indices_csr(
+    confs, boxes, pairs, cutoff=1.2, chunk_size=DEFAULT_CHUNK_SIZE, pad_to_power_of_two=False
+) -> PairListCSR:
+    """Given candidate interacting pairs, select the pairs whose distances are < cutoff in each frame
+
+    Unlike `get_interacting_pair_indices_batch`, frames are not padded to a common number of pairs.
+
+    Parameters
+    ----------
+    confs: (n_snapshots, n_atoms, dim) float array
+    boxes: (n_snapshots, dim, dim) float array
+    pairs: (n_candidate_pairs, 2) integer array
+    cutoff: float
+    chunk_size: int
+        number of frames for which to compute candidate pair distances simultaneously
+    pad_to_power_of_two: bool
+        if True, pad the total number of entries to the next power of two, so that functions consuming pair lists of
+        similar sizes can be compiled once. Padding entries repeat the first candidate pair, and are excluded by
+        `PairListCSR.mask` and `PairListCSR.sum_by_frame`
+
+    Returns
+    -------
+    PairListCSR
+    """
+    n_snapshots, n_atoms, dim = confs.shape
+    assert boxes.shape == (n_snapshots, dim, dim)
+    pairs = np.asarray(pairs)
+    assert len(pairs) > 0
+
+    counts = []
+    pair_idxs = []
+    for start in range(0, n_snapshots, chunk_size):
+        stop = start + chunk_size
+        distances = vmap(distance_on_pairs)(
+            confs[start:stop, pairs[:, 0]], confs[start:stop, pairs[:, 1]], boxes[start:stop]
+        )
+        neighbor_masks = np.asarray(distances < cutoff)
+        counts.append(neighbor_masks.sum(1))
+        # row-major order of np.nonzero keeps pairs grouped by frame
+        pair_idxs.append(np.nonzero(neighbor_masks)[1])
+
+    offsets = np.concatenate([[0], np.cumsum(np.concatenate(counts))]).astype(np.int64)
+    pair_idxs_ = np.concatenate(pair_idxs).astype(np.int32)
+
+    n_pairs = len(pair_idxs_)
+    if pad_to_power_of_two:
+        n_padded = 1 << max(n_pairs - 1, 0).bit_length()
+        pair_idxs_ = np.pad(pair_idxs_, (0, n_padded - n_pairs))
+
+    counts_with_padding = np.append(np.diff(offsets), len(pair_idxs_) - n_pairs)
+    frame_idxs = np.repeat(np.arange(n_snapshots + 1, dtype=np.int32), counts_with_padding)
+    mask = np.arange(len(pair_idxs_)) < n_pairs
+
+    return PairListCSR(offsets, pair_idxs_, pairs[pair_idxs_], frame_idxs, mask)
+
+
 def pairwise_distances(x, box=None, w=None):
     """
     Compute the (N, N) distance matrix given an (N, D) array of coordinates. If
@@ -162,12 +265,29 @@ def pairwise_distances(x, box=None, w=None):
     w : ndarray (N, 1), optional
         coordinates in aperiodic lifting dimension
     """
+    return pairwise_distances_from_distances2(pairwise_distances2(x, box), w)
+
+
+def pairwise_distances2(x, box=None):
+    """
+    Compute the (N, N) matrix of squared distances given an (N, D) array of coordinates. If `box` is passed, computes
+    nearest distances assuming periodic boundaries.
+    """
     n, d = x.shape
     if box is not None:
         assert box.shape == (d, d)
 
     d_ijk = delta_r(x[:, None], x[None, :], box)  # (x_i, x_j, dimension)
     d2_ij = jnp.sum(d_ijk**2, axis=2)
+    return d2_ij
+
+
+def pairwise_distances_from_distances2(d2_ij, w=None):
+    """
+    Compute the (N, N) distance matrix given the (N, N) matrix of squared distances in the primary dimensions (see
+    `pairwise_distances2`), and optionally an (N,) array of coordinates in the aperiodic lifting dimension.
+    """
+    n = d2_ij.shape[0]
 
     if w is not None:
         assert w.shape == (n,)
@@ -181,6 +301,162 @@ def pairwise_distances(x, box=None, w=None):
     return d_ij
 
 
+DEFAULT_PAIRWISE_MEMORY_BUDGET = 256 * 1024**2  # bytes
+
+
+def pairwise_block_size(n: int, d: int, dtype, memory_budget: int = DEFAULT_PAIRWISE_MEMORY_BUDGET) -> int:
+    """Number of rows per block such that the (block_size, n, d) displacement tensor and a few (block_size, n)
+    intermediates fit within memory_budget bytes"""
+    nbytes_per_row = n * (d + 4) * np.dtype(dtype).itemsize
+    return int(np.clip(memory_budget // nbytes_per_row, 1, max(n, 1)))
+
+
+def _row_blocks(n: int, block_size: int) -> tuple[NDArray, NDArray]:
+    """Row indices of shape (n_blocks, block_size), padded by repeating the last row, and a mask of valid rows"""
+    n_blocks = -(-n // block_size)
+    row_idxs = np.arange(n_blocks * block_size).reshape(n_blocks, block_size)
+    return np.minimum(row_idxs, n - 1), row_idxs < n
+
+
+def pairwise_distances_rows(x, row_idxs, box=None, w=None):
+    """
+    Compute the (B, N) block of rows `row_idxs` of the distance matrix `pairwise_distances(x, box, w)`, without
+    materializing any (N, N) intermediates.
+    """
+    x = jnp.asarray(x)
+    n, d = x.shape
+    if box is not None:
+        assert box.shape == (d, d)
+
+    d_ijk = delta_r(x[row_idxs][:, None], x[None, :], box)  # (x_i, x_j, dimension)
+    d2_ij = jnp.sum(d_ijk**2, axis=2)
+
+    if w is not None:
+        w = jnp.asarray(w)
+        assert w.shape == (n,)
+        dw_ij = w[row_idxs][:, None] - w[None, :]
+        d2_ij += dw_ij**2
+
+    # prevent nans in gradient
+    is_diagonal = row_idxs[:, None] == jnp.arange(n)[None, :]
+    d2_ij = jnp.where(is_diagonal, 0.0, d2_ij)
+
+    d_ij = jnp.sqrt(d2_ij)
+    return d_ij
+
+
+def pairwise_distances_blocked(
+    x, box=None, w=None, block_size: Optional[int] = None, memory_budget: int = DEFAULT_PAIRWISE_MEMORY_BUDGET
+):
+    """
+    Equivalent to `pairwise_distances(x, box, w)`, but computed in blocks of rows using `lax.map`, so that peak memory
+    is O(block_size * N * D) rather than O(N^2 * D) (excluding the (N, N) result).
+
+    Parameters
+    ----------
+    x, box, w:
+        See `pairwise_distances`
+
+    block_size : int, optional
+        Number of rows per block. If not passed, determined from memory_budget
+
+    memory_budget : int
+        Approximate number of bytes to use for intermediates of each block. Ignored if block_size is passed.
+    """
+    n, d = x.shape
+    block_size = block_size or pairwise_block_size(n, d, x.dtype, memory_budget)
+    row_idxs, _ = _row_blocks(n, block_size)
+    d_ij = lax.map(lambda idxs: pairwise_distances_rows(x, idxs, box, w), row_idxs)
+    return d_ij.reshape(-1, n)[:n]
+
+
+def pairwise_sum_blocked(
+    f_rows, x, box=None, w=None, block_size: Optional[int] = None, memory_budget: int = DEFAULT_PAIRWISE_MEMORY_BUDGET
+):
+    """
+    Compute the sum over all rows i and columns j of f_rows(row_idxs, d_ij), where d_ij is the (B, N) block of rows
+    `row_idxs` of `pairwise_distances(x, box, w)`, without materializing any (N, N) intermediates.
+
+    Each block is rematerialized in the backward pass (see `jax.checkpoint`), so that memory remains bounded when
+    differentiating.
+
+    Parameters
+    ----------
+    f_rows : function (row_idxs, d_ij) -> array
+        Maps (B,) row indices and a (B, N) block of distances to a (B, N) array of pairwise terms. Padding rows are
+        excluded from the sum.
+
+    x, box, w:
+        See `pairwise_distances`
+
+    block_size : int, optional
+        Number of rows per block. If not passed, determined from memory_budget
+
+    memory_budget : int
+        Approximate number of bytes to use for intermediates of each block. Ignored if block_size is passed.
+    """
+    n, d = x.shape
+    block_size = block_size or pairwise_block_size(n, d, x.dtype, memory_budget)
+    row_idxs, row_mask = _row_blocks(n, block_size)
+
+    @jax.checkpoint
+    def block_sum(args):
+        idxs, mask = args
+        terms = f_rows(idxs, pairwise_distances_rows(x, idxs, box, w))
+        return jnp.sum(jnp.where(mask[:, None], terms, 0.0))
+
+    return jnp.sum(lax.map(block_sum, (row_idxs, row_mask)))
+
+
+class PairGeometry:
+    """Squared (minimum-image, if box is passed) distances between pairs of atoms in a single frame, computed once and
+    shared between several pair-based potential terms (see `potential.PairGeometryPotential`)
+
+    If pairs is None, the full (N, N) table of squared distances is computed. Otherwise, only the squared distances
+    for the (unordered) pairs of atoms in pairs are computed, and only these pairs can be queried.
+
+    Pair indices must be concrete (e.g. numpy arrays), since lookups into the table are resolved at trace time.
+    """
+
+    def __init__(self, conf, box=None, pairs: Optional[NDArray] = None):
+        self.num_atoms = conf.shape[0]
+        if pairs is None:
+            self._keys = None
+            self._distances2 = pairwise_distances2(conf, box)
+        else:
+            self._keys = np.unique(self._encode(np.asarray(pairs).reshape(-1, 2)))
+            idxs_l, idxs_r = np.divmod(self._keys, self.num_atoms)
+            self._distances2 = jnp.sum(delta_r(conf[idxs_l], conf[idxs_r], box) ** 2, axis=-1)
+
+    @property
+    def is_dense(self) -> bool:
+        return self._keys is None
+
+    def _encode(self, pairs: NDArray) -> NDArray:
+        pairs = np.sort(pairs, axis=1).astype(np.int64)
+        return pairs[:, 0] * self.num_atoms + pairs[:, 1]
+
+    def distances2(self, pairs: NDArray) -> Array:
+        """Squared distances for each pair, shape (P,)"""
+        pairs = np.asarray(pairs).reshape(-1, 2)
+        if self._keys is None:
+            return self._distances2[pairs[:, 0], pairs[:, 1]]
+
+        keys = self._encode(pairs)
+        idxs = np.minimum(np.searchsorted(self._keys, keys), max(len(self._keys) - 1, 0))
+        if len(keys) and (len(self._keys) == 0 or np.any(self._keys[idxs] != keys)):
+            raise ValueError("distances requested for pairs that were not included in the geometry")
+        return self._distances2[idxs]
+
+    def pairwise_distances2(self, atom_idxs: Optional[NDArray] = None) -> Array:
+        """(N, N) squared distances (see `pairwise_distances2`), optionally restricted to a subset of atoms"""
+        if self._keys is not None:
+            raise ValueError("pairwise distances require a dense geometry (pairs=None)")
+        if atom_idxs is None:
+            return self._distances2
+        return self._distances2[np.ix_(atom_idxs, atom_idxs)]
+
+
 def distance_from_one_to_others(x_i, x_others, box=None, cutoff=jnp.inf):
     """[d(x_i, x_j, box) for x_j in x_others]
 
@@ -224,13 +500,142 @@ def bernoulli_logpdf(log_p_i, z_i) -> float:
 def process_traj_in_chunks(f_snapshot, xs, boxes, chunk_size=DEFAULT_CHUNK_SIZE):
     """drop-in replacement for jax.vmap(f_snapshot)(xs, boxes)
 
-    intent: limit memory consumption when len(xs) is large"""
+    intent: limit memory consumption when len(xs) is large
+
+    If xs is a jax array (e.g. on device, or traced), chunks are evaluated directly with vmap. Otherwise (e.g. numpy
+    arrays or StoredArrays), uses `process_traj_streaming`, which reads the next chunk on a background thread while
+    the current chunk is evaluated. See `process_traj_streaming` for a version that selects chunk_size based on a
+    memory budget and accepts trajectories that do not fit in memory"""
+
+    if isinstance(xs, jax.Array):
+        n_chunks = int(np.ceil(len(xs) / chunk_size))
+
+        def process_chunk(i):
+            start = i * chunk_size
+            stop = (i + 1) * chunk_size
+            return vmap(f_snapshot)(xs[start:stop], boxes[start:stop])
+
+        return jnp.concatenate([process_chunk(i) for i in range(n_chunks)])
+
+    return jnp.asarray(process_traj_streaming(f_snapshot, xs, boxes, chunk_size=chunk_size))
+
+
+def _aval_nbytes(aval) -> int:
+    size = getattr(aval, "size", 0)
+    dtype = getattr(aval, "dtype", None)
+    return int(size) * np.dtype(dtype).itemsize if dtype is not None else 0
 
-    n_chunks = int(np.ceil(len(xs) / chunk_size))
 
-    def process_chunk(i):
-        start = i * chunk_size
-        stop = (i + 1) * chunk_size
-        return vmap(f_snapshot)(xs[start:stop], boxes[start:stop])
+def _jaxpr_intermediate_nbytes(jaxpr) -> int:
+    """Total size of all intermediate values in a jaxpr, including those in nested jaxprs (e.g. from jit, cond)"""
+    nbytes = 0
+    for eqn in jaxpr.eqns:
+        nbytes += sum(_aval_nbytes(v.aval) for v in eqn.outvars)
+        for param in eqn.params.values():
+            for p in param if isinstance(param, (tuple, list)) else [param]:
+                if isinstance(p, jax.core.ClosedJaxpr):
+                    nbytes += _jaxpr_intermediate_nbytes(p.jaxpr)
+                elif isinstance(p, jax.core.Jaxpr):
+                    nbytes += _jaxpr_intermediate_nbytes(p)
+    return nbytes
 
-    return jnp.concatenate([process_chunk(i) for i in range(n_chunks)])
+
+def estimate_nbytes_per_frame(f_snapshot, x, box) -> int:
+    """Conservative estimate of the memory required to evaluate f_snapshot(x, box) on a single frame, assuming every
+    intermediate value is live simultaneously. In practice XLA fuses and reuses buffers, so peak memory is lower."""
+    closed_jaxpr = jax.make_jaxpr(f_snapshot)(x, box)
+    input_nbytes = sum(_aval_nbytes(v.aval) for v in closed_jaxpr.jaxpr.invars)
+    return input_nbytes + _jaxpr_intermediate_nbytes(closed_jaxpr.jaxpr)
+
+
+DEFAULT_MEMORY_BUDGET = 2 * 1024**3  # bytes
+
+
+def process_traj_streaming(
+    f_snapshot,
+    xs: Iterable,
+    boxes: Optional[Iterable],
+    memory_budget: int = DEFAULT_MEMORY_BUDGET,
+    chunk_size: Optional[int] = None,
+    out: Optional[NDArray] = None,
+) -> NDArray:
+    """Evaluate [f_snapshot(x, box) for (x, box) in zip(xs, boxes)] in chunks, using bounded memory.
+
+    Frames are read from xs (and boxes) in chunks; the next chunk is read on a background thread while the current
+    chunk is being evaluated by vmap(f_snapshot). Results are written into a preallocated output array.
+
+    The final chunk is padded to chunk_size frames, so that jitted functions called by f_snapshot are only compiled
+    for a single batch shape.
+
+    Parameters
+    ----------
+    f_snapshot : function (x, box) -> array
+    xs : iterable of (N, 3) arrays
+        Any iterable of frames, e.g. a [T, N, 3] array, or a StoredArrays
+    boxes : iterable of (3, 3) arrays, or None
+        If None, f_snapshot is called with box=None
+    memory_budget : int
+        Approximate number of bytes to use for each chunk. Ignored if chunk_size is passed.
+        The number of frames per chunk is memory_budget // estimate_nbytes_per_frame(f_snapshot, x, box)
+    chunk_size : int, optional
+        Number of frames per chunk
+    out : array, optional
+        Preallocated output (e.g. a np.memmap) of shape [T, ...]. If not provided, allocated when len(xs) is
+        defined; otherwise chunk results are concatenated.
+
+    Returns
+    -------
+    out: [T, ...] array
+    """
+    frames = iter(zip(xs, boxes) if boxes is not None else ((x, None) for x in xs))
+    try:
+        x_0, box_0 = next(frames)
+    except StopIteration:
+        raise ValueError("empty trajectory")
+    frames = chain([(x_0, box_0)], frames)
+
+    n_frames = len(xs) if isinstance(xs, Sized) else None
+    if chunk_size is None:
+        nbytes_per_frame = estimate_nbytes_per_frame(f_snapshot, x_0, box_0)
+        chunk_size = max(1, memory_budget // nbytes_per_frame)
+    if n_frames is not None:
+        chunk_size = min(chunk_size, n_frames)
+    assert chunk_size > 0
+
+    if out is None and n_frames is not None:
+        out_shape = jax.eval_shape(f_snapshot, x_0, box_0)
+        out = np.empty((n_frames, *out_shape.shape), dtype=out_shape.dtype)
+
+    def read_chunk():
+        chunk = list(islice(frames, chunk_size))
+        if not chunk:
+            return None
+        x_chunk = np.stack([np.asarray(x) for x, _ in chunk])
+        box_chunk = np.stack([np.asarray(box) for _, box in chunk]) if boxes is not None else None
+        return x_chunk, box_chunk
+
+    def pad(a, n):
+        # pad the final chunk by repeating the last frame, to avoid compiling for a new shape
+        return np.concatenate([a, np.repeat(a[-1:], n - len(a), axis=0)]) if a is not None and len(a) < n else a
+
+    f_batch = vmap(f_snapshot, in_axes=(0, 0 if boxes is not None else None))
+
+    results = []
+    start = 0
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        next_chunk = executor.submit(read_chunk)
+        while (chunk := next_chunk.result()) is not None:
+            next_chunk = executor.submit(read_chunk)
+            x_chunk, box_chunk = chunk
+            n = len(x_chunk)
+            result = np.asarray(f_batch(pad(x_chunk, chunk_size), pad(box_chunk, chunk_size)))[:n]
+            if out is not None:
+                out[start : start + n] = result
+            else:
+                results.append(result)
+            start += n
+
+    if out is None:
+        out = np.concatenate(results)
+    assert len(out) == start, "length of output does not match the number of frames"
+    return out
@@ -0,0 +1,314 @@
+"""Verlet neighbor lists for the JAX reference nonbonded potentials, constructed using cell lists.
+
+Neighbor lists are stored as fixed-capacity padded arrays, so that functions consuming them (e.g.
+`nonbonded.nonbonded_on_neighbor_list`) can be jit-compiled once and reused for as long as the list remains valid,
+i.e. until some particle has moved by more than half of the skin distance.
+
+Construction bins particles into cells with side length >= (cutoff + skin) / cell_subdivisions, so that only the
+particles in the (2 * cell_subdivisions + 1)^3 surrounding cells need to be considered for each particle. For systems
+at fixed density this is O(N) in time and memory, rather than the O(N^2) of `jax_utils.pairwise_distances`.
+"""
+
+import warnings
+from functools import partial
+from itertools import product
+from typing import NamedTuple, Optional
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+from jax import Array, lax, vmap
+from numpy.typing import NDArray
+
+from timemachine.potentials.jax_utils import delta_r
+
+DEFAULT_SKIN = 0.1  # nm, same as the default nblist_padding of the GPU nonbonded potentials
+DEFAULT_BLOCK_SIZE = 256  # number of query particles processed simultaneously during construction
+DEFAULT_CELL_SUBDIVISIONS = 2  # number of cells per cutoff + skin; finer cells reduce the number of candidate pairs
+CAPACITY_MULTIPLE = 32  # neighbor capacities are rounded up to a multiple of this to limit recompilation
+
+
+class NeighborList(NamedTuple):
+    """Neighbors within a radius of cutoff + skin of each of N query particles, among M target particles
+
+    idxs : (N, max_neighbors) int32 array
+        idxs[i, :n_neighbors[i]] are the indices of the targets within cutoff + skin of query particle i.
+        Remaining entries are padded with the (invalid) index M.
+    n_neighbors : (N,) int32 array
+        Number of neighbors of each query particle
+    x_ref : (N, 3) array
+        Query coordinates at construction
+    y_ref : (M, 3) array
+        Target coordinates at construction. For self-neighbor lists (constructed with y=None), this is identical to
+        x_ref, and only neighbors j > i are stored for query i, so that each pair appears once.
+    """
+
+    idxs: Array
+    n_neighbors: Array
+    x_ref: Array
+    y_ref: Array
+
+    @property
+    def max_neighbors(self) -> int:
+        return self.idxs.shape[1]
+
+
+def _round_up(n: int, multiple: int) -> int:
+    return max(multiple, multiple * int(np.ceil(n / multiple)))
+
+
+def _get_grid(x: NDArray, y: NDArray, box: Optional[NDArray], min_cell_size: float):
+    """Returns (origin, cell_size, grid_shape), with each cell side length >= min_cell_size"""
+    if box is not None:
+        box_diag = np.diag(np.asarray(box))
+        grid_shape = np.maximum(1, np.floor(box_diag / min_cell_size).astype(int))
+        return np.zeros(3), box_diag / grid_shape, tuple(int(n) for n in grid_shape)
+
+    xy = np.concatenate([x, y])
+    lo, hi = xy.min(0), xy.max(0)
+    extent = hi - lo
+    grid_shape = np.maximum(1, np.floor(extent / min_cell_size).astype(int))
+    cell_size = np.maximum(extent / grid_shape, min_cell_size)
+    return lo, cell_size, tuple(int(n) for n in grid_shape)
+
+
+def _get_cell_offsets(grid_shape: tuple[int, int, int], periodic: bool, reach: int) -> NDArray:
+    """Offsets to the neighboring cells within `reach` cells in each dimension (including the central cell). In the
+    periodic case, offsets that would map to the same cell in dimensions with fewer than 2 * reach + 1 cells are
+    removed, so that no neighbor is counted twice."""
+    offsets_by_dim = []
+    for n in grid_shape:
+        if periodic and n < 2 * reach + 1:
+            offsets_by_dim.append(list(range(n)))
+        else:
+            offsets_by_dim.append(list(range(-reach, reach + 1)))
+    return np.array(list(product(*offsets_by_dim)), dtype=np.int32)
+
+
+@partial(
+    jax.jit,
+    static_argnames=("grid_shape", "reach", "cell_capacity", "max_neighbors", "half", "periodic", "block_size"),
+)
+def _build_neighbor_idxs(
+    x,
+    y,
+    box,
+    origin,
+    cell_size,
+    radius,
+    grid_shape: tuple[int, int, int],
+    reach: int,
+    cell_capacity: int,
+    max_neighbors: int,
+    half: bool,
+    periodic: bool,
+    block_size: int,
+):
+    """Returns (idxs, n_neighbors, max_cell_occupancy)"""
+    n_queries, n_targets = x.shape[0], y.shape[0]
+    grid = jnp.array(grid_shape)
+    n_cells = int(np.prod(grid_shape))
+
+    def flat_cell_idx(c):
+        return (c[..., 0] * grid_shape[1] + c[..., 1]) * grid_shape[2] + c[..., 2]
+
+    def cell_coords(r):
+        c = jnp.floor((r - origin) / cell_size).astype(jnp.int32)
+        return c % grid if periodic else jnp.clip(c, 0, grid - 1)
+
+    # sort targets by cell, then store the targets of each cell in a row of a fixed-capacity array, padded with n_targets
+    y_cells = flat_cell_idx(cell_coords(y))
+    order = jnp.argsort(y_cells)
+    sorted_cells = y_cells[order]
+    cells = jnp.arange(n_cells)
+    cell_start = jnp.searchsorted(sorted_cells, cells, side="left")
+    cell_count = jnp.searchsorted(sorted_cells, cells, side="right") - cell_start
+    slots = jnp.arange(cell_capacity)
+    cell_members = jnp.where(
+        slots[None, :] < cell_count[:, None],
+        order[jnp.minimum(cell_start[:, None] + slots[None, :], n_targets - 1)],
+        n_targets,
+    )
+
+    offsets = jnp.array(_get_cell_offsets(grid_shape, periodic, reach))
+    y_padded = jnp.concatenate([y, y[:1]])
+
+    def neighbors_of(i, x_i):
+        neighbor_cells = cell_coords(x_i) + offsets
+        if periodic:
+            valid_cells = jnp.ones(len(offsets), dtype=bool)
+            neighbor_cells = neighbor_cells % grid
+        else:
+            valid_cells = jnp.all((neighbor_cells >= 0) & (neighbor_cells < grid), axis=1)
+            neighbor_cells = jnp.clip(neighbor_cells, 0, grid - 1)
+
+        candidates = jnp.where(valid_cells[:, None], cell_members[flat_cell_idx(neighbor_cells)], n_targets).ravel()
+        d2 = jnp.sum(delta_r(x_i, y_padded[candidates], box) ** 2, axis=-1)
+        mask = (candidates < n_targets) & (d2 < radius**2)
+        if half:
+            mask = mask & (candidates > i)
+
+        # compact neighbors to the front of a fixed-capacity row, dropping any beyond capacity
+        positions = jnp.where(mask, jnp.cumsum(mask) - 1, max_neighbors)
+        idxs = jnp.full(max_neighbors, n_targets, dtype=jnp.int32)
+        idxs = idxs.at[positions].set(candidates.astype(jnp.int32), mode="drop")
+        return idxs, jnp.sum(mask, dtype=jnp.int32)
+
+    # process query particles in blocks to bound memory consumption
+    n_blocks = int(np.ceil(n_queries / block_size))
+    n_padded = n_blocks * block_size
+    query_idxs = jnp.minimum(jnp.arange(n_padded), n_queries - 1)
+    idxs, n_neighbors = lax.map(
+        lambda block: vmap(neighbors_of)(block, x[block]), query_idxs.reshape(n_blocks, block_size)
+    )
+
+    idxs = idxs.reshape(n_padded, max_neighbors)[:n_queries]
+    n_neighbors = n_neighbors.reshape(n_padded)[:n_queries]
+    return idxs, n_neighbors, jnp.max(cell_count)
+
+
+def build_neighbor_list(
+    x,
+    box,
+    cutoff: float,
+    skin: float = DEFAULT_SKIN,
+    y=None,
+    max_neighbors: Optional[int] = None,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    cell_subdivisions: int = DEFAULT_CELL_SUBDIVISIONS,
+) -> NeighborList:
+    """Construct a neighbor list using a cell list
+
+    Parameters
+    ----------
+    x : (N, 3) array
+        Query coordinates
+    box : Optional (3, 3) array
+        Periodic box (only the diagonal is used, as in `jax_utils.delta_r`), or None for non-periodic systems
+    cutoff : float
+        Interaction cutoff
+    skin : float
+        Additional padding added to the cutoff, so that the list remains valid until some particle moves by more than
+        skin / 2. See `needs_rebuild`
+    y : Optional (M, 3) array
+        Target coordinates. If None, constructs a self-neighbor list of x, storing each pair (i, j > i) once
+    max_neighbors : Optional int
+        Minimum capacity of the padded neighbor arrays. Passing the capacity of a previous list avoids recompiling
+        functions consuming the list. The capacity is increased (with a warning) if it is insufficient to hold all
+        neighbors. If None, the capacity is chosen to fit.
+    block_size : int
+        Number of query particles processed simultaneously
+    cell_subdivisions : int
+        Number of cells per cutoff + skin in each dimension. Neighbors are searched for in the surrounding
+        (2 * cell_subdivisions + 1)^3 cells
+
+    Returns
+    -------
+    NeighborList
+    """
+    assert cutoff > 0
+    assert skin >= 0
+    assert cell_subdivisions >= 1
+    radius = cutoff + skin
+    half = y is None
+
+    x_np = np.asarray(x)
+    y_np = x_np if y is None else np.asarray(y)
+    assert x_np.ndim == 2 and x_np.shape[1] == 3
+    assert y_np.ndim == 2 and y_np.shape[1] == 3
+    assert len(x_np) > 0 and len(y_np) > 0
+
+    periodic = box is not None
+    origin, cell_size, grid_shape = _get_grid(x_np, y_np, box, radius / cell_subdivisions)
+
+    # initial guesses for capacities, increased below if necessary
+    y_cells = np.floor((y_np - origin) / cell_size).astype(int)
+    y_cells = y_cells % grid_shape if periodic else np.clip(y_cells, 0, np.array(grid_shape) - 1)
+    cell_occupancy = np.bincount(np.ravel_multi_index(tuple(y_cells.T), grid_shape))
+    cell_capacity = _round_up(int(np.max(cell_occupancy)), 8)
+    if max_neighbors is None:
+        # the first query particles of a self-neighbor list have nearly all of their neighbors at j > i
+        density = len(y_np) / float(np.prod(np.array(grid_shape) * cell_size))
+        expected_neighbors = density * 4 / 3 * np.pi * radius**3
+        capacity = _round_up(int(np.ceil(1.25 * expected_neighbors)), CAPACITY_MULTIPLE)
+    else:
+        capacity = max_neighbors
+    capacity = min(capacity, _round_up(len(y_np), CAPACITY_MULTIPLE))
+
+    x_jnp = jnp.asarray(x_np)
+    y_jnp = jnp.asarray(y_np)
+    box_jnp = jnp.asarray(box) if periodic else None
+    block_size = min(block_size, len(x_np))
+
+    while True:
+        idxs, n_neighbors, max_cell_occupancy = _build_neighbor_idxs(
+            x_jnp,
+            y_jnp,
+            box_jnp,
+            jnp.asarray(origin),
+            jnp.asarray(cell_size),
+            radius,
+            grid_shape=grid_shape,
+            reach=cell_subdivisions,
+            cell_capacity=cell_capacity,
+            max_neighbors=capacity,
+            half=half,
+            periodic=periodic,
+            block_size=block_size,
+        )
+        max_cell_occupancy = int(max_cell_occupancy)
+        max_n_neighbors = int(jnp.max(n_neighbors))
+        if max_cell_occupancy <= cell_capacity and max_n_neighbors <= capacity:
+            break
+        cell_capacity = max(cell_capacity, _round_up(max_cell_occupancy, 8))
+        if max_n_neighbors > capacity:
+            if max_neighbors is not None:
+                warnings.warn(f"Increasing neighbor list capacity from {capacity} to fit {max_n_neighbors} neighbors")
+            capacity = _round_up(max_n_neighbors, CAPACITY_MULTIPLE)
+
+    return NeighborList(idxs, n_neighbors, x_jnp, y_jnp)
+
+
+def needs_rebuild(neighbor_list: NeighborList, x, box, skin: float = DEFAULT_SKIN, y=None) -> Array:
+    """Whether any query or target particle has moved by more than skin / 2 since the neighbor list was constructed,
+    in which case pairs within the cutoff may be missing from the list.
+
+    Note: changes to the box (e.g. due to a barostat) are not detected, and also require the list to be rebuilt.
+    """
+
+    def max_displacement(r, r_ref):
+        return jnp.sqrt(jnp.max(jnp.sum(delta_r(r, r_ref, box) ** 2, axis=-1)))
+
+    max_disp = max_displacement(x, neighbor_list.x_ref)
+    if y is not None:
+        max_disp = jnp.maximum(max_disp, max_displacement(y, neighbor_list.y_ref))
+    return max_disp > skin / 2
+
+
+def update_neighbor_list(
+    neighbor_list: NeighborList, x, box, cutoff: float, skin: float = DEFAULT_SKIN, y=None
+) -> NeighborList:
+    """Returns neighbor_list if still valid for the given coordinates, otherwise a rebuilt neighbor list with at least
+    the same capacity"""
+    if not bool(needs_rebuild(neighbor_list, x, box, skin, y)):
+        return neighbor_list
+    return build_neighbor_list(x, box, cutoff, skin, y, max_neighbors=neighbor_list.max_neighbors)
+
+
+def pairs_from_neighbor_list(neighbor_list: NeighborList) -> tuple[Array, Array]:
+    """Flatten a neighbor list into (i, j) pairs
+
+    Returns
+    -------
+    pairs : (N * max_neighbors, 2) int32 array
+        Pairs (i, j) of query index i and target index j. Padding entries are set to (i, 0)
+    mask : (N * max_neighbors,) bool array
+        False for padding entries
+    """
+    n_queries, max_neighbors = neighbor_list.idxs.shape
+    n_targets = neighbor_list.y_ref.shape[0]
+    inds_l = jnp.repeat(jnp.arange(n_queries, dtype=jnp.int32), max_neighbors)
+    inds_r = neighbor_list.idxs.reshape(-1)
+    mask = inds_r < n_targets
+    pairs = jnp.stack([inds_l, jnp.where(mask, inds_r, 0)], axis=1)
+    return pairs, mask
@@ -7,17 +7,22 @@ from jax import Array, jit, vmap
 from jax.scipy.special import erfc
 from jax.typing import ArrayLike
 from numpy.typing import NDArray
-from scipy.special import binom
 
 from timemachine.potentials import jax_utils
 from timemachine.potentials.jax_utils import (
     DEFAULT_CHUNK_SIZE,
+    PairListCSR,
     delta_r,
     distance_on_pairs,
     pairs_from_interaction_groups,
     pairwise_distances,
+    pairwise_distances_from_distances2,
     process_traj_in_chunks,
 )
+from timemachine.potentials.neighborlist import NeighborList, pairs_from_neighbor_list
+from timemachine.utils import lazy_import
+
+special = lazy_import("scipy.special")
 
 
 def switch_fn(dij, cutoff=1.2):
@@ -149,10 +154,23 @@ def nonbonded_block_unsummed(
     return cast(Array, nrgs)
 
 
-def nonbonded_block(xi, xj, box, params_i, params_j, beta, cutoff):
+def nonbonded_block(xi, xj, box, params_i, params_j, beta, cutoff, neighbor_list: Optional[NeighborList] = None):
     """
     This is a summed version of nonbonded_block_unsummed, returning a scalar
+
+    If neighbor_list is passed (constructed using `neighborlist.build_neighbor_list(xi, box, cutoff, y=xj)`), only the
+    pairs in the neighbor list are evaluated, avoiding the construction of the (N, M) interaction block.
     """
+    if neighbor_list is not None:
+        n_i = xi.shape[0]
+        pairs, mask = pairs_from_neighbor_list(neighbor_list)
+        pair_params = precompute_pair_params(params_i, params_j, pairs, mask, cutoff)
+        pairs = pairs.at[:, 1].add(n_i)
+        vdW, electrostatics = nonbonded_on_precomputed_pairs(
+            jnp.concatenate([xi, xj]), pair_params, box, pairs, beta, cutoff
+        )
+        return jnp.sum(vdW) + jnp.sum(electrostatics)
+
     return jnp.sum(nonbonded_block_unsummed(xi, xj, box, params_i, params_j, beta, cutoff))
 
 
@@ -228,6 +246,8 @@ def nonbonded(
     cutoff,
     runtime_validate=True,
     atom_idxs=None,
+    neighbor_list: Optional[NeighborList] = None,
+    memory_budget: Optional[int] = None,
 ):
     """Lennard-Jones + Coulomb, with a few important twists:
     * distances are computed in 4D using coordinates in params
@@ -257,6 +277,14 @@ def nonbonded(
             of a Jax JIT-compiled function, without triggering a Jax ConcretizationTypeError?
     atom_idxs: NDArray[int32]
         Subset of atoms to consider for the interaction or None to consider all atoms.
+    neighbor_list: Optional[NeighborList]
+        If passed, evaluate only the pairs in the neighbor list using `nonbonded_on_neighbor_list`, rather than
+        constructing (N, N) matrices. Must be constructed with `neighborlist.build_neighbor_list` from conf (or
+        conf[atom_idxs], if atom_idxs is passed) using the same cutoff. Requires cutoff is not None.
+    memory_budget: Optional[int]
+        If passed, evaluate the energy in blocks of rows of the distance matrix (see
+        `jax_utils.pairwise_sum_blocked`), using approximately memory_budget bytes per block, rather than constructing
+        (N, N) matrices. Ignored if neighbor_list is passed.
 
     Returns
     -------
@@ -276,34 +304,64 @@ def nonbonded(
         params = jnp.array(params)[atom_idxs, :]
         exclusion_idxs, scale_factors = filter_exclusions(atom_idxs, exclusion_idxs, scale_factors, update_idxs=True)
 
-    N = conf.shape[0]
+    if neighbor_list is not None:
+        assert cutoff is not None, "neighbor list requires a cutoff"
+        if runtime_validate:
+            validate_coulomb_cutoff(cutoff, beta, threshold=1e-2)
+        return nonbonded_on_neighbor_list(conf, params, box, neighbor_list, exclusion_idxs, scale_factors, beta, cutoff)
+
+    if runtime_validate and cutoff is not None:
+        validate_coulomb_cutoff(cutoff, beta, threshold=1e-2)
+
+    if memory_budget is not None:
+        return _nonbonded_blocked(conf, params, box, exclusion_idxs, scale_factors, beta, cutoff, memory_budget)
+
+    dij = pairwise_distances(conf, box, params[:, 3])
+    return _nonbonded_on_pairwise_distances(dij, params, exclusion_idxs, scale_factors, beta, cutoff, runtime_validate)
+
+
+def nonbonded_from_geometry(
+    d2ij, params, exclusion_idxs: NDArray[np.int32], scale_factors: NDArray[np.float64], beta, cutoff
+):
+    """`nonbonded` given the (N, N) matrix of squared 3D distances (e.g. from `jax_utils.pairwise_distances2`)"""
+    dij = pairwise_distances_from_distances2(d2ij, params[:, 3])
+    return _nonbonded_on_pairwise_distances(dij, params, exclusion_idxs, scale_factors, beta, cutoff, False)
+
+
+def _nonbonded_on_pairwise_distances(dij, params, exclusion_idxs, scale_factors, beta, cutoff, runtime_validate):
+    N = dij.shape[0]
     charge_rescale_mask, lj_rescale_mask = convert_exclusions_to_rescale_masks(exclusion_idxs, scale_factors, N)
 
     if runtime_validate:
         assert (charge_rescale_mask == charge_rescale_mask.T).all()
         assert (lj_rescale_mask == lj_rescale_mask.T).all()
 
+    eij_total = _nonbonded_rows(jnp.arange(N), dij, params, charge_rescale_mask, lj_rescale_mask, beta, cutoff)
+
+    return jnp.sum(eij_total / 2)
+
+
+def _nonbonded_rows(row_idxs, dij, params, charge_rescale_mask, lj_rescale_mask, beta, cutoff):
+    """(B, N) array of pairwise energies between the atoms row_idxs and all atoms, given the corresponding (B, N) rows
+    of the distance matrix and rescale masks"""
+    N = params.shape[0]
+    is_diagonal = row_idxs[:, None] == jnp.arange(N)[None, :]
+
     charges = params[:, 0]
     sig = params[:, 1]
     eps = params[:, 2]
-    w_coords = params[:, 3]
 
     sig_i = jnp.expand_dims(sig, 0)
-    sig_j = jnp.expand_dims(sig, 1)
+    sig_j = jnp.expand_dims(sig[row_idxs], 1)
     sig_ij = combining_rule_sigma(sig_i, sig_j)
 
     eps_i = jnp.expand_dims(eps, 0)
-    eps_j = jnp.expand_dims(eps, 1)
+    eps_j = jnp.expand_dims(eps[row_idxs], 1)
     eps_ij = combining_rule_epsilon(eps_i, eps_j)
 
-    dij = pairwise_distances(conf, box, w_coords)
-
-    keep_mask = jnp.ones((N, N)) - jnp.eye(N)
-    keep_mask = jnp.where(eps_ij != 0, keep_mask, 0)
+    keep_mask = jnp.where(eps_ij != 0, ~is_diagonal, False)
 
     if cutoff is not None:
-        if runtime_validate:
-            validate_coulomb_cutoff(cutoff, beta, threshold=1e-2)
         eps_ij = jnp.where(dij < cutoff, eps_ij, 0)
 
     # (ytz): this avoids a nan in the gradient in both jax and tensorflow
@@ -311,7 +369,7 @@ def nonbonded(
     eps_ij = jnp.where(keep_mask, eps_ij, 0)
 
     inv_dij = 1 / dij
-    inv_dij = jnp.where(jnp.eye(N), 0, inv_dij)
+    inv_dij = jnp.where(is_diagonal, 0, inv_dij)
 
     sig2 = sig_ij * inv_dij
     sig2 *= sig2
@@ -321,11 +379,11 @@ def nonbonded(
     eij_lj = jnp.where(keep_mask, eij_lj, 0)
 
     qi = jnp.expand_dims(charges, 0)  # (1, N)
-    qj = jnp.expand_dims(charges, 1)  # (N, 1)
+    qj = jnp.expand_dims(charges[row_idxs], 1)  # (B, 1)
     qij = jnp.multiply(qi, qj)
 
     # (ytz): trick used to avoid nans in the diagonal due to the 1/dij term.
-    keep_mask = 1 - jnp.eye(N)
+    keep_mask = ~is_diagonal
     qij = jnp.where(keep_mask, qij, 0)
     dij = jnp.where(keep_mask, dij, 0)
 
@@ -334,9 +392,32 @@ def nonbonded(
     if cutoff is not None:
         eij_charge = jnp.where(dij < cutoff, eij_charge, 0)
 
-    eij_total = eij_lj * lj_rescale_mask + eij_charge * charge_rescale_mask
+    return eij_lj * lj_rescale_mask + eij_charge * charge_rescale_mask
 
-    return jnp.sum(eij_total / 2)
+
+def _nonbonded_blocked(conf, params, box, exclusion_idxs, scale_factors, beta, cutoff, memory_budget: int):
+    """`nonbonded`, evaluated in blocks of rows of the distance matrix without constructing any (N, N) matrices"""
+    conf = jnp.asarray(conf)
+    params = jnp.asarray(params)
+    exclusion_idxs = np.asarray(exclusion_idxs, dtype=np.int32).reshape(-1, 2)
+    scale_factors = jnp.asarray(scale_factors).reshape(-1, 2)
+
+    # (i, j) and (j, i) entries of the rescale masks
+    exc_i = np.concatenate([exclusion_idxs[:, 0], exclusion_idxs[:, 1]])
+    exc_j = np.concatenate([exclusion_idxs[:, 1], exclusion_idxs[:, 0]])
+    exc_rescale = 1 - jnp.concatenate([scale_factors, scale_factors])
+
+    def f_rows(row_idxs, dij):
+        # rows of a block are contiguous, starting at row_idxs[0]; exclusions outside of the block are dropped
+        block_size = len(row_idxs)
+        local_i = exc_i - row_idxs[0]
+        local_i = jnp.where((local_i >= 0) & (local_i < block_size), local_i, block_size)
+        ones = jnp.ones_like(dij)
+        charge_rescale_rows = ones.at[local_i, exc_j].set(exc_rescale[:, 0], mode="drop")
+        lj_rescale_rows = ones.at[local_i, exc_j].set(exc_rescale[:, 1], mode="drop")
+        return _nonbonded_rows(row_idxs, dij, params, charge_rescale_rows, lj_rescale_rows, beta, cutoff)
+
+    return jax_utils.pairwise_sum_blocked(f_rows, conf, box, params[:, 3], memory_budget=memory_budget) / 2
 
 
 def nonbonded_on_specific_pairs(
@@ -362,11 +443,38 @@ def nonbonded_on_specific_pairs(
 
     inds_l, inds_r = pairs.T
 
-    charges, sig, eps, w_coords = params.T
+    w_coords = params[:, 3]
 
     # distances and cutoff
     w_offsets = w_coords[pairs[:, 0]] - w_coords[pairs[:, 1]] if w_coords is not None else None
     dij = distance_on_pairs(conf[inds_l], conf[inds_r], box, w_offsets)
+    return _specific_pair_energies(dij, params, pairs, beta, cutoff, rescale_mask)
+
+
+def nonbonded_on_specific_pairs_from_geometry(
+    d2ij,
+    params,
+    pairs,
+    beta: float,
+    cutoff: Optional[float] = None,
+    rescale_mask=None,
+) -> tuple[Array, Array]:
+    """`nonbonded_on_specific_pairs` given the squared 3D distances between pairs, shape [P] (e.g. from
+    `jax_utils.PairGeometry.distances2`)"""
+    if len(pairs) == 0:
+        return jnp.zeros(1), jnp.zeros(1)
+
+    w_coords = params[:, 3]
+    w_offsets = w_coords[pairs[:, 0]] - w_coords[pairs[:, 1]]
+    dij = jnp.sqrt(d2ij + w_offsets**2)
+    return _specific_pair_energies(dij, params, pairs, beta, cutoff, rescale_mask)
+
+
+def _specific_pair_energies(dij, params, pairs, beta, cutoff, rescale_mask) -> tuple[Array, Array]:
+    inds_l, inds_r = pairs.T
+
+    charges, sig, eps, _ = params.T
+
     if cutoff is None:
         cutoff = np.inf
     keep_mask = dij < cutoff
@@ -418,8 +526,15 @@ def nonbonded_on_precomputed_pairs(
     conf: N,3
     params: P,4 (q_ij, s_ij, e_ij, w_offset_ij)
     pairs: P,2 (i,j)
+
+    Alternatively, pairs can be a PairListCSR (see `jax_utils.get_interacting_pair_indices_csr`) selecting a subset of
+    P candidate pairs for each of T frames. In this case conf is T,N,3, box is T,3,3 (or None), and the returned
+    per-entry energies can be reduced to per-frame energies using `PairListCSR.sum_by_frame`.
     """
 
+    if isinstance(pairs, PairListCSR):
+        return _nonbonded_on_precomputed_pairs_csr(conf, params, box, pairs, beta, cutoff)
+
     if len(pairs) == 0:
         return np.zeros(1), np.zeros(1)
 
@@ -428,6 +543,48 @@ def nonbonded_on_precomputed_pairs(
     # distances and cutoff
     q_ij, sig_ij, eps_ij, offsets = params.T
     dij = distance_on_pairs(conf[inds_l], conf[inds_r], box, offsets)
+    return _precomputed_pair_energies(dij, q_ij, sig_ij, eps_ij, beta, cutoff)
+
+
+def nonbonded_on_precomputed_pairs_geometry(conf, box, pairs):
+    """Squared 3D distances between pairs, shape [P]. See `nonbonded_on_precomputed_pairs`"""
+    inds_l, inds_r = pairs.T
+    return jnp.sum(delta_r(conf[inds_l], conf[inds_r], box) ** 2, axis=-1)
+
+
+def nonbonded_on_precomputed_pairs_from_geometry(d2ij, params, beta: float, cutoff: Optional[float] = None):
+    """`nonbonded_on_precomputed_pairs` given the output of `nonbonded_on_precomputed_pairs_geometry`"""
+    q_ij, sig_ij, eps_ij, offsets = params.T
+    dij = jnp.sqrt(d2ij + offsets**2)
+    return _precomputed_pair_energies(dij, q_ij, sig_ij, eps_ij, beta, cutoff)
+
+
+def _nonbonded_on_precomputed_pairs_csr(confs, params, boxes, pair_list: PairListCSR, beta, cutoff):
+    if len(pair_list.pairs) == 0:
+        return np.zeros(1), np.zeros(1)
+
+    # padding entries are evaluated on the last frame, with charge and epsilon set to zero
+    frame_idxs = jnp.minimum(pair_list.frame_idxs, pair_list.n_frames - 1)
+    inds_l, inds_r = jnp.asarray(pair_list.pairs).T
+
+    q_ij, sig_ij, eps_ij, offsets = params[pair_list.pair_idxs].T
+    q_ij = jnp.where(pair_list.mask, q_ij, 0)
+    eps_ij = jnp.where(pair_list.mask, eps_ij, 0)
+
+    ri, rj = confs[frame_idxs, inds_l], confs[frame_idxs, inds_r]
+    if boxes is None:
+        dij = distance_on_pairs(ri, rj, None, offsets)
+    else:
+
+        def distance_on_pair(ri, rj, box, offset):
+            return distance_on_pairs(ri[None], rj[None], box, offset[None])[0]
+
+        dij = vmap(distance_on_pair)(ri, rj, boxes[frame_idxs], offsets)
+
+    return _precomputed_pair_energies(dij, q_ij, sig_ij, eps_ij, beta, cutoff)
+
+
+def _precomputed_pair_energies(dij, q_ij, sig_ij, eps_ij, beta, cutoff):
     if cutoff is None:
         cutoff = np.inf
 
@@ -446,6 +603,69 @@ def nonbonded_on_precomputed_pairs(
     return vdW, electrostatics
 
 
+def precompute_pair_params(params_i, params_j, pairs, mask, cutoff: float) -> Array:
+    """Apply combining rules to per-particle params to produce the (q_ij, s_ij, e_ij, w_offset_ij) pair params expected by
+    `nonbonded_on_precomputed_pairs`, for pairs (i, j) indexing into params_i and params_j.
+
+    Entries where mask is False (e.g. padding from `neighborlist.pairs_from_neighbor_list`) are assigned zero charge
+    and epsilon, and a w_offset of 2 * cutoff, so that they are beyond the cutoff and have nonzero distance
+    (avoiding nans in the gradient).
+    """
+    inds_l, inds_r = pairs.T
+    q_ij = params_i[inds_l, 0] * params_j[inds_r, 0]
+    sig_ij = combining_rule_sigma(params_i[inds_l, 1], params_j[inds_r, 1])
+    eps_ij = combining_rule_epsilon(params_i[inds_l, 2], params_j[inds_r, 2])
+    w_offset_ij = params_i[inds_l, 3] - params_j[inds_r, 3]
+
+    q_ij = jnp.where(mask, q_ij, 0)
+    sig_ij = jnp.where(mask, sig_ij, 0)
+    eps_ij = jnp.where(mask, eps_ij, 0)
+    w_offset_ij = jnp.where(mask, w_offset_ij, 2 * cutoff)
+
+    return jnp.stack([q_ij, sig_ij, eps_ij, w_offset_ij], axis=1)
+
+
+def nonbonded_on_neighbor_list(
+    conf,
+    params,
+    box,
+    neighbor_list: NeighborList,
+    exclusion_idxs: NDArray[np.int32],
+    scale_factors: NDArray[np.float64],
+    beta: float,
+    cutoff: float,
+) -> Array:
+    """Equivalent to `nonbonded`, but evaluating only pairs in a self-neighbor list of conf, in O(N) time and memory.
+
+    As in the GPU implementation (see `potentials.Nonbonded.to_gpu`), exclusions are handled by evaluating all pairs in
+    the neighbor list without rescaling, then subtracting the contributions of the excluded pairs multiplied by the
+    scale factors.
+
+    Parameters
+    ----------
+    neighbor_list: NeighborList
+        Constructed using `neighborlist.build_neighbor_list(conf, box, cutoff)`. The result is only correct if
+        `neighborlist.needs_rebuild(neighbor_list, conf, box)` is False.
+
+    See `nonbonded` for the remaining parameters.
+    """
+    pairs, mask = pairs_from_neighbor_list(neighbor_list)
+    pair_params = precompute_pair_params(params, params, pairs, mask, cutoff)
+    vdW, electrostatics = nonbonded_on_precomputed_pairs(conf, pair_params, box, pairs, beta, cutoff)
+    U = jnp.sum(vdW) + jnp.sum(electrostatics)
+
+    if len(exclusion_idxs) > 0:
+        exclusion_params = precompute_pair_params(params, params, jnp.asarray(exclusion_idxs), True, cutoff)
+        exclusion_params = exclusion_params.at[:, 0].multiply(scale_factors[:, 0])
+        exclusion_params = exclusion_params.at[:, 2].multiply(scale_factors[:, 1])
+        vdW_exc, electrostatics_exc = nonbonded_on_precomputed_pairs(
+            conf, exclusion_params, box, exclusion_idxs, beta, cutoff
+        )
+        U = U - jnp.sum(vdW_exc) - jnp.sum(electrostatics_exc)
+
+    return U
+
+
 def validate_interaction_group_idxs(n_atoms, a_idxs, b_idxs):
     """assert A and B are disjoint, contain no elements outside range(0, n_atoms), and contain no repeats"""
     A, B = set(a_idxs), set(b_idxs)
@@ -471,16 +691,20 @@ def nonbonded_interaction_groups(
 
     See `nonbonded` docstring for more details
     """
-    # If not set, col_atom_idxs are all others not in the row
-    num_atoms = len(conf)
-    if b_idxs is None:
-        b_idxs = np.setdiff1d(jnp.arange(num_atoms), a_idxs)
-    validate_interaction_group_idxs(num_atoms, a_idxs, b_idxs)
-    pairs = pairs_from_interaction_groups(a_idxs, b_idxs)
+    pairs = interaction_group_pairs(len(conf), a_idxs, b_idxs)
     vdW, electrostatics = nonbonded_on_specific_pairs(conf, params, box, pairs, beta, cutoff)
     return vdW, electrostatics
 
 
+def interaction_group_pairs(num_atoms: int, a_idxs, b_idxs) -> NDArray:
+    """All pairs (i, j) with i in a_idxs and j in b_idxs. If b_idxs is None, it is taken to be all atoms not in
+    a_idxs."""
+    if b_idxs is None:
+        b_idxs = np.setdiff1d(np.arange(num_atoms), a_idxs)
+    validate_interaction_group_idxs(num_atoms, a_idxs, b_idxs)
+    return pairs_from_interaction_groups(a_idxs, b_idxs)
+
+
 def validate_coulomb_cutoff(cutoff=1.0, beta=2.0, threshold=1e-2):
     """check whether f(r) = erfc(beta * r) <= threshold at r = cutoff
     following https://github.com/proteneer/timemachine/pull/424#discussion_r629678467"""
@@ -714,7 +938,7 @@ def _basis_expand_lj_term(sig_env, eps_env, r_env, power):
     r_inv_pow = r_env**-power
 
     exponents = power - np.arange(power + 1)
-    coeffs = binom(power, exponents)
+    coeffs = special.binom(power, exponents)
 
     raised = sig_env ** jnp.expand_dims(exponents, 1)
     h_n_i = r_inv_pow * raised * jnp.expand_dims(coeffs, 1) * jnp.expand_dims(eps_env, 0)
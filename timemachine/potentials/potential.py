@@ -3,13 +3,16 @@ from collections.abc import Sequence
 from dataclasses import astuple, dataclass
 from typing import Any, Generic, Optional, TypeVar, cast
 
+import jax
 import numpy as np
-from jax import Array
+from jax import Array, vmap
 from numpy.typing import NDArray
 
 from timemachine.lib import custom_ops
 
 from . import jax_interface
+from .cpu_impl import BoundCpuImpl, CpuImpl
+from .jax_utils import PairGeometry
 from .types import Box, Conf, Params
 
 Precision = Any
@@ -31,12 +34,100 @@ class Potential(ABC):
         impl = ctor(*args)
         return GpuImplWrapper(impl)
 
+    def to_cpu(self, precision: Precision = np.float64) -> "CpuImplWrapper":
+        return CpuImplWrapper(CpuImpl(self, precision))
+
+    def call_batch(self, confs: Conf, params: Params, boxes: Optional[Box]) -> Array:
+        """Evaluate the potential on every combination of frames and parameter sets, analogous to
+        `custom_ops.Potential.execute_batch`. Can be jit-compiled.
+
+        Parameters
+        ----------
+        confs : (n_frames, N, 3) array
+        params : (n_params, ...) array
+        boxes : (n_frames, 3, 3) array, or None
+
+        Returns
+        -------
+        (n_frames, n_params) array
+            U[i, j] = self(confs[i], params[j], boxes[i])
+        """
+
+        def U_frame(conf, box):
+            return vmap(lambda ps: self(conf, ps, box))(params)
+
+        return vmap(U_frame, (0, 0 if boxes is not None else None))(confs, boxes)
+
+    def call_batch_sparse(
+        self, confs: Conf, params: Params, boxes: Optional[Box], coords_batch_idxs, params_batch_idxs
+    ) -> Array:
+        """Evaluate the potential on the pairs (confs[coords_batch_idxs[i]], params[params_batch_idxs[i]]), analogous
+        to `custom_ops.Potential.execute_batch_sparse`. Can be jit-compiled.
+
+        Returns
+        -------
+        (len(coords_batch_idxs),) array
+        """
+        batch_boxes = boxes[coords_batch_idxs] if boxes is not None else None
+        U = vmap(self, (0, 0, 0 if boxes is not None else None))(
+            confs[coords_batch_idxs], params[params_batch_idxs], batch_boxes
+        )
+        return cast(Array, U)
+
     @classmethod
     def _custom_ops_class_name(cls, precision: Precision) -> str:
         suffix = get_custom_ops_class_name_suffix(precision)
         return f"{cls.__name__}_{suffix}"
 
 
+@dataclass
+class SharedGeometryPotential(Potential):
+    """Potential whose dependence on conf and box is through a parameter-independent geometry (e.g. bond lengths,
+    torsion angles), so that the geometry can be computed once per frame and shared across parameter sets by
+    `call_batch` and `call_batch_sparse`."""
+
+    @abstractmethod
+    def geometry(self, conf: Conf, box: Optional[Box]) -> Any:
+        """Parameter-independent quantities computed from a single frame (any pytree of arrays)"""
+        ...
+
+    @abstractmethod
+    def energy_from_geometry(self, geometry: Any, params: Params) -> float | Array: ...
+
+    def __call__(self, conf: Conf, params: Params, box: Optional[Box]) -> float | Array:
+        return self.energy_from_geometry(self.geometry(conf, box), params)
+
+    def call_batch(self, confs: Conf, params: Params, boxes: Optional[Box]) -> Array:
+        geometries = vmap(self.geometry, (0, 0 if boxes is not None else None))(confs, boxes)
+
+        def U_frame(geometry):
+            return vmap(lambda ps: self.energy_from_geometry(geometry, ps))(params)
+
+        return vmap(U_frame)(geometries)
+
+    def call_batch_sparse(
+        self, confs: Conf, params: Params, boxes: Optional[Box], coords_batch_idxs, params_batch_idxs
+    ) -> Array:
+        geometries = vmap(self.geometry, (0, 0 if boxes is not None else None))(confs, boxes)
+        batch_geometries = jax.tree_util.tree_map(lambda g: g[coords_batch_idxs], geometries)
+        return cast(Array, vmap(self.energy_from_geometry)(batch_geometries, params[params_batch_idxs]))
+
+
+@dataclass
+class PairGeometryPotential(Potential):
+    """Potential whose dependence on conf and box is through distances between pairs of atoms, so that the distances
+    can be computed once per frame and shared with other pair-based terms (see `summed.fused_summed_potential`)."""
+
+    @abstractmethod
+    def geometry_pairs(self, num_atoms: int) -> Optional[NDArray]:
+        """Pairs of atoms whose distances are required, shape (P, 2), or None if distances between all pairs of atoms
+        are required"""
+        ...
+
+    @abstractmethod
+    def energy_from_pair_geometry(self, geometry: PairGeometry, params: Params) -> float | Array: ...
+
+
 @dataclass
 class BoundPotential(Generic[_P]):
     potential: _P
@@ -48,6 +139,9 @@ class BoundPotential(Generic[_P]):
     def to_gpu(self, precision: Precision) -> "BoundGpuImplWrapper":
         return self.potential.to_gpu(precision).bind(np.asarray(self.params))
 
+    def to_cpu(self, precision: Precision = np.float64) -> "BoundCpuImplWrapper":
+        return self.potential.to_cpu(precision).bind(np.asarray(self.params))
+
 
 @dataclass
 class GpuImplWrapper:
@@ -70,6 +164,27 @@ class BoundGpuImplWrapper:
         return cast(float, res)
 
 
+@dataclass
+class CpuImplWrapper:
+    """Counterpart of GpuImplWrapper, where unbound_impl evaluates the JAX reference potential on the CPU"""
+
+    unbound_impl: CpuImpl
+
+    def __call__(self, conf: Conf, params: Params, box: Box) -> float | Array:
+        return self.unbound_impl.potential(conf, params, box)
+
+    def bind(self, params: NDArray) -> "BoundCpuImplWrapper":
+        return BoundCpuImplWrapper(BoundCpuImpl(self.unbound_impl, params))
+
+
+@dataclass
+class BoundCpuImplWrapper:
+    bound_impl: BoundCpuImpl
+
+    def __call__(self, conf: Conf, box: Box) -> float | Array:
+        return self.bound_impl.potential.potential(conf, self.bound_impl.params, box)
+
+
 def get_custom_ops_class_name_suffix(precision: Precision):
     if precision == np.float32:
         return "f32"
@@ -1,4 +1,4 @@
-from collections.abc import Sequence
+from collections.abc import Callable, Sequence
 from dataclasses import dataclass
 from typing import Optional, cast
 
@@ -10,25 +10,46 @@ from numpy.typing import NDArray
 from timemachine.lib import custom_ops
 
 from . import bonded, chiral_restraints, jax_interface, nonbonded, summed
-from .potential import BoundGpuImplWrapper, BoundPotential, GpuImplWrapper, Potential, Precision
+from .jax_utils import PairGeometry
+from .potential import (
+    BoundGpuImplWrapper,
+    BoundPotential,
+    GpuImplWrapper,
+    PairGeometryPotential,
+    Potential,
+    Precision,
+    SharedGeometryPotential,
+)
 from .types import Box, Conf, Params
 
 
 @dataclass
-class HarmonicBond(Potential):
+class HarmonicBond(SharedGeometryPotential):
     idxs: NDArray[np.int32]
 
     def __call__(self, conf: Conf, params: Params, box: Optional[Box]) -> float | Array:
         return bonded.harmonic_bond(conf, params, box, self.idxs)
 
+    def geometry(self, conf: Conf, box: Optional[Box]):
+        return bonded.harmonic_bond_geometry(conf, self.idxs)
+
+    def energy_from_geometry(self, geometry, params: Params) -> float | Array:
+        return bonded.harmonic_bond_from_geometry(geometry, params)
+
 
 @dataclass
-class HarmonicAngle(Potential):
+class HarmonicAngle(SharedGeometryPotential):
     idxs: NDArray[np.int32]
 
     def __call__(self, conf: Conf, params: Params, box: Optional[Box]) -> float | Array:
         return bonded.harmonic_angle(conf, params, box, self.idxs)
 
+    def geometry(self, conf: Conf, box: Optional[Box]):
+        return bonded.harmonic_angle_geometry(conf, self.idxs)
+
+    def energy_from_geometry(self, geometry, params: Params) -> float | Array:
+        return bonded.harmonic_angle_from_geometry(geometry, params)
+
 
 import warnings
 
@@ -58,12 +79,18 @@ class CentroidRestraint(Potential):
 
 
 @dataclass
-class ChiralAtomRestraint(Potential):
+class ChiralAtomRestraint(SharedGeometryPotential):
     idxs: NDArray[np.int32]
 
     def __call__(self, conf: Conf, params: Params, box: Optional[Box]) -> float | Array:
         return chiral_restraints.chiral_atom_restraint(conf, params, box, self.idxs)
 
+    def geometry(self, conf: Conf, box: Optional[Box]):
+        return chiral_restraints.chiral_atom_restraint_geometry(conf, self.idxs)
+
+    def energy_from_geometry(self, geometry, params: Params) -> float | Array:
+        return chiral_restraints.chiral_atom_restraint_from_geometry(geometry, params)
+
 
 @dataclass
 class ChiralBondRestraint(Potential):
@@ -92,15 +119,21 @@ class LogFlatBottomBond(Potential):
 
 
 @dataclass
-class PeriodicTorsion(Potential):
+class PeriodicTorsion(SharedGeometryPotential):
     idxs: NDArray[np.int32]
 
     def __call__(self, conf: Conf, params: Params, box: Optional[Box]) -> float | Array:
         return bonded.periodic_torsion(conf, params, box, self.idxs)
 
+    def geometry(self, conf: Conf, box: Optional[Box]):
+        return bonded.periodic_torsion_geometry(conf, self.idxs)
+
+    def energy_from_geometry(self, geometry, params: Params) -> float | Array:
+        return bonded.periodic_torsion_from_geometry(geometry, params)
+
 
 @dataclass
-class Nonbonded(Potential):
+class Nonbonded(PairGeometryPotential):
     num_atoms: int
     exclusion_idxs: NDArray[np.int32]
     scale_factors: NDArray[np.float64]
@@ -123,6 +156,19 @@ class Nonbonded(Potential):
             atom_idxs=self.atom_idxs,
         )
 
+    def geometry_pairs(self, num_atoms: int) -> Optional[NDArray]:
+        return None
+
+    def energy_from_pair_geometry(self, geometry: PairGeometry, params: Params) -> float | Array:
+        exclusion_idxs, scale_factors = self.exclusion_idxs, self.scale_factors
+        if self.atom_idxs is not None:
+            params = jnp.array(params)[self.atom_idxs, :]
+            exclusion_idxs, scale_factors = nonbonded.filter_exclusions(
+                self.atom_idxs, exclusion_idxs, scale_factors, update_idxs=True
+            )
+        d2ij = geometry.pairwise_distances2(self.atom_idxs)
+        return nonbonded.nonbonded_from_geometry(d2ij, params, exclusion_idxs, scale_factors, self.beta, self.cutoff)
+
     def to_gpu(self, precision: Precision) -> GpuImplWrapper:
         all_pairs = NonbondedAllPairs(
             self.num_atoms,
@@ -139,7 +185,7 @@ class Nonbonded(Potential):
 
 
 @dataclass
-class NonbondedAllPairs(Potential):
+class NonbondedAllPairs(PairGeometryPotential):
     num_atoms: int
     beta: float
     cutoff: float
@@ -160,9 +206,25 @@ class NonbondedAllPairs(Potential):
             atom_idxs=self.atom_idxs,
         )
 
+    def geometry_pairs(self, num_atoms: int) -> Optional[NDArray]:
+        return None
+
+    def energy_from_pair_geometry(self, geometry: PairGeometry, params: Params) -> float | Array:
+        if self.atom_idxs is not None:
+            params = jnp.array(params)[self.atom_idxs, :]
+        d2ij = geometry.pairwise_distances2(self.atom_idxs)
+        return nonbonded.nonbonded_from_geometry(
+            d2ij,
+            params,
+            np.ones((0,), dtype=np.float32),
+            np.ones((0, 2), dtype=np.float32),
+            self.beta,
+            self.cutoff,
+        )
+
 
 @dataclass
-class NonbondedInteractionGroup(Potential):
+class NonbondedInteractionGroup(PairGeometryPotential):
     num_atoms: int
     row_atom_idxs: NDArray[np.int32]
     beta: float
@@ -185,9 +247,19 @@ class NonbondedInteractionGroup(Potential):
         )
         return jnp.sum(vdW) + jnp.sum(electrostatics)
 
+    def geometry_pairs(self, num_atoms: int) -> Optional[NDArray]:
+        return nonbonded.interaction_group_pairs(num_atoms, self.row_atom_idxs, self.col_atom_idxs)
+
+    def energy_from_pair_geometry(self, geometry: PairGeometry, params: Params) -> float | Array:
+        pairs = nonbonded.interaction_group_pairs(geometry.num_atoms, self.row_atom_idxs, self.col_atom_idxs)
+        vdW, electrostatics = nonbonded.nonbonded_on_specific_pairs_from_geometry(
+            geometry.distances2(pairs), params, pairs, self.beta, self.cutoff
+        )
+        return jnp.sum(vdW) + jnp.sum(electrostatics)
+
 
 @dataclass
-class NonbondedPairList(Potential):
+class NonbondedPairList(PairGeometryPotential):
     idxs: NDArray[np.int32]
     rescale_mask: NDArray[np.float64]
     beta: float
@@ -199,9 +271,18 @@ class NonbondedPairList(Potential):
         )
         return jnp.sum(vdW) + jnp.sum(electrostatics)
 
+    def geometry_pairs(self, num_atoms: int) -> Optional[NDArray]:
+        return self.idxs
+
+    def energy_from_pair_geometry(self, geometry: PairGeometry, params: Params) -> float | Array:
+        vdW, electrostatics = nonbonded.nonbonded_on_specific_pairs_from_geometry(
+            geometry.distances2(self.idxs), params, self.idxs, self.beta, self.cutoff, self.rescale_mask
+        )
+        return jnp.sum(vdW) + jnp.sum(electrostatics)
+
 
 @dataclass
-class NonbondedExclusions(Potential):
+class NonbondedExclusions(PairGeometryPotential):
     idxs: NDArray[np.int32]
     rescale_mask: NDArray[np.float64]
     beta: float
@@ -214,9 +295,19 @@ class NonbondedExclusions(Potential):
         U = jnp.sum(vdW) + jnp.sum(electrostatics)
         return -U
 
+    def geometry_pairs(self, num_atoms: int) -> Optional[NDArray]:
+        return self.idxs
+
+    def energy_from_pair_geometry(self, geometry: PairGeometry, params: Params) -> float | Array:
+        vdW, electrostatics = nonbonded.nonbonded_on_specific_pairs_from_geometry(
+            geometry.distances2(self.idxs), params, self.idxs, self.beta, self.cutoff, self.rescale_mask
+        )
+        U = jnp.sum(vdW) + jnp.sum(electrostatics)
+        return -U
+
 
 @dataclass
-class NonbondedPairListPrecomputed(Potential):
+class NonbondedPairListPrecomputed(SharedGeometryPotential, PairGeometryPotential):
     """
     This implements a pairlist with precomputed parameters. It differs from the regular NonbondedPairlist in that it
     expects params of the form s0*q_ij, s_ij, s1*e_ij, and w_offsets_ij, where s are the scaling factors and combining
@@ -236,20 +327,49 @@ class NonbondedPairListPrecomputed(Potential):
         )
         return jnp.sum(vdW) + jnp.sum(electrostatics)
 
+    def geometry(self, conf: Conf, box: Optional[Box]):
+        return nonbonded.nonbonded_on_precomputed_pairs_geometry(conf, box, self.idxs)
+
+    def energy_from_geometry(self, geometry, params: Params) -> float | Array:
+        vdW, electrostatics = nonbonded.nonbonded_on_precomputed_pairs_from_geometry(
+            geometry, params, self.beta, self.cutoff
+        )
+        return jnp.sum(vdW) + jnp.sum(electrostatics)
+
+    def geometry_pairs(self, num_atoms: int) -> Optional[NDArray]:
+        return self.idxs
+
+    def energy_from_pair_geometry(self, geometry: PairGeometry, params: Params) -> float | Array:
+        return self.energy_from_geometry(geometry.distances2(self.idxs), params)
+
 
 @dataclass
 class SummedPotential(Potential):
+    """Sum of potential terms, with parameters concatenated into a single flat array
+
+    If fused is True, the JAX reference implementation shares pairwise distances between the nonbonded terms (see
+    `summed.fused_summed_potential`). This does not affect the GPU implementation.
+    """
+
     potentials: Sequence[Potential]
     params_init: Sequence[Params]
     parallel: bool = True
+    fused: bool = False
 
     def __post_init__(self):
         if len(self.potentials) != len(self.params_init):
             raise ValueError("number of potentials != number of parameter arrays")
 
     def __call__(self, conf: Conf, params: Params, box: Optional[Box]) -> float | Array:
+        if self.fused:
+            return summed.fused_summed_potential(conf, params, box, self.potentials, self.params_shapes)
         return summed.summed_potential(conf, params, box, self.potentials, self.params_shapes)
 
+    def get_fused_fxn(self, argnums: tuple[int, ...] = ()) -> Callable:
+        """Jit-compiled fused evaluation of the potential (and gradients with respect to argnums), cached by potential
+        structure and parameter shapes. See `summed.get_fused_summed_potential_fxn`"""
+        return summed.get_fused_summed_potential_fxn(self.potentials, self.params_shapes, argnums)
+
     def to_gpu(self, precision: Precision) -> "SummedPotentialGpuImplWrapper":
         impls = [p.to_gpu(precision).unbound_impl for p in self.potentials]
         sizes = [ps.size for ps in self.params_init]
@@ -293,12 +413,21 @@ class SummedPotentialGpuImplWrapper(GpuImplWrapper):
 
 @dataclass
 class FanoutSummedPotential(Potential):
+    """Sum of potential terms sharing a single parameter array. See `SummedPotential` for the meaning of fused"""
+
     potentials: Sequence[Potential]
     parallel: bool = True
+    fused: bool = False
 
     def __call__(self, conf: Conf, params: Params, box: Optional[Box]) -> float | Array:
+        if self.fused:
+            return summed.fused_fanout_summed_potential(conf, params, box, self.potentials)
         return summed.fanout_summed_potential(conf, params, box, self.potentials)
 
+    def get_fused_fxn(self, argnums: tuple[int, ...] = ()) -> Callable:
+        """See `SummedPotential.get_fused_fxn`"""
+        return summed.get_fused_summed_potential_fxn(self.potentials, None, argnums)
+
     def to_gpu(self, precision: Precision) -> GpuImplWrapper:
         impls = [p.to_gpu(precision).unbound_impl for p in self.potentials]
         return GpuImplWrapper(custom_ops.FanoutSummedPotential(impls, self.parallel))
@@ -1,4 +1,13 @@
+from collections.abc import Iterable
+from typing import NamedTuple, Optional
+
+import jax
 import jax.numpy as jnp
+import numpy as np
+from jax import lax
+from numpy.typing import NDArray
+
+from timemachine.potentials.jax_utils import DEFAULT_CHUNK_SIZE, process_traj_streaming
 
 
 def psi(rotation, k):
@@ -136,6 +145,115 @@ def rmsd_align(x1, x2):
     return xa, xb
 
 
+class Alignment(NamedTuple):
+    """Optimal rigid alignments of one or more conformations x onto reference conformations, such that the aligned
+    conformation is x @ rotation + translation.
+
+    rmsds: array (...,)
+        RMSD between the aligned conformation and the reference
+    rotations: array (..., 3, 3)
+        Proper rotations
+    translations: array (..., 3)
+    """
+
+    rmsds: NDArray
+    rotations: NDArray
+    translations: NDArray
+
+
+def _kabsch(x_ref, x):
+    """rmsd, rotation and translation optimally aligning x onto x_ref, such that the aligned conformation is
+    x @ rotation + translation"""
+    com_ref = jnp.mean(x_ref, axis=0)
+    com = jnp.mean(x, axis=0)
+    rotation = get_optimal_rotation(x_ref - com_ref, x - com)
+    translation = com_ref - com @ rotation
+    aligned = x @ rotation + translation
+    rmsd = jnp.sqrt(jnp.mean(jnp.sum((aligned - x_ref) ** 2, axis=-1)))
+    return rmsd, rotation, translation
+
+
+def align_trajectory(
+    x_ref: NDArray,
+    xs: Iterable[NDArray],
+    atom_idxs: Optional[NDArray] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Alignment:
+    """
+    Optimally align each frame of a trajectory onto a reference conformation via rigid translation and proper
+    rotation. Frames are processed in chunks using a single vmapped SVD per chunk.
+
+    Parameters
+    ----------
+    x_ref: np.ndarray (N, 3)
+        Reference conformation, including all atoms (atom_idxs, if passed, is applied to both x_ref and xs)
+
+    xs: iterable of np.ndarray (N, 3)
+        Frames to align, e.g. a (T, N, 3) array or a StoredArrays, which is read in chunks
+
+    atom_idxs: np.ndarray (K,), optional
+        Subset of atoms used to compute the alignment and RMSD (e.g. ligand atoms). The returned rotations and
+        translations can be applied to complete frames using `apply_alignment`.
+
+    chunk_size: int
+        Number of frames to align simultaneously
+
+    Returns
+    -------
+    Alignment
+        with rmsds of shape (T,), rotations of shape (T, 3, 3) and translations of shape (T, 3)
+    """
+    x_ref = np.asarray(x_ref)
+    assert x_ref.ndim == 2 and x_ref.shape[1] == 3
+
+    def f_snapshot(x, _):
+        assert x.shape == x_ref.shape, f"frame shape {x.shape} does not match reference shape {x_ref.shape}"
+        x_ref_selected = x_ref
+        if atom_idxs is not None:
+            x, x_ref_selected = x[atom_idxs], x_ref[atom_idxs]
+        rmsd, rotation, translation = _kabsch(x_ref_selected, x)
+        # pack into a single array for process_traj_streaming
+        return jnp.concatenate([rmsd[None], rotation.ravel(), translation])
+
+    packed = process_traj_streaming(jax.jit(f_snapshot), xs, None, chunk_size=chunk_size)
+    return Alignment(packed[:, 0], packed[:, 1:10].reshape(-1, 3, 3), packed[:, 10:])
+
+
+def align_all_pairs(xs: NDArray, atom_idxs: Optional[NDArray] = None) -> Alignment:
+    """
+    Optimally align every pair of conformations in a set, e.g. for pose clustering.
+
+    Parameters
+    ----------
+    xs: np.ndarray (K, N, 3)
+        Conformations
+
+    atom_idxs: np.ndarray, optional
+        Subset of atoms used to compute the alignment and RMSD
+
+    Returns
+    -------
+    Alignment
+        with rmsds of shape (K, K), rotations of shape (K, K, 3, 3) and translations of shape (K, K, 3), where entry
+        [i, j] aligns xs[j] onto xs[i]
+    """
+    xs_selected = jnp.asarray(xs)
+    if atom_idxs is not None:
+        xs_selected = xs_selected[:, atom_idxs]
+
+    # loop over references to bound memory to O(K) alignments at a time
+    rmsds, rotations, translations = lax.map(
+        lambda x_ref: jax.vmap(_kabsch, (None, 0))(x_ref, xs_selected), xs_selected
+    )
+    return Alignment(np.asarray(rmsds), np.asarray(rotations), np.asarray(translations))
+
+
+@jax.jit
+def apply_alignment(xs, rotations, translations):
+    """Apply rotations and translations (e.g. from `align_trajectory`) to a batch of (N, 3) conformations"""
+    return xs @ rotations + translations[:, None, :]
+
+
 def rmsd_restraint(conf, params, box, group_a_idxs, group_b_idxs, k):
     """
     Compute a rigid RMSD restraint using two groups of atoms. group_a_idxs and group_b_idxs
@@ -1,9 +1,15 @@
+import hashlib
 from collections.abc import Sequence
-from typing import Optional
+from dataclasses import fields, is_dataclass
+from functools import lru_cache
+from typing import Any, Callable, Optional
 
+import jax
 import jax.numpy as jnp
 import numpy as np
 
+from .jax_utils import PairGeometry
+from .potential import PairGeometryPotential
 from .types import Box, Conf, Params, PotentialFxn
 
 
@@ -68,3 +74,121 @@ def fanout_summed_potential(
         potential terms
     """
     return jnp.sum(jnp.array([U_fn(conf, ps, box) for U_fn, ps in zip(U_fns, jnp.array(params))]))
+
+
+def fused_summed_potential(
+    conf: Conf,
+    params: Params,
+    box: Optional[Box],
+    U_fns: Sequence[PotentialFxn],
+    shapes: Sequence[tuple],
+):
+    """Equivalent to `summed_potential`, but computes the pairwise distances required by all terms implementing
+    `PairGeometryPotential` (e.g. Nonbonded, NonbondedPairList, NonbondedInteractionGroup) in a single pass, which is
+    then shared between these terms.
+
+    Intended to be jit-compiled as a whole; see `get_fused_summed_potential_fxn`.
+    """
+    assert len(U_fns) == len(shapes)
+    return _fused_sum(conf, box, U_fns, unflatten_params(params, shapes))
+
+
+def fused_fanout_summed_potential(
+    conf: Conf,
+    params: Params,
+    box: Optional[Box],
+    U_fns: Sequence[PotentialFxn],
+):
+    """Equivalent to `fanout_summed_potential`, sharing pairwise distances between terms as in
+    `fused_summed_potential`"""
+    return _fused_sum(conf, box, U_fns, [params] * len(U_fns))
+
+
+def _fused_sum(conf: Conf, box: Optional[Box], U_fns: Sequence[PotentialFxn], params_list: Sequence[Params]):
+    pair_requests = [U_fn.geometry_pairs(conf.shape[0]) for U_fn in U_fns if isinstance(U_fn, PairGeometryPotential)]
+
+    geometry = None
+    if pair_requests:
+        # if any term requires all pairs, compute the dense table; otherwise only the union of the requested pairs
+        pairs = None
+        if all(ps is not None for ps in pair_requests):
+            pairs = np.concatenate([np.asarray(ps).reshape(-1, 2) for ps in pair_requests])
+        geometry = PairGeometry(conf, box, pairs)
+
+    Us = []
+    for U_fn, ps in zip(U_fns, params_list):
+        if isinstance(U_fn, PairGeometryPotential):
+            assert geometry is not None
+            Us.append(U_fn.energy_from_pair_geometry(geometry, ps))
+        else:
+            Us.append(U_fn(conf, ps, box))
+    return jnp.sum(jnp.array(Us))
+
+
+def get_fused_summed_potential_fxn(
+    U_fns: Sequence[PotentialFxn], shapes: Optional[Sequence[tuple]], argnums: tuple[int, ...] = ()
+) -> Callable:
+    """Returns a jit-compiled function evaluating the sum of U_fns as a single XLA computation (see
+    `fused_summed_potential`).
+
+    Compiled functions are cached by the structure of the potential terms and the parameter shapes, so that equivalent
+    potentials (e.g. for different lambda windows, which differ only in parameters) share compiled code.
+
+    Parameters
+    ----------
+    U_fns: list of potentials
+        potential terms
+
+    shapes: list of tuple or None
+        shapes of the parameter array input for each potential term, as in `summed_potential`. If None, the terms
+        share a single parameter array, as in `fanout_summed_potential`
+
+    argnums: tuple of int
+        If nonempty, the returned function also computes gradients with respect to the given arguments, as in
+        `jax.value_and_grad`
+
+    Returns
+    -------
+    function with signature (conf, params, box) -> energy, or (conf, params, box) -> (energy, grads)
+    """
+    return _get_fused_fxn(_FusedStructure(U_fns, shapes), tuple(argnums))
+
+
+class _FusedStructure:
+    """Hashable wrapper identifying potential terms by their types and field values"""
+
+    def __init__(self, U_fns: Sequence[PotentialFxn], shapes: Optional[Sequence[tuple]]):
+        self.U_fns = list(U_fns)
+        self.shapes = [tuple(shape) for shape in shapes] if shapes is not None else None
+        self.key = (_structure_key(self.U_fns), _structure_key(self.shapes))
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __eq__(self, other):
+        return isinstance(other, _FusedStructure) and self.key == other.key
+
+
+def _structure_key(obj) -> Any:
+    if isinstance(obj, (np.ndarray, jax.Array)):
+        arr = np.ascontiguousarray(obj)
+        return (arr.shape, arr.dtype.str, hashlib.sha1(arr.tobytes()).hexdigest())
+    if is_dataclass(obj) and not isinstance(obj, type):
+        return (type(obj), tuple(_structure_key(getattr(obj, f.name)) for f in fields(obj)))
+    if isinstance(obj, (list, tuple)):
+        return tuple(_structure_key(x) for x in obj)
+    return obj
+
+
+@lru_cache(maxsize=32)
+def _get_fused_fxn(structure: _FusedStructure, argnums: tuple[int, ...]) -> Callable:
+    U_fns, shapes = structure.U_fns, structure.shapes
+
+    def U_fn(conf, params, box):
+        if shapes is None:
+            return fused_fanout_summed_potential(conf, params, box, U_fns)
+        return fused_summed_potential(conf, params, box, U_fns, shapes)
+
+    if argnums:
+        return jax.jit(jax.value_and_grad(U_fn, argnums))
+    return jax.jit(U_fn)
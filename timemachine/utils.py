@@ -1,6 +1,9 @@
+import importlib
+import sys
 from collections.abc import Iterator, Sequence
 from contextlib import contextmanager
 from importlib import resources
+from types import ModuleType
 
 
 def batches(n: int, batch_size: int) -> Iterator[int]:
@@ -21,3 +24,25 @@ def not_ragged(xss: Sequence[Sequence]) -> bool:
 def path_to_internal_file(module: str, file_name: str):
     with resources.as_file(resources.files(module).joinpath(file_name)) as path:
         yield path
+
+
+class _LazyModule(ModuleType):
+    """Proxy for a module that is imported on first attribute access. See `lazy_import`"""
+
+    def __getattr__(self, attr: str):
+        return getattr(importlib.import_module(self.__name__), attr)
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Return a proxy for the module with the given (absolute) name, deferring the import until the first attribute
+    access. Used to avoid paying the import cost of heavy dependencies (e.g. matplotlib, openmm, pymbar) in processes
+    that don't use them.
+
+    If the module has already been imported, it is returned directly.
+
+    Usage:
+
+        plots = lazy_import("timemachine.fe.plots")  # nothing imported yet
+        plots.plot_as_png_fxn(...)  # imports timemachine.fe.plots
+    """
+    return sys.modules.get(name) or _LazyModule(name)